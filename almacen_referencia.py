@@ -0,0 +1,169 @@
+"""
+Datos de referencia (productos, clientes activos, precios de membresías) compartidos por
+todas las sesiones del proceso.
+
+Cada fuente es una consulta o un documento que se mantiene en memoria:
+
+- Con Firestore se registra un listener on_snapshot: la primera respuesta trae los
+  documentos y después solo llegan los cambios, que se aplican sobre la copia en memoria.
+  Las lecturas de las páginas no consultan la base.
+- Si el backend no admite listeners (backends locales) o el listener se cae, se sondea:
+  cada `intervalo` segundos se consulta la función `version` de la fuente (una lectura) y
+  solo se vuelve a traer la consulta si la versión cambió. Sin `version`, se relee completa.
+  Después de una escritura desde la app, invalidar() adelanta esa verificación de la versión
+  a la próxima lectura, sin esperar el intervalo.
+
+Los listeners se inician con la primera lectura de cada fuente. Los documentos servidos
+son compartidos: quien los reciba no debe modificarlos.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo de espera de la primera respuesta de un listener (segundos)
+ESPERA_LISTENER = 10
+# Intervalo de sondeo por defecto cuando no hay listener (segundos)
+INTERVALO_SONDEO = 5
+
+
+class _Fuente:
+    """Una consulta o documento mantenido en memoria como {id: datos}."""
+
+    def __init__(self, nombre, referencia, es_documento, version, intervalo):
+        self.nombre = nombre
+        self.referencia = referencia
+        self.es_documento = es_documento
+        self.version = version
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._lock_cambios = threading.Lock()
+        self._datos = {}
+        self._listener = None
+        self._primera_respuesta = threading.Event()
+        self._iniciada = False
+        self._verificada_en = None
+        self._version_cargada = None
+        self._cargada = False  # Si _datos viene de un sondeo (y no del listener)
+
+    # --- Listener ---
+
+    def _iniciar(self):
+        # Se llama con self._lock tomado
+        self._iniciada = True
+        on_snapshot = getattr(self.referencia, "on_snapshot", None)
+        if on_snapshot is None:
+            logger.info("%s: el backend no admite listeners, se usa sondeo", self.nombre)
+            return
+        try:
+            self._listener = on_snapshot(self._al_cambiar)
+        except Exception:
+            logger.exception("%s: no se pudo iniciar el listener, se usa sondeo", self.nombre)
+            self._listener = None
+            return
+        if not self._primera_respuesta.wait(ESPERA_LISTENER):
+            logger.warning("%s: el listener no respondió en %s s, se usa sondeo", self.nombre, ESPERA_LISTENER)
+            self._detener_listener()
+
+    def _al_cambiar(self, snapshots, cambios, read_time):
+        # Corre en el hilo del listener; no toma self._lock porque _iniciar lo retiene
+        # mientras espera la primera respuesta.
+        with self._lock_cambios:
+            if self.es_documento:
+                datos = {s.id: s.to_dict() for s in snapshots if s.exists}
+            else:
+                datos = dict(self._datos)
+                for cambio in cambios:
+                    if cambio.type.name == "REMOVED":
+                        datos.pop(cambio.document.id, None)
+                    else:
+                        datos[cambio.document.id] = cambio.document.to_dict()
+            # Se reemplaza el diccionario completo: los lectores nunca ven uno a medio actualizar
+            self._datos = datos
+        self._primera_respuesta.set()
+
+    def _escuchando(self):
+        return self._listener is not None and getattr(self._listener, "is_active", True)
+
+    def _detener_listener(self):
+        if self._listener is not None:
+            try:
+                self._listener.unsubscribe()
+            except Exception:
+                logger.exception("%s: error al detener el listener", self.nombre)
+            self._listener = None
+
+    # --- Sondeo ---
+
+    def _sondear(self):
+        # Se llama con self._lock tomado
+        ahora = time.monotonic()
+        if self._verificada_en is not None and ahora - self._verificada_en < self.intervalo:
+            return
+        version = self.version() if self.version else None
+        if not self._cargada or version is None or version != self._version_cargada:
+            if self.es_documento:
+                snapshot = self.referencia.get()
+                self._datos = {snapshot.id: snapshot.to_dict()} if snapshot.exists else {}
+            else:
+                self._datos = {s.id: s.to_dict() for s in self.referencia.stream()}
+            self._version_cargada = version
+            self._cargada = True
+        self._verificada_en = ahora
+
+    # --- Lectura ---
+
+    def documentos(self):
+        with self._lock:
+            if not self._iniciada:
+                self._iniciar()
+            if self._listener is not None and not self._escuchando():
+                logger.warning("%s: el listener se detuvo, se usa sondeo", self.nombre)
+                self._detener_listener()
+                self._verificada_en = None
+            if self._listener is None:
+                self._sondear()
+            return self._datos
+
+    def invalidar(self, recargar=False):
+        """
+        Fuerza a verificar la versión en la próxima lectura, o con recargar=True a releer la
+        consulta completa. Solo afecta al sondeo; el listener ya recibe los cambios.
+        """
+        with self._lock:
+            self._verificada_en = None
+            if recargar:
+                self._cargada = False
+
+
+class AlmacenReferencia:
+    """Conjunto de fuentes de referencia, identificadas por nombre."""
+
+    def __init__(self, intervalo=INTERVALO_SONDEO):
+        self.intervalo = intervalo
+        self._fuentes = {}
+
+    def registrar_consulta(self, nombre, consulta, version=None):
+        """Mantiene en memoria los documentos de una consulta o colección."""
+        self._fuentes[nombre] = _Fuente(nombre, consulta, False, version, self.intervalo)
+
+    def registrar_documento(self, nombre, referencia, version=None):
+        """Mantiene en memoria un documento."""
+        self._fuentes[nombre] = _Fuente(nombre, referencia, True, version, self.intervalo)
+
+    def documentos(self, nombre):
+        """{id: datos} de la fuente."""
+        return self._fuentes[nombre].documentos()
+
+    def documento(self, nombre):
+        """Datos del documento de una fuente registrada con registrar_documento (None si no existe)."""
+        return next(iter(self.documentos(nombre).values()), None)
+
+    def invalidar(self, nombre=None, recargar=False):
+        """
+        Fuerza a verificar la versión de una fuente (o de todas) en la próxima lectura cuando se
+        usa sondeo; con recargar=True, a releerla completa.
+        """
+        for fuente in ([self._fuentes[nombre]] if nombre else self._fuentes.values()):
+            fuente.invalidar(recargar)
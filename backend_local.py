@@ -0,0 +1,512 @@
+"""
+Backends locales compatibles con el subconjunto de la API de Firestore que usa la app.
+
+- MemoriaClient: guarda todo en diccionarios del proceso (tests, benchmarks, demos).
+- SQLiteClient: guarda los documentos como JSON en un archivo SQLite local.
+
+Las consultas se evalúan en Python con la misma semántica que Firestore para los casos
+que usa la app: filtros FieldFilter, order_by (excluye documentos sin el campo), limit,
+start_after, select y las agregaciones count y sum. Los centinelas SERVER_TIMESTAMP, Increment y DELETE_FIELD se
+resuelven al escribir, set(merge=True) combina los mapas anidados y las transacciones
+se ejecutan con el cliente bloqueado.
+
+El atributo `lecturas` del cliente cuenta los documentos leídos como los factura
+Firestore (una consulta sin resultados cuenta como una lectura; una agregación, una
+lectura cada 1000 documentos que abarca).
+"""
+import copy
+import json
+import math
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime, timezone
+
+from google.cloud import firestore as gcfs
+from google.cloud.firestore_v1 import field_path, transforms
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+
+
+# --- Valores ---
+
+def _normalizar(valor):
+    """Convierte los valores al formato en que Firestore los devuelve (fechas con zona UTC)."""
+    if isinstance(valor, datetime):
+        return valor if valor.tzinfo else valor.replace(tzinfo=timezone.utc)
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day, tzinfo=timezone.utc)
+    if isinstance(valor, dict):
+        return {k: _normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    return valor
+
+
+def _leer_campo(data, campo):
+    """Lee un campo (admite rutas con puntos). Retorna (existe, valor)."""
+    actual = data
+    for parte in field_path.parse_field_path(campo):
+        if not isinstance(actual, dict) or parte not in actual:
+            return False, None
+        actual = actual[parte]
+    return True, actual
+
+
+def _asignar(destino, clave, valor):
+    """Asigna destino[clave] resolviendo los centinelas de Firestore."""
+    if valor is gcfs.DELETE_FIELD:
+        destino.pop(clave, None)
+    elif valor is gcfs.SERVER_TIMESTAMP:
+        destino[clave] = datetime.now(timezone.utc)
+    elif isinstance(valor, transforms.Increment):
+        destino[clave] = destino.get(clave, 0) + valor.value
+    elif isinstance(valor, dict):
+        destino[clave] = {}
+        for k, v in valor.items():
+            _asignar(destino[clave], k, v)
+    else:
+        destino[clave] = _normalizar(copy.deepcopy(valor))
+
+
+def _aplicar_campo(data, campo, valor):
+    """Escribe un campo indicado con una ruta con puntos (como en update())."""
+    partes = field_path.parse_field_path(campo)
+    destino = data
+    for parte in partes[:-1]:
+        destino = destino.setdefault(parte, {})
+    _asignar(destino, partes[-1], valor)
+
+
+def _fusionar(destino, data):
+    """Combina data sobre destino como set(merge=True): los mapas se combinan campo a campo."""
+    for clave, valor in data.items():
+        if isinstance(valor, dict) and valor:
+            if not isinstance(destino.get(clave), dict):
+                destino[clave] = {}
+            _fusionar(destino[clave], valor)
+        else:
+            _asignar(destino, clave, valor)
+
+
+def _clave_orden(valor):
+    """Orden entre tipos similar al de Firestore: nulos, booleanos, números, fechas, textos."""
+    if valor is None:
+        return (0, 0)
+    if isinstance(valor, bool):
+        return (1, valor)
+    if isinstance(valor, (int, float)):
+        return (2, valor)
+    if isinstance(valor, datetime):
+        return (3, valor)
+    if isinstance(valor, str):
+        return (4, valor)
+    return (5, str(valor))
+
+
+def _cumple(data, campo, operador, valor):
+    existe, actual = _leer_campo(data, campo)
+    valor = _normalizar(valor)
+    if operador == "==":
+        return existe and actual == valor
+    if operador == "!=":
+        return existe and actual is not None and actual != valor
+    if operador == "in":
+        return existe and actual in valor
+    if operador == "not-in":
+        return existe and actual is not None and actual not in valor
+    if operador == "array-contains":
+        return existe and isinstance(actual, list) and valor in actual
+    if operador == "array-contains-any":
+        return existe and isinstance(actual, list) and any(v in actual for v in valor)
+    if not existe or actual is None:
+        return False
+    # Las comparaciones de rango solo aplican entre valores del mismo tipo
+    if _clave_orden(actual)[0] != _clave_orden(valor)[0]:
+        return False
+    if operador == "<":
+        return actual < valor
+    if operador == "<=":
+        return actual <= valor
+    if operador == ">":
+        return actual > valor
+    if operador == ">=":
+        return actual >= valor
+    raise ValueError(f"Operador no soportado: {operador}")
+
+
+# --- Snapshots y referencias ---
+
+class SnapshotLocal:
+    """Equivalente a DocumentSnapshot."""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, campo):
+        existe, valor = _leer_campo(self._data or {}, campo)
+        if not existe:
+            raise KeyError(campo)
+        return copy.deepcopy(valor)
+
+
+class DocumentoLocal:
+    """Equivalente a DocumentReference."""
+
+    def __init__(self, client, coleccion, doc_id):
+        self._client = client
+        self._coleccion = coleccion
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._coleccion}/{self.id}"
+
+    def get(self, field_paths=None, transaction=None):
+        self._client._contar_lecturas(1)
+        data = self._client._leer(self._coleccion, self.id)
+        if data is not None and field_paths:
+            data = _proyectar(data, field_paths)
+        return SnapshotLocal(self, data)
+
+    def set(self, data, merge=False):
+        self._client._aplicar([("set", self, data, merge)])
+
+    def update(self, data):
+        self._client._aplicar([("update", self, data, False)])
+
+    def delete(self):
+        self._client._aplicar([("delete", self, None, False)])
+
+
+def _proyectar(data, campos):
+    proyectado = {}
+    for campo in campos:
+        existe, valor = _leer_campo(data, campo)
+        if existe:
+            _aplicar_campo(proyectado, campo, valor)
+    return proyectado
+
+
+# --- Consultas ---
+
+class QueryLocal:
+    """Equivalente (inmutable) a Query."""
+
+    def __init__(self, client, coleccion, filtros=(), orden=(), limite=None, despues_de=None, campos=None):
+        self._client = client
+        self._coleccion = coleccion
+        self._filtros = tuple(filtros)
+        self._orden = tuple(orden)
+        self._limite = limite
+        self._despues_de = despues_de
+        self._campos = campos
+
+    def _copiar(self, **cambios):
+        estado = {
+            "filtros": self._filtros,
+            "orden": self._orden,
+            "limite": self._limite,
+            "despues_de": self._despues_de,
+            "campos": self._campos,
+        }
+        estado.update(cambios)
+        return QueryLocal(self._client, self._coleccion, **estado)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copiar(filtros=self._filtros + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=gcfs.Query.ASCENDING):
+        return self._copiar(orden=self._orden + ((field_path, direction == gcfs.Query.DESCENDING),))
+
+    def limit(self, count):
+        return self._copiar(limite=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copiar(despues_de=document_fields_or_snapshot)
+
+    def select(self, field_paths):
+        return self._copiar(campos=list(field_paths))
+
+    def count(self, alias=None):
+        return AgregacionLocal(self).count(alias)
+
+    def sum(self, field_ref, alias=None):
+        return AgregacionLocal(self).sum(field_ref, alias)
+
+    def _resultados(self):
+        docs = [
+            (doc_id, data)
+            for doc_id, data in self._client._listar(self._coleccion)
+            if all(_cumple(data, *f) for f in self._filtros)
+        ]
+        # Como en Firestore, ordenar por un campo excluye los documentos que no lo tienen
+        # y los filtros de desigualdad implican un orden por ese campo.
+        orden = list(self._orden)
+        for campo, operador, _ in self._filtros:
+            if operador in ("<", "<=", ">", ">=", "!=", "not-in") and campo not in [c for c, _ in orden]:
+                orden.insert(0, (campo, False))
+        docs = [d for d in docs if all(_leer_campo(d[1], c)[0] for c, _ in orden)]
+        docs.sort(key=lambda d: d[0])
+        for campo, descendente in reversed(orden):
+            docs.sort(key=lambda d: _clave_orden(_leer_campo(d[1], campo)[1]), reverse=descendente)
+
+        if self._despues_de is not None:
+            docs = self._despues_de_cursor(docs, orden)
+        if self._limite is not None:
+            docs = docs[:self._limite]
+        return docs
+
+    def _despues_de_cursor(self, docs, orden):
+        cursor = self._despues_de
+        if isinstance(cursor, SnapshotLocal):
+            cursor_id = cursor.id
+            cursor = cursor.to_dict() or {}
+        else:
+            cursor_id = None
+        valores_cursor = [_clave_orden(_normalizar(_leer_campo(cursor, c)[1])) for c, _ in orden]
+
+        def es_posterior(doc_id, data):
+            for (campo, descendente), valor_cursor in zip(orden, valores_cursor):
+                valor = _clave_orden(_leer_campo(data, campo)[1])
+                if valor != valor_cursor:
+                    return (valor < valor_cursor) if descendente else (valor > valor_cursor)
+            return cursor_id is not None and doc_id > cursor_id
+
+        return [(doc_id, data) for doc_id, data in docs if es_posterior(doc_id, data)]
+
+    def stream(self, transaction=None):
+        docs = self._resultados()
+        self._client._contar_lecturas(max(len(docs), 1))
+        for doc_id, data in docs:
+            if self._campos is not None:
+                data = _proyectar(data, self._campos)
+            yield SnapshotLocal(DocumentoLocal(self._client, self._coleccion, doc_id), copy.deepcopy(data))
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class AgregacionLocal:
+    """Equivalente a AggregationQuery (count y sum)."""
+
+    def __init__(self, query):
+        self._query = query
+        self._agregaciones = []
+
+    def count(self, alias=None):
+        self._agregaciones.append(("count", None, alias or f"field_{len(self._agregaciones) + 1}"))
+        return self
+
+    def sum(self, field_ref, alias=None):
+        self._agregaciones.append(("sum", field_ref, alias or f"field_{len(self._agregaciones) + 1}"))
+        return self
+
+    def get(self, transaction=None):
+        docs = self._query._resultados()
+        self._query._client._contar_lecturas(max(math.ceil(len(docs) / 1000), 1))
+        resultados = []
+        for tipo, campo, alias in self._agregaciones:
+            if tipo == "count":
+                valor = len(docs)
+            else:
+                # Como en Firestore, sum ignora los valores que no son números
+                numeros = [v for existe, v in (_leer_campo(data, campo) for _, data in docs)
+                           if existe and isinstance(v, (int, float)) and not isinstance(v, bool)]
+                valor = sum(numeros)
+            resultados.append(AggregationResult(alias, valor))
+        return [resultados]
+
+
+class ColeccionLocal(QueryLocal):
+    """Equivalente a CollectionReference."""
+
+    def __init__(self, client, coleccion):
+        super().__init__(client, coleccion)
+        self.id = coleccion
+
+    def document(self, document_id=None):
+        return DocumentoLocal(self._client, self._coleccion, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.set(document_data)
+        return datetime.now(timezone.utc), ref
+
+
+class LoteLocal:
+    """Equivalente a WriteBatch: las operaciones se aplican juntas al hacer commit()."""
+
+    def __init__(self, client):
+        self._client = client
+        self._operaciones = []
+
+    def set(self, reference, document_data, merge=False):
+        self._operaciones.append(("set", reference, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._operaciones.append(("update", reference, field_updates, False))
+
+    def delete(self, reference):
+        self._operaciones.append(("delete", reference, None, False))
+
+    def __len__(self):
+        return len(self._operaciones)
+
+    def commit(self):
+        self._client._aplicar(self._operaciones)
+        self._operaciones = []
+
+
+class TransaccionLocal(LoteLocal):
+    """Equivalente a Transaction: las lecturas se hacen con ref.get(transaction=...) y las escrituras al final."""
+
+
+def transactional(funcion):
+    """Equivalente a firestore.transactional para las transacciones locales."""
+    def ejecutar(transaction, *args, **kwargs):
+        # El cliente queda bloqueado durante toda la transacción, así que no hay reintentos
+        with transaction._client._lock:
+            resultado = funcion(transaction, *args, **kwargs)
+            transaction.commit()
+        return resultado
+    return ejecutar
+
+
+# --- Clientes ---
+
+class MemoriaClient:
+    """Base de datos en memoria con la interfaz de firestore.Client."""
+
+    def __init__(self):
+        self._colecciones = {}
+        self._lock = threading.RLock()
+        self.lecturas = 0
+
+    def collection(self, collection_path):
+        return ColeccionLocal(self, collection_path)
+
+    def batch(self):
+        return LoteLocal(self)
+
+    def transaction(self):
+        return TransaccionLocal(self)
+
+    # Permite que el repositorio use transacciones sin distinguir el backend
+    transactional = staticmethod(transactional)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for ref in references:
+            yield ref.get(field_paths=field_paths)
+
+    def _contar_lecturas(self, cantidad):
+        with self._lock:
+            self.lecturas += cantidad
+
+    # Almacenamiento: las subclases redefinen estos métodos
+    def _leer(self, coleccion, doc_id):
+        with self._lock:
+            data = self._colecciones.get(coleccion, {}).get(doc_id)
+            return copy.deepcopy(data)
+
+    def _listar(self, coleccion):
+        with self._lock:
+            return list(self._colecciones.get(coleccion, {}).items())
+
+    def _guardar(self, cambios):
+        for coleccion, doc_id, data in cambios:
+            docs = self._colecciones.setdefault(coleccion, {})
+            if data is None:
+                docs.pop(doc_id, None)
+            else:
+                docs[doc_id] = data
+
+    def _aplicar(self, operaciones):
+        """Aplica una lista de operaciones (set/update/delete) de forma atómica."""
+        with self._lock:
+            pendientes = {}
+            for tipo, ref, data, merge in operaciones:
+                clave = (ref._coleccion, ref.id)
+                actual = pendientes[clave] if clave in pendientes else self._leer(*clave)
+                if tipo == "delete":
+                    pendientes[clave] = None
+                    continue
+                if tipo == "update" and actual is None:
+                    raise KeyError(f"No existe el documento {ref.path}")
+                nuevo = actual if (tipo == "update" or merge) and actual is not None else {}
+                if tipo == "update":
+                    for campo, valor in data.items():
+                        _aplicar_campo(nuevo, campo, valor)
+                else:
+                    # set() no interpreta los puntos como rutas anidadas
+                    _fusionar(nuevo, data)
+                pendientes[clave] = nuevo
+            self._guardar([(c, d, data) for (c, d), data in pendientes.items()])
+
+
+class _CodificadorJSON(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return {"__fecha__": o.isoformat()}
+        return super().default(o)
+
+
+def _decodificar_json(obj):
+    if "__fecha__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__fecha__"])
+    return obj
+
+
+class SQLiteClient(MemoriaClient):
+    """Base de datos local en un archivo SQLite con la interfaz de firestore.Client."""
+
+    def __init__(self, ruta=":memory:"):
+        super().__init__()
+        self.ruta = ruta
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS documentos ("
+            " coleccion TEXT NOT NULL, id TEXT NOT NULL, datos TEXT NOT NULL,"
+            " PRIMARY KEY (coleccion, id))"
+        )
+        self._conexion.commit()
+
+    def _leer(self, coleccion, doc_id):
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT datos FROM documentos WHERE coleccion = ? AND id = ?", (coleccion, doc_id)
+            ).fetchone()
+        return json.loads(fila[0], object_hook=_decodificar_json) if fila else None
+
+    def _listar(self, coleccion):
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT id, datos FROM documentos WHERE coleccion = ?", (coleccion,)
+            ).fetchall()
+        return [(doc_id, json.loads(datos, object_hook=_decodificar_json)) for doc_id, datos in filas]
+
+    def _guardar(self, cambios):
+        with self._conexion:
+            for coleccion, doc_id, data in cambios:
+                if data is None:
+                    self._conexion.execute(
+                        "DELETE FROM documentos WHERE coleccion = ? AND id = ?", (coleccion, doc_id)
+                    )
+                else:
+                    self._conexion.execute(
+                        "INSERT OR REPLACE INTO documentos (coleccion, id, datos) VALUES (?, ?, ?)",
+                        (coleccion, doc_id, json.dumps(data, cls=_CodificadorJSON)),
+                    )
@@ -0,0 +1,227 @@
+"""
+Benchmarks de la app sobre datos sintéticos en un backend local.
+
+Genera (o reutiliza) una base con datos_sinteticos.py y mide la lógica de cada página:
+get_dashboard_data y get_resumen_mes (en frío y con cache), get_dashboard_data de un mes
+cerrado sin la cache en memoria (cache en disco), el listado de Membresías,
+el listado de Clientes, el alta de un cliente desde su formulario y los catálogos
+get_productos/get_clientes. Por escenario reporta
+tiempo (mediana y mínimo de las repeticiones), documentos leídos (como los facturaría
+Firestore) y memoria pico, y agrega los resultados a un archivo JSONL comparándolos con
+la corrida anterior de la misma escala y backend.
+
+Las páginas se ejecutan completas con streamlit.testing (AppTest). El backend local
+evalúa las consultas recorriendo la colección, así que los tiempos sirven para comparar
+versiones entre sí; los documentos leídos son la medida comparable con Firestore.
+
+Uso:
+    python benchmark.py --escala 100k
+    python benchmark.py --escala 1M --backend sqlite --repeticiones 1
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from datos_sinteticos import escala, generar
+
+# Un resultado es una regresión si supera en este factor a la corrida anterior
+# (y por más que el margen absoluto, para no avisar por ruido en escenarios muy rápidos)
+UMBRAL_REGRESION = 1.2
+MARGEN_TIEMPO_S = 0.01
+MARGEN_MEMORIA_MB = 1
+
+
+def _pagina(prefijo):
+    return os.path.abspath(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages", f"{prefijo}_*.py"))[0])
+
+
+def escenarios(year, month):
+    """Escenarios a medir: {nombre: función sin argumentos}. Se ejecutan en este orden."""
+    import streamlit.logger
+    import utils
+    from streamlit.testing.v1 import AppTest
+
+    # Fuera de `streamlit run` las caches y AppTest avisan en cada llamada
+    streamlit.logger.set_log_level("error")
+    mes_anterior = (year, month - 1) if month > 1 else (year - 1, 12)
+
+    def dashboard_frio():
+        utils.cache_dashboard.invalidar((year, month))
+        utils.get_dashboard_data(year, month)
+
+    def dashboard_cache():
+        utils.get_dashboard_data(year, month)
+
+    def dashboard_mes_cerrado():
+        # Sin la cache en memoria (como tras un reinicio): sale de la cache en disco
+        utils.cache_dashboard.invalidar(mes_anterior)
+        utils.get_dashboard_data(*mes_anterior)
+
+    def resumen_mes_frio():
+        utils.cache_resumenes.invalidar((year, month))
+        utils.get_resumen_mes(year, month)
+
+    def catalogos_frio():
+        utils.invalidar_catalogos()
+        utils.get_productos()
+        utils.get_clientes()
+
+    def catalogos_cache():
+        utils.get_productos()
+        utils.get_clientes()
+
+    def pagina(prefijo):
+        ruta = _pagina(prefijo)
+
+        def ejecutar():
+            app = AppTest.from_file(ruta, default_timeout=3600).run()
+            if app.exception:
+                raise RuntimeError(f"{os.path.basename(ruta)}: {app.exception[0].value}")
+
+        return ejecutar
+
+    dnis_alta = itertools.count(90_000_000)
+
+    def alta_cliente():
+        # Completa y envía el formulario de Clientes con un DNI nuevo en cada ejecución
+        dni = str(next(dnis_alta))
+        app = AppTest.from_file(_pagina("2"), default_timeout=3600).run()
+        formulario = {campo.label: campo for campo in app.text_input}
+        formulario["Nombre completo"].set_value(f"Cliente Benchmark {dni}")
+        formulario["DNI (será el ID único)"].set_value(dni)
+        next(b for b in app.button if b.label == "➕ Agregar Cliente").click().run()
+        if app.exception:
+            raise RuntimeError(f"Alta de cliente: {app.exception[0].value}")
+        if not any(dni in str(mensaje.value) for mensaje in app.success) or utils.repo.obtener_cliente(dni) is None:
+            raise RuntimeError(f"Alta de cliente: no se registró el DNI {dni}")
+
+    return {
+        "dashboard_frio": dashboard_frio,
+        "dashboard_cache": dashboard_cache,
+        "dashboard_mes_cerrado": dashboard_mes_cerrado,
+        "resumen_mes_frio": resumen_mes_frio,
+        "catalogos_frio": catalogos_frio,
+        "catalogos_cache": catalogos_cache,
+        "membresias_listado": pagina("1"),
+        "clientes_listado": pagina("2"),
+        "clientes_alta": alta_cliente,
+    }
+
+
+def medir(db, funcion, repeticiones):
+    """Ejecuta el escenario y retorna (tiempos en segundos, documentos leídos, memoria pico en bytes)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        lecturas_inicio = db.lecturas
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+        lecturas = db.lecturas - lecturas_inicio
+
+    # La memoria se mide en una ejecución aparte porque tracemalloc hace más lento el código
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return tiempos, lecturas, pico
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def resultados_anteriores(ruta, escala_docs, backend):
+    """Último resultado guardado de cada escenario para la misma escala y backend."""
+    anteriores = {}
+    if not os.path.exists(ruta):
+        return anteriores
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            resultado = json.loads(linea)
+            if resultado["escala"] == escala_docs and resultado["backend"] == backend:
+                anteriores[resultado["escenario"]] = resultado
+    return anteriores
+
+
+def _comparacion(actual, anterior):
+    if not anterior:
+        return ""
+    avisos = []
+    if actual["tiempo_s"] > max(anterior["tiempo_s"] * UMBRAL_REGRESION, anterior["tiempo_s"] + MARGEN_TIEMPO_S):
+        avisos.append(f"tiempo x{actual['tiempo_s'] / anterior['tiempo_s']:.2f}")
+    if actual["lecturas"] > anterior["lecturas"]:
+        avisos.append(f"lecturas +{actual['lecturas'] - anterior['lecturas']}")
+    if actual["memoria_pico_mb"] > max(anterior["memoria_pico_mb"] * UMBRAL_REGRESION, anterior["memoria_pico_mb"] + MARGEN_MEMORIA_MB):
+        avisos.append(f"memoria x{actual['memoria_pico_mb'] / anterior['memoria_pico_mb']:.2f}")
+    return f"  ⚠ {', '.join(avisos)} (vs {anterior.get('commit') or anterior['fecha']})" if avisos else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de Benjas Barber Club sobre datos sintéticos")
+    parser.add_argument("--escala", type=escala, default="1k", help="Cantidad total de documentos (1k, 100k, 1M), por defecto 1k")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--backend", choices=("memoria", "sqlite"), default="memoria")
+    parser.add_argument("--ruta", help="Archivo SQLite; por defecto benchmark_<escala>_<semilla>.sqlite3 (se reutiliza si existe)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--escenarios", nargs="+", help="Escenarios a correr (por defecto todos)")
+    parser.add_argument("--resultados", default="benchmark_resultados.jsonl", help="Archivo JSONL donde se agregan los resultados")
+    args = parser.parse_args()
+
+    # El repositorio compartido (y las páginas) usan el backend configurado por variables de entorno
+    os.environ["BENJAS_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["BENJAS_SQLITE_PATH"] = args.ruta or f"benchmark_{args.escala}_{args.semilla}.sqlite3"
+
+    from repositorio import obtener_repositorio
+
+    repo = obtener_repositorio()
+    if not list(repo.db.collection("clientes").limit(1).stream()):
+        inicio = time.perf_counter()
+        generados = generar(repo.db, args.escala, args.semilla)
+        print(f"Datos generados en {time.perf_counter() - inicio:.1f} s: "
+              + ", ".join(f"{cantidad} {coleccion}" for coleccion, cantidad in generados.items()))
+
+    hoy = date.today()
+    todos = escenarios(hoy.year, hoy.month)
+    nombres = args.escenarios or list(todos)
+    anteriores = resultados_anteriores(args.resultados, args.escala, args.backend)
+    comun = {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": _commit_actual(),
+             "escala": args.escala, "backend": args.backend, "repeticiones": args.repeticiones}
+
+    print(f"{'escenario':<20} {'tiempo (s)':>11} {'mínimo (s)':>11} {'lecturas':>10} {'memoria (MB)':>13}")
+    with open(args.resultados, "a", encoding="utf-8") as archivo:
+        for nombre in nombres:
+            tiempos, lecturas, pico = medir(repo.db, todos[nombre], args.repeticiones)
+            resultado = dict(
+                comun,
+                escenario=nombre,
+                tiempo_s=round(statistics.median(tiempos), 4),
+                tiempo_min_s=round(min(tiempos), 4),
+                lecturas=lecturas,
+                memoria_pico_mb=round(pico / 2**20, 2),
+            )
+            archivo.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            print(f"{nombre:<20} {resultado['tiempo_s']:>11.3f} {resultado['tiempo_min_s']:>11.3f} "
+                  f"{lecturas:>10} {resultado['memoria_pico_mb']:>13.1f}"
+                  + _comparacion(resultado, anteriores.get(nombre)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cache en disco de los datos del Dashboard de meses cerrados, en archivos Parquet.
+
+Los meses cerrados no cambian, así que después de consultarlos una vez se guardan en
+particiones por colección:
+
+    <directorio>/<parte>/year=AAAA/month=M/datos.parquet
+
+con una parte por cada DataFrame de get_dashboard_data (ingresos, gastos, membresías e
+items). Al reiniciar el proceso o vencer la cache en memoria se leen de ahí (memory-mapped)
+en lugar de volver a consultar Firestore; solo el mes en curso necesita consultas.
+
+Si se corrige un mes cerrado (un alta o baja con fecha pasada) hay que reabrirlo: se borran
+sus particiones y la próxima lectura lo vuelve a consultar y guardar. Las altas y bajas
+hechas desde la app lo reabren solas; para correcciones hechas por fuera está
+`python mantenimiento.py reabrir-mes AAAA-MM`.
+
+Requiere pyarrow; si no está instalado la cache en disco queda desactivada.
+"""
+import logging
+import os
+import shutil
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # La cache en disco es opcional
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Directorio por defecto, configurable con la variable de entorno BENJAS_CACHE_DIR
+DIRECTORIO = os.environ.get("BENJAS_CACHE_DIR", "cache_dashboard")
+# Un DataFrame por parte, en el orden en que los retorna get_dashboard_data
+PARTES = ("ingresos", "gastos", "membresias", "items")
+
+
+class CacheParquet:
+    """Particiones Parquet (año, mes) de los DataFrames del Dashboard."""
+
+    def __init__(self, directorio=DIRECTORIO):
+        self.directorio = directorio
+
+    @property
+    def disponible(self):
+        return pq is not None
+
+    def _particion(self, parte, year, month):
+        return os.path.join(self.directorio, parte, f"year={year:04d}", f"month={month}")
+
+    def leer(self, year, month, partes=PARTES):
+        """Los DataFrames del mes en el orden de `partes`, o None si alguna de ellas no está guardada."""
+        if not self.disponible:
+            return None
+        rutas = [os.path.join(self._particion(parte, year, month), "datos.parquet") for parte in partes]
+        if not all(os.path.exists(ruta) for ruta in rutas):
+            return None
+        try:
+            return tuple(pq.read_table(ruta, memory_map=True).to_pandas() for ruta in rutas)
+        except (OSError, pa.ArrowException):
+            logger.exception("No se pudo leer el mes %04d-%02d de la cache en disco; se reabre", year, month)
+            self.reabrir(year, month)
+            return None
+
+    def guardar(self, year, month, frames):
+        """Guarda los DataFrames del mes (en el orden de PARTES). Cada archivo se reemplaza de forma atómica."""
+        if not self.disponible:
+            return
+        for parte, df in zip(PARTES, frames):
+            particion = self._particion(parte, year, month)
+            os.makedirs(particion, exist_ok=True)
+            temporal = os.path.join(particion, f".{uuid.uuid4().hex}.tmp")
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporal)
+            os.replace(temporal, os.path.join(particion, "datos.parquet"))
+
+    def reabrir(self, year, month):
+        """Borra las particiones del mes. Retorna True si estaba guardado."""
+        existia = False
+        for parte in PARTES:
+            particion = self._particion(parte, year, month)
+            if os.path.isdir(particion):
+                shutil.rmtree(particion, ignore_errors=True)
+                existia = True
+        return existia
@@ -0,0 +1,215 @@
+"""
+Generador de datos sintéticos de la barbería para benchmarks y demos.
+
+Crea clientes, productos, ingresos con items, gastos y membresías con una semilla fija
+(los mismos parámetros generan siempre los mismos datos) y completa la proyección
+"ultima_membresia" y los resúmenes con las mismas funciones de mantenimiento que se
+usan en producción. Pensado para los backends locales (memoria o SQLite).
+
+Uso:
+    python datos_sinteticos.py --escala 100k --backend sqlite --ruta benchmark.sqlite3
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from repositorio import TAMANO_LOTE_ESCRITURA, Repositorio, crear_db, normalizar_texto
+
+NOMBRES = [
+    "Juan", "Martín", "Lucas", "Matías", "Santiago", "Tomás", "Nicolás", "Facundo", "Agustín", "Joaquín",
+    "Federico", "Gonzalo", "Franco", "Bruno", "Ezequiel", "Iván", "Ramiro", "Sofía", "Valentina", "Camila",
+]
+APELLIDOS = [
+    "González", "Rodríguez", "Gómez", "Fernández", "López", "Díaz", "Martínez", "Pérez", "García", "Sánchez",
+    "Romero", "Sosa", "Álvarez", "Torres", "Ruiz", "Ramírez", "Flores", "Benítez", "Acosta", "Medina",
+]
+PRODUCTOS = [
+    ("Corte", "servicio", 800000), ("Corte y barba", "servicio", 1100000), ("Barba", "servicio", 500000),
+    ("Corte niño", "servicio", 600000), ("Color", "servicio", 1500000), ("Lavado", "servicio", 200000),
+    ("Cera", "producto", 700000), ("Pomada", "producto", 900000), ("Shampoo", "producto", 650000),
+    ("Aceite para barba", "producto", 850000), ("Gaseosa", "producto", 150000), ("Cerveza", "producto", 250000),
+]
+OPERADORES = ["Benja", "Tomi", "Lucas", "Fran"]
+METODOS_PAGO = ["efectivo", "débito", "crédito", "transferencia", "qr", "mp"]
+CONCEPTOS = ["insumos", "alquiler", "servicios", "mantenimiento", "marketing", "otros"]
+TIPOS_MEMBRESIA = {"Mensual": (30, 500000), "Trimestral": (90, 1350000), "Semestral": (180, 2500000), "Anual": (365, 4500000)}
+METODOS_PAGO_MEMBRESIA = ["efectivo", "transferencia", "debito_automatico"]
+
+# Proporción de cada colección sobre el total de documentos
+PROPORCIONES = {"clientes": 0.05, "membresias": 0.15, "gastos": 0.05}
+
+
+def escala(valor):
+    """Convierte '1k', '100k', '1M' o '2500' en una cantidad de documentos."""
+    valor = valor.strip()
+    multiplicador = {"k": 1_000, "m": 1_000_000}.get(valor[-1].lower(), 1)
+    if multiplicador > 1:
+        valor = valor[:-1]
+    return int(float(valor) * multiplicador)
+
+
+def cantidades(total):
+    """Cantidad de documentos de cada colección para un total."""
+    resultado = {coleccion: max(int(total * proporcion), 10) for coleccion, proporcion in PROPORCIONES.items()}
+    resultado["productos"] = len(PRODUCTOS)
+    resultado["ingresos"] = max(total - sum(resultado.values()), 10)
+    return resultado
+
+
+def _fecha_aleatoria(rnd, desde, dias):
+    return desde + timedelta(days=rnd.randrange(dias), hours=rnd.randint(9, 20), minutes=rnd.randrange(60))
+
+
+def _id_aleatorio(rnd):
+    # IDs como los automáticos de Firestore, pero reproducibles con la semilla
+    return f"{rnd.getrandbits(80):020x}"
+
+
+def _escribir(db, coleccion, docs):
+    """Escribe (id, data) en lotes."""
+    ref_coleccion = db.collection(coleccion)
+    pendientes = []
+    for doc_id, data in docs:
+        pendientes.append((ref_coleccion.document(doc_id), data))
+        if len(pendientes) == TAMANO_LOTE_ESCRITURA:
+            _confirmar(db, pendientes)
+            pendientes = []
+    if pendientes:
+        _confirmar(db, pendientes)
+
+
+def _confirmar(db, pendientes):
+    batch = db.batch()
+    for ref, data in pendientes:
+        batch.set(ref, data)
+    batch.commit()
+
+
+def generar(db, total, semilla=42, meses=24):
+    """
+    Carga en `db` unos `total` documentos repartidos en los últimos `meses` meses.
+    Retorna {colección: cantidad} con lo generado.
+    """
+    rnd = random.Random(semilla)
+    n = cantidades(total)
+    hoy = datetime.combine(date.today(), datetime.min.time(), tzinfo=timezone.utc)
+    dias = meses * 30
+    desde = hoy - timedelta(days=dias)
+
+    clientes = []
+    for i in range(n["clientes"]):
+        nombre = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}"
+        alta = _fecha_aleatoria(rnd, desde, dias)
+        clientes.append({
+            "dni": str(20_000_000 + i * 7),
+            "nombre": nombre,
+            "nombre_normalizado": normalizar_texto(nombre),
+            "telefono": f"11{rnd.randrange(10**8):08d}" if rnd.random() < 0.8 else "",
+            "email": f"{nombre.split()[0].lower()}{i}@mail.com" if rnd.random() < 0.4 else "",
+            "activo": rnd.random() < 0.9,
+            "created_at": alta,
+            "updated_at": alta,
+        })
+    _escribir(db, "clientes", ((c["dni"], c) for c in clientes))
+
+    productos = []
+    for i, (nombre, tipo, precio) in enumerate(PRODUCTOS):
+        productos.append((f"producto{i:03d}", {
+            "nombre": nombre,
+            "tipo": tipo,
+            "precio_centavos": precio,
+            "categoria": tipo,
+            "activo": rnd.random() < 0.9,
+            "created_at": desde,
+            "updated_at": desde,
+        }))
+    _escribir(db, "productos", productos)
+
+    def ingresos():
+        for _ in range(n["ingresos"]):
+            fecha = _fecha_aleatoria(rnd, desde, dias)
+            items = [
+                {"producto_id": f"producto{j:03d}", "nombre": PRODUCTOS[j][0], "precio_centavos": PRODUCTOS[j][2]}
+                for j in rnd.sample(range(len(PRODUCTOS)), rnd.choice((1, 1, 1, 2, 2, 3)))
+            ]
+            cliente = rnd.choice(clientes) if rnd.random() < 0.6 else None
+            yield _id_aleatorio(rnd), {
+                "fecha": fecha,
+                "cliente": cliente["nombre"] if cliente else "Cliente de paso",
+                "cliente_dni": cliente["dni"] if cliente else None,
+                "operador": rnd.choice(OPERADORES),
+                "metodo_pago": rnd.choice(METODOS_PAGO),
+                "consumicion": rnd.choice(("", "", "", "café", "gaseosa")),
+                "items": items,
+                "monto_total_centavos": sum(item["precio_centavos"] for item in items),
+                "created_at": fecha,
+                "updated_at": fecha,
+            }
+
+    def gastos():
+        for _ in range(n["gastos"]):
+            fecha = _fecha_aleatoria(rnd, desde, dias)
+            yield _id_aleatorio(rnd), {
+                "fecha": fecha,
+                "concepto": rnd.choice(CONCEPTOS),
+                "proveedor": f"Proveedor {rnd.randrange(30)}",
+                "descripcion": "",
+                "metodo_pago": rnd.choice(METODOS_PAGO),
+                "monto_centavos": rnd.randrange(5_000, 50_000) * 100,
+                "created_at": fecha,
+                "updated_at": fecha,
+            }
+
+    def membresias():
+        for _ in range(n["membresias"]):
+            tipo = rnd.choice(list(TIPOS_MEMBRESIA))
+            duracion, precio = TIPOS_MEMBRESIA[tipo]
+            alta = _fecha_aleatoria(rnd, desde, dias)
+            yield _id_aleatorio(rnd), {
+                "dni_cliente": rnd.choice(clientes)["dni"],
+                "tipo_membresia": tipo,
+                "fecha_alta": alta,
+                "fecha_vencimiento": alta + timedelta(days=duracion),
+                "precio_centavos": precio,
+                "metodo_pago": rnd.choice(METODOS_PAGO_MEMBRESIA),
+                "notas": "",
+                "activa": rnd.random() < 0.85,
+                "created_at": alta,
+                "updated_at": alta,
+            }
+
+    _escribir(db, "ingresos", ingresos())
+    _escribir(db, "gastos", gastos())
+    _escribir(db, "membresias", membresias())
+    db.collection("configuracion").document("precios_membresias").set(
+        {tipo: precio for tipo, (_, precio) in TIPOS_MEMBRESIA.items()}
+    )
+
+    # Proyección y resúmenes con las mismas tareas que se usan sobre los datos reales
+    repo = Repositorio(db)
+    repo.reconstruir_ultima_membresia()
+    year, month = desde.year, desde.month
+    while (year, month) <= (hoy.year, hoy.month):
+        repo.reconciliar_resumenes(year, month, corregir=True)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de la barbería en un backend local")
+    parser.add_argument("--escala", type=escala, default="1k", help="Cantidad total de documentos (1k, 100k, 1M), por defecto 1k")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--backend", choices=("memoria", "sqlite"), default="sqlite")
+    parser.add_argument("--ruta", default="benchmark.sqlite3", help="Archivo SQLite de destino")
+    args = parser.parse_args()
+
+    db = crear_db(args.backend, args.ruta)
+    inicio = time.perf_counter()
+    generados = generar(db, args.escala, args.semilla)
+    print(", ".join(f"{cantidad} {coleccion}" for coleccion, cantidad in generados.items()))
+    print(f"Datos generados en {time.perf_counter() - inicio:.1f} s.")
+
+
+if __name__ == "__main__":
+    main()
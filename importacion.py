@@ -0,0 +1,434 @@
+"""
+Importación masiva de ingresos, gastos y clientes desde planillas CSV o XLSX.
+
+Cada fila se valida y se convierte en el mismo documento que arman los formularios
+(montos en centavos, `fecha`, `metodo_pago`, `items`...). Si alguna fila es inválida no se
+escribe nada y se listan los errores (con --omitir-invalidas se importan las demás).
+Como en el formulario, un cliente cuyo DNI ya existe es una fila inválida: no se reemplaza.
+Si el cliente existente tiene los mismos datos (por ejemplo, lo escribió una importación
+interrumpida del mismo archivo) la fila se omite sin error.
+
+Los documentos se escriben en lotes de hasta TAMANO_LOTE_ESCRITURA operaciones, con varios
+lotes confirmándose en paralelo y un máximo de operaciones por segundo (por defecto 500, el
+ritmo inicial que recomienda Firestore para colecciones nuevas). Los IDs se derivan del
+contenido del archivo y el número de fila, y después de cada lote confirmado se guarda un
+punto de control: si la importación se interrumpe, volver a correr el mismo comando continúa
+desde la última fila confirmada sin duplicar documentos.
+
+Los resúmenes del Dashboard no se tocan durante la escritura; al terminar se reconcilian los
+meses afectados (ver mantenimiento.py) y se reabren en la cache en disco del Dashboard (ver
+cache_disco.py), para que se vuelvan a consultar. Una app que ya esté corriendo conserva los
+meses cerrados en memoria hasta reiniciarla o usar "Releer el mes" en el Dashboard.
+
+Columnas (la primera fila de la planilla son los encabezados):
+    ingresos: fecha, cliente, cliente_dni, operador, metodo_pago, monto, productos, consumicion
+              (productos: nombres del catálogo separados por ";"; sin monto se usa la suma de sus precios)
+    gastos:   fecha, concepto, proveedor, descripcion, metodo_pago, monto
+    clientes: dni, nombre, telefono, email, activo
+
+Uso:
+    python importacion.py ingresos historial_2023.xlsx --hoja Ingresos
+    python importacion.py gastos gastos.csv --validar
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from cache_disco import CacheParquet
+from repositorio import (
+    CONCEPTOS_GASTO,
+    METODOS_PAGO,
+    TAMANO_LOTE_ESCRITURA,
+    normalizar_texto,
+    obtener_repositorio,
+)
+
+COLECCIONES = ("ingresos", "gastos", "clientes")
+FORMATOS_FECHA = ("%Y-%m-%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y", "%d/%m/%Y %H:%M")
+VALORES_SI = {"si", "sí", "s", "true", "1", "x", "activo"}
+VALORES_NO = {"no", "n", "false", "0", "inactivo"}
+# Campos de un cliente importado que se comparan con el existente del mismo DNI
+CAMPOS_CLIENTE = ("nombre", "telefono", "email", "activo")
+# Cada cuántos segundos se informa el avance
+INTERVALO_AVANCE = 5
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+# --- Lectura de planillas ---
+
+def leer_filas(ruta, hoja=None):
+    """Itera las filas de un CSV o XLSX como dicts {columna: valor}, sin cargar el archivo completo."""
+    if ruta.lower().endswith((".xlsx", ".xlsm")):
+        yield from _leer_xlsx(ruta, hoja)
+        return
+    with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        for fila in csv.DictReader(archivo, dialect=dialecto):
+            yield {_columna(k): v for k, v in fila.items() if k is not None}
+
+
+def _leer_xlsx(ruta, hoja):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SystemExit("Para importar archivos .xlsx hay que instalar openpyxl (pip install openpyxl).")
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = (libro[hoja] if hoja else libro.active).iter_rows(values_only=True)
+        encabezados = [_columna(c) for c in next(filas, ())]
+        for valores in filas:
+            if any(v not in (None, "") for v in valores):
+                yield dict(zip(encabezados, valores))
+    finally:
+        libro.close()
+
+
+def _columna(nombre):
+    return normalizar_texto(str(nombre or "")).replace(" ", "_")
+
+
+# --- Validación ---
+
+def _texto(fila, campo, obligatorio=False):
+    valor = fila.get(campo)
+    valor = "" if valor is None else str(valor).strip()
+    if obligatorio and not valor:
+        raise FilaInvalida(f"falta '{campo}'")
+    return valor
+
+
+def _fecha(fila):
+    valor = fila.get("fecha")
+    if isinstance(valor, datetime):
+        return valor.replace(tzinfo=None)
+    if isinstance(valor, date):
+        return datetime.combine(valor, datetime.min.time())
+    texto = _texto(fila, "fecha", obligatorio=True)
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise FilaInvalida(f"fecha inválida '{texto}' (se espera AAAA-MM-DD o DD/MM/AAAA)")
+
+
+def _centavos(fila, campo="monto", obligatorio=True):
+    """Monto en pesos ("1234.5", "1.234,50" o un número de la planilla) convertido a centavos."""
+    valor = fila.get(campo)
+    if isinstance(valor, (int, float)):
+        texto = repr(valor)
+    else:
+        texto = _texto(fila, campo, obligatorio).replace("$", "").replace(" ", "")
+        if not texto:
+            return None
+        if "," in texto:
+            texto = texto.replace(".", "").replace(",", ".")
+    try:
+        centavos = (Decimal(texto) * 100).quantize(Decimal(1))
+    except InvalidOperation:
+        raise FilaInvalida(f"{campo} inválido '{valor}'")
+    if centavos <= 0:
+        raise FilaInvalida(f"{campo} debe ser mayor a cero")
+    return int(centavos)
+
+
+def _opcion(fila, campo, opciones):
+    valor = _texto(fila, campo, obligatorio=True).lower()
+    if valor not in opciones:
+        raise FilaInvalida(f"{campo} '{valor}' no es uno de: {', '.join(opciones)}")
+    return valor
+
+
+def _ingreso(fila, productos):
+    items = []
+    for nombre in filter(None, (n.strip() for n in _texto(fila, "productos").split(";"))):
+        producto = productos.get(normalizar_texto(nombre))
+        if producto is None:
+            raise FilaInvalida(f"producto '{nombre}' no está en el catálogo")
+        items.append({"producto_id": producto["id"], "nombre": producto["nombre"], "precio_centavos": producto["precio_centavos"]})
+    monto = _centavos(fila, obligatorio=not items)
+    return {
+        "fecha": _fecha(fila),
+        "cliente": _texto(fila, "cliente", obligatorio=True),
+        "cliente_dni": _texto(fila, "cliente_dni") or None,
+        "operador": _texto(fila, "operador"),
+        "metodo_pago": _opcion(fila, "metodo_pago", METODOS_PAGO),
+        "consumicion": _texto(fila, "consumicion"),
+        "items": items,
+        "monto_total_centavos": monto if monto is not None else sum(item["precio_centavos"] for item in items),
+    }
+
+
+def _gasto(fila):
+    return {
+        "fecha": _fecha(fila),
+        "concepto": _opcion(fila, "concepto", CONCEPTOS_GASTO),
+        "proveedor": _texto(fila, "proveedor"),
+        "descripcion": _texto(fila, "descripcion"),
+        "metodo_pago": _opcion(fila, "metodo_pago", METODOS_PAGO),
+        "monto_centavos": _centavos(fila),
+    }
+
+
+def _cliente(fila):
+    valor = fila.get("dni")
+    if isinstance(valor, (int, float)):  # Número leído de la planilla
+        dni = str(int(valor))
+    else:
+        dni = _texto(fila, "dni", obligatorio=True).replace(".", "")
+    if not dni.isdigit():
+        raise FilaInvalida(f"DNI inválido '{dni}'")
+    activo = _texto(fila, "activo").lower()
+    if activo and activo not in VALORES_SI | VALORES_NO:
+        raise FilaInvalida(f"activo inválido '{activo}' (sí/no)")
+    return {
+        "dni": dni,
+        "nombre": _texto(fila, "nombre", obligatorio=True),
+        "telefono": _texto(fila, "telefono"),
+        "email": _texto(fila, "email"),
+        "activo": activo not in VALORES_NO,
+    }
+
+
+class Convertidor:
+    """Convierte filas en documentos (id, data) de una colección."""
+
+    def __init__(self, coleccion, huella, repo):
+        self.coleccion = coleccion
+        self.huella = huella
+        self.dnis = set()
+        self.productos = {}
+        if coleccion == "ingresos":
+            self.productos = {normalizar_texto(p["nombre"]): p for p in repo.listar_productos()}
+
+    def documento(self, numero, fila):
+        """(id, data) de la fila; lanza FilaInvalida si no se puede importar."""
+        if self.coleccion == "clientes":
+            data = _cliente(fila)
+            if data["dni"] in self.dnis:
+                raise FilaInvalida(f"DNI {data['dni']} repetido en el archivo")
+            self.dnis.add(data["dni"])
+            return data["dni"], data
+        data = _ingreso(fila, self.productos) if self.coleccion == "ingresos" else _gasto(fila)
+        # ID fijo por archivo y fila, con el largo de los IDs automáticos de Firestore
+        return hashlib.sha1(f"{self.huella}:{numero}".encode()).hexdigest()[:20], data
+
+
+def huella_archivo(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+# --- Escritura ---
+
+class Limitador:
+    """Limita las operaciones por segundo (cubeta de fichas), compartido por los hilos de escritura."""
+
+    def __init__(self, por_segundo):
+        self.por_segundo = por_segundo
+        self._fichas = float(por_segundo)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self, cantidad):
+        # Reserva las fichas aunque no alcancen y espera hasta que se repongan (un lote puede superar el máximo por segundo)
+        with self._lock:
+            ahora = time.monotonic()
+            self._fichas = min(self.por_segundo, self._fichas + (ahora - self._ultimo) * self.por_segundo)
+            self._ultimo = ahora
+            self._fichas -= cantidad
+            espera = -self._fichas / self.por_segundo
+        if espera > 0:
+            time.sleep(espera)
+
+
+class PuntoDeControl:
+    """Última fila confirmada de la importación de un archivo, guardada en un JSON."""
+
+    def __init__(self, ruta, coleccion, huella):
+        self.ruta = ruta
+        self.datos = {"coleccion": coleccion, "huella": huella, "filas_confirmadas": 0, "meses": [], "completo": False}
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as archivo:
+                guardado = json.load(archivo)
+            if (guardado.get("coleccion"), guardado.get("huella")) != (coleccion, huella):
+                raise SystemExit(f"El punto de control {ruta} es de otro archivo o colección; borrarlo para empezar de nuevo.")
+            self.datos = guardado
+
+    def guardar(self, **cambios):
+        self.datos.update(cambios)
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(self.datos, archivo)
+        os.replace(temporal, self.ruta)
+
+
+def _lotes(documentos, tamano):
+    lote = []
+    for documento in documentos:
+        lote.append(documento)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def escribir(repo, coleccion, documentos, control, paralelos, limitador):
+    """
+    Escribe los documentos [(numero_fila, id, data)] en lotes, hasta `paralelos` confirmándose
+    a la vez. El punto de control avanza solo hasta el último lote sin lotes previos pendientes.
+    Retorna la cantidad de documentos escritos.
+    """
+    tamano = TAMANO_LOTE_ESCRITURA - 1 if coleccion == "clientes" else TAMANO_LOTE_ESCRITURA
+    pendientes = {}  # futuro -> (número de lote, última fila, cantidad de documentos)
+    terminados = {}  # número de lote -> (última fila, cantidad de documentos)
+    siguiente = 0
+    escritos = 0
+    inicio = ultimo_aviso = time.monotonic()
+
+    def confirmar(lote):
+        limitador.esperar(len(lote) + (coleccion == "clientes"))
+        repo.importar_lote(coleccion, [(doc_id, data) for _, doc_id, data in lote])
+
+    def recoger(hecho):
+        nonlocal siguiente, escritos
+        for futuro in hecho:
+            numero, ultima_fila, cantidad = pendientes.pop(futuro)
+            futuro.result()  # Propaga el error de escritura (el punto de control queda antes de este lote)
+            terminados[numero] = ultima_fila, cantidad
+        while siguiente in terminados:
+            ultima_fila, cantidad = terminados.pop(siguiente)
+            escritos += cantidad
+            siguiente += 1
+            control.guardar(filas_confirmadas=ultima_fila)
+
+    with ThreadPoolExecutor(max_workers=paralelos, thread_name_prefix="importacion") as pool:
+        for numero, lote in enumerate(_lotes(documentos, tamano)):
+            if len(pendientes) >= paralelos:
+                recoger(wait(pendientes, return_when=FIRST_COMPLETED).done)
+            pendientes[pool.submit(confirmar, lote)] = numero, lote[-1][0], len(lote)
+            if time.monotonic() - ultimo_aviso >= INTERVALO_AVANCE:
+                ultimo_aviso = time.monotonic()
+                print(f"  {escritos} documentos ({escritos / (ultimo_aviso - inicio):.0f}/s)...")
+        while pendientes:
+            recoger(wait(pendientes, return_when=FIRST_COMPLETED).done)
+    return escritos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa ingresos, gastos o clientes desde un CSV o XLSX")
+    parser.add_argument("coleccion", choices=COLECCIONES)
+    parser.add_argument("archivo")
+    parser.add_argument("--hoja", help="Hoja del XLSX (por defecto la activa)")
+    parser.add_argument("--validar", action="store_true", help="Solo valida el archivo, sin escribir")
+    parser.add_argument("--omitir-invalidas", action="store_true", help="Importa las filas válidas aunque haya inválidas")
+    parser.add_argument("--paralelos", type=int, default=4, help="Lotes confirmándose a la vez (por defecto 4)")
+    parser.add_argument("--ops-por-segundo", type=int, default=500, help="Máximo de escrituras por segundo (por defecto 500)")
+    parser.add_argument("--punto-de-control", help="Archivo del punto de control (por defecto <archivo>.importacion.json)")
+    args = parser.parse_args()
+
+    repo = obtener_repositorio()
+    huella = huella_archivo(args.archivo)
+    convertidor = Convertidor(args.coleccion, huella, repo)
+
+    # --- Validación completa antes de escribir ---
+    errores = []
+    meses = set()
+    clientes = {}  # dni -> (número de fila, data)
+    total = 0
+    for numero, fila in enumerate(leer_filas(args.archivo, args.hoja), start=2):
+        try:
+            doc_id, data = convertidor.documento(numero, fila)
+        except FilaInvalida as error:
+            errores.append((numero, str(error)))
+            continue
+        total += 1
+        if "fecha" in data:
+            meses.add((data["fecha"].year, data["fecha"].month))
+        if args.coleccion == "clientes":
+            clientes[doc_id] = numero, data
+
+    # --- Clientes que ya existen: no se reemplazan ---
+    existentes = repo.obtener_clientes(clientes, campos=list(CAMPOS_CLIENTE)) if clientes else {}
+    iguales = 0
+    for dni, cliente in existentes.items():
+        numero, data = clientes[dni]
+        total -= 1
+        if all(cliente.get(campo) == data[campo] for campo in CAMPOS_CLIENTE):
+            iguales += 1
+        else:
+            errores.append((numero, f"ya existe un cliente con DNI {dni}"))
+    errores.sort()
+    if iguales:
+        print(f"{iguales} clientes ya existen con los mismos datos; se omiten.")
+    for numero, error in errores[:50]:
+        print(f"Fila {numero}: {error}")
+    if len(errores) > 50:
+        print(f"... y {len(errores) - 50} errores más")
+    print(f"{total} filas válidas, {len(errores)} inválidas.")
+    if args.validar or not total or (errores and not args.omitir_invalidas):
+        if errores and not args.validar and not args.omitir_invalidas:
+            print("No se importó nada (corregir el archivo o usar --omitir-invalidas).")
+        return
+
+    control = PuntoDeControl(args.punto_de_control or f"{args.archivo}.importacion.json", args.coleccion, huella)
+    if control.datos["completo"]:
+        print("Este archivo ya fue importado.")
+        return
+    desde = control.datos["filas_confirmadas"]
+    if desde:
+        print(f"Continuando desde la fila {desde + 1}.")
+
+    # --- Escritura por lotes (el convertidor se recrea para que los DNIs repetidos se detecten igual) ---
+    convertidor = Convertidor(args.coleccion, huella, repo)
+
+    def documentos():
+        for numero, fila in enumerate(leer_filas(args.archivo, args.hoja), start=2):
+            try:
+                doc_id, data = convertidor.documento(numero, fila)
+            except FilaInvalida:
+                continue
+            if numero > desde and doc_id not in existentes:
+                yield numero, doc_id, data
+
+    inicio = time.perf_counter()
+    escritos = escribir(repo, args.coleccion, documentos(), control, args.paralelos, Limitador(args.ops_por_segundo))
+    segundos = time.perf_counter() - inicio
+    print(f"{escritos} documentos escritos en {segundos:.1f} s ({escritos / max(segundos, 1e-9):.0f} documentos/s).")
+
+    # --- Resúmenes y cache en disco de los meses afectados ---
+    pendientes = sorted(set(meses) - {tuple(m) for m in control.datos["meses"]})
+    if pendientes:
+        inicio = time.perf_counter()
+        cache_disco = CacheParquet()
+        reabiertos = 0
+        for year, month in pendientes:
+            repo.reconciliar_resumenes(year, month, corregir=True)
+            reabiertos += cache_disco.reabrir(year, month)
+            control.guardar(meses=control.datos["meses"] + [[year, month]])
+        print(f"Resúmenes de {len(pendientes)} mes(es) reconciliados en {time.perf_counter() - inicio:.1f} s"
+              f" ({reabiertos} reabierto(s) en la cache en disco).")
+    control.guardar(completo=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Índice en memoria de clientes activos para los selectores de Membresías e Ingresos.
+
+En lugar de mandar todos los clientes a un selectbox, las páginas buscan en este índice
+(compartido por todas las sesiones del proceso) y muestran solo las mejores coincidencias.
+Se buscan prefijos de las palabras del nombre (sin acentos ni mayúsculas), del DNI y del
+teléfono. Las altas, bajas y cambios de estado lo actualizan sin volver a leer la base;
+además se recarga completo cada `ttl` segundos para ver cambios hechos desde otros procesos.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+from repositorio import normalizar_texto
+
+
+def _solo_digitos(texto):
+    return "".join(c for c in str(texto or "") if c.isdigit())
+
+
+class _Prefijos:
+    """Claves ordenadas que apuntan a conjuntos de DNIs, con búsqueda por prefijo."""
+
+    def __init__(self):
+        self._claves = []
+        self._dnis = {}
+
+    def agregar(self, clave, dni):
+        if not clave:
+            return
+        if clave not in self._dnis:
+            bisect.insort(self._claves, clave)
+            self._dnis[clave] = set()
+        self._dnis[clave].add(dni)
+
+    def quitar(self, clave, dni):
+        dnis = self._dnis.get(clave)
+        if dnis is None:
+            return
+        dnis.discard(dni)
+        if not dnis:
+            del self._dnis[clave]
+            self._claves.pop(bisect.bisect_left(self._claves, clave))
+
+    def buscar(self, prefijo):
+        """{dni: True si alguna clave coincide exactamente, False si solo por prefijo}."""
+        encontrados = {}
+        for posicion in range(bisect.bisect_left(self._claves, prefijo), len(self._claves)):
+            clave = self._claves[posicion]
+            if not clave.startswith(prefijo):
+                break
+            for dni in self._dnis[clave]:
+                encontrados[dni] = encontrados.get(dni, False) or clave == prefijo
+        return encontrados
+
+
+class IndiceClientes:
+    """Índice de búsqueda de clientes activos. `cargar` retorna la lista completa de clientes activos."""
+
+    def __init__(self, cargar, ttl=600):
+        self.cargar = cargar
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cargado_en = None
+        self._vaciar()
+
+    def _vaciar(self):
+        self._clientes = {}
+        self._palabras = _Prefijos()
+        self._dnis = _Prefijos()
+        self._telefonos = _Prefijos()
+
+    def _asegurar_cargado(self):
+        # Se llama con el lock tomado
+        if self._cargado_en is not None and time.monotonic() - self._cargado_en < self.ttl:
+            return
+        self._vaciar()
+        for cliente in self.cargar():
+            self._agregar(cliente)
+        self._cargado_en = time.monotonic()
+
+    def _agregar(self, cliente):
+        dni = cliente.get("dni") or cliente.get("id")
+        self._quitar(dni)
+        entrada = {
+            "dni": dni,
+            "nombre": cliente.get("nombre", ""),
+            "telefono": cliente.get("telefono", ""),
+            "nombre_normalizado": normalizar_texto(cliente.get("nombre")),
+        }
+        self._clientes[dni] = entrada
+        for palabra in set(entrada["nombre_normalizado"].split()):
+            self._palabras.agregar(palabra, dni)
+        self._dnis.agregar(dni, dni)
+        self._telefonos.agregar(_solo_digitos(entrada["telefono"]), dni)
+
+    def _quitar(self, dni):
+        entrada = self._clientes.pop(dni, None)
+        if entrada is None:
+            return
+        for palabra in set(entrada["nombre_normalizado"].split()):
+            self._palabras.quitar(palabra, dni)
+        self._dnis.quitar(dni, dni)
+        self._telefonos.quitar(_solo_digitos(entrada["telefono"]), dni)
+
+    def actualizar(self, cliente):
+        """Refleja el alta o el cambio de un cliente: queda en el índice solo si está activo."""
+        with self._lock:
+            if self._cargado_en is None:
+                return  # Todavía no se cargó; la primera búsqueda lo leerá de la base
+            if cliente.get("activo", True):
+                self._agregar(cliente)
+            else:
+                self._quitar(cliente.get("dni") or cliente.get("id"))
+
+    def quitar(self, dni):
+        with self._lock:
+            self._quitar(dni)
+
+    def invalidar(self):
+        with self._lock:
+            self._cargado_en = None
+
+    def cantidad(self):
+        with self._lock:
+            self._asegurar_cargado()
+            return len(self._clientes)
+
+    def buscar(self, texto, limite=20):
+        """
+        Hasta `limite` clientes que coinciden con todas las palabras del texto, los que
+        coinciden exactamente primero y luego por nombre. Sin texto, los primeros por nombre.
+        """
+        terminos = normalizar_texto(texto).split()
+        with self._lock:
+            self._asegurar_cargado()
+            if not terminos:
+                primeros = heapq.nsmallest(limite, self._clientes.values(), key=lambda c: (c["nombre_normalizado"], c["dni"]))
+                return [dict(c) for c in primeros]
+
+            puntajes = None
+            for termino in terminos:
+                encontrados = self._palabras.buscar(termino)
+                if termino.isdigit():
+                    for coincidencias in (self._dnis.buscar(termino), self._telefonos.buscar(termino)):
+                        for dni, exacto in coincidencias.items():
+                            encontrados[dni] = encontrados.get(dni, False) or exacto
+                if puntajes is None:
+                    puntajes = {dni: 1 + exacto for dni, exacto in encontrados.items()}
+                else:
+                    puntajes = {dni: puntaje + 1 + encontrados[dni] for dni, puntaje in puntajes.items() if dni in encontrados}
+                if not puntajes:
+                    return []
+
+            mejores = heapq.nsmallest(
+                limite, puntajes.items(),
+                key=lambda par: (-par[1], self._clientes[par[0]]["nombre_normalizado"], par[0]),
+            )
+            return [dict(self._clientes[dni]) for dni, _ in mejores]
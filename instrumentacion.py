@@ -0,0 +1,408 @@
+"""
+Contabilidad de operaciones de base de datos por ejecución (rerun) de cada página.
+
+ClienteInstrumentado envuelve al cliente de Firestore (o a un backend local) y cuenta
+consultas, documentos leídos, escrituras y eliminaciones. Cada página ejecuta su contenido
+dentro de medir_pagina(nombre): al terminar se registra un log estructurado (JSON) con los
+totales y la duración, se avisa con un warning si se superó el presupuesto de la página y,
+con la variable de entorno BENJAS_DEBUG=1, se muestran los números en la barra lateral.
+
+Los fragmentos (@st.fragment) se decoran también con medir_pagina: cuando se vuelven a
+ejecutar solos, fuera del `with` de la página, su ejecución se mide igual. Los callbacks de
+los widgets corren antes que la página o el fragmento; con medir_callback sus operaciones
+suman a la ejecución que les sigue.
+
+Las operaciones hechas fuera de una página (scripts, benchmarks) solo suman a `totales`.
+"""
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from google.cloud import firestore as gcfs
+
+logger = logging.getLogger(__name__)
+
+# Máximos por ejecución de cada página. Se pueden redefinir con la variable de entorno
+# BENJAS_PRESUPUESTOS, un JSON como {"Dashboard": {"lecturas": 500, "segundos": 2}}.
+PRESUPUESTOS = {
+    "Membresías": {"lecturas": 1000},
+    "Clientes": {"lecturas": 1000},
+    "Ingresos": {"lecturas": 500},
+    "Gastos": {"lecturas": 50},
+    "Dashboard": {"lecturas": 2000},
+    "Productos": {"lecturas": 200},
+}
+
+# Ejecuciones recientes que se muestran en la barra lateral de depuración
+HISTORIAL_DEBUG = 10
+
+
+class Contador:
+    """Operaciones acumuladas; seguro para usar desde varios hilos."""
+
+    CAMPOS = ("consultas", "lecturas", "escrituras", "eliminaciones")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inicio = time.perf_counter()
+        for campo in self.CAMPOS:
+            setattr(self, campo, 0)
+
+    def sumar(self, **cantidades):
+        with self._lock:
+            for campo, cantidad in cantidades.items():
+                setattr(self, campo, getattr(self, campo) + cantidad)
+
+    def como_dict(self):
+        with self._lock:
+            datos = {campo: getattr(self, campo) for campo in self.CAMPOS}
+        datos["segundos"] = round(time.perf_counter() - self.inicio, 3)
+        return datos
+
+
+totales = Contador()
+# Contador de la ejecución en curso. Los hilos del pool de consultas lo heredan
+# ejecutando sus tareas con contextvars.copy_context().
+_contador_actual = contextvars.ContextVar("contador_operaciones", default=None)
+
+
+def _registrar(**cantidades):
+    totales.sumar(**cantidades)
+    actual = _contador_actual.get()
+    if actual is not None:
+        actual.sumar(**cantidades)
+
+
+# --- Envoltorios ---
+
+def _objetivo(valor):
+    """Objeto original detrás de un envoltorio (o el mismo valor si no está envuelto)."""
+    return getattr(valor, "_objetivo", valor)
+
+
+class _Envoltorio:
+    def __init__(self, objetivo):
+        self._objetivo = objetivo
+
+    def __getattr__(self, nombre):
+        return getattr(self._objetivo, nombre)
+
+
+class ConsultaInstrumentada(_Envoltorio):
+    """Envuelve una Query: cuenta una consulta y los documentos que devuelve."""
+
+    def _encadenar(metodo):
+        def encadenado(self, *args, **kwargs):
+            return ConsultaInstrumentada(getattr(self._objetivo, metodo)(*args, **kwargs))
+        encadenado.__name__ = metodo
+        return encadenado
+
+    where = _encadenar("where")
+    order_by = _encadenar("order_by")
+    limit = _encadenar("limit")
+    limit_to_last = _encadenar("limit_to_last")
+    offset = _encadenar("offset")
+    select = _encadenar("select")
+    start_at = _encadenar("start_at")
+    start_after = _encadenar("start_after")
+    end_at = _encadenar("end_at")
+    end_before = _encadenar("end_before")
+    del _encadenar
+
+    def stream(self, transaction=None, **kwargs):
+        cantidad = 0
+        try:
+            for snapshot in self._objetivo.stream(transaction=_objetivo(transaction), **kwargs):
+                cantidad += 1
+                yield snapshot
+        finally:
+            # Firestore cobra una lectura aunque la consulta no devuelva documentos
+            _registrar(consultas=1, lecturas=max(cantidad, 1))
+
+    def get(self, transaction=None, **kwargs):
+        return list(self.stream(transaction=transaction, **kwargs))
+
+    def count(self, alias=None):
+        return AgregacionInstrumentada(self._objetivo.count(alias=alias), alias)
+
+    def sum(self, field_ref, alias=None):
+        return AgregacionInstrumentada(self._objetivo.sum(field_ref, alias=alias))
+
+
+def _lecturas_agregacion(resultado, alias_count):
+    """Firestore cobra una lectura cada 1000 documentos que abarca la agregación (como mínimo una)."""
+    valores = {r.alias: r.value for r in (resultado[0] if resultado else [])}
+    return max(math.ceil((valores.get(alias_count) or 0) / 1000), 1)
+
+
+class AgregacionInstrumentada(_Envoltorio):
+    """Envuelve una AggregationQuery. Las lecturas se calculan con el count, si la agregación lo incluye."""
+
+    def __init__(self, objetivo, alias_count=None):
+        super().__init__(objetivo)
+        self._alias_count = alias_count
+
+    def count(self, alias=None):
+        self._objetivo.count(alias=alias)
+        self._alias_count = alias
+        return self
+
+    def sum(self, field_ref, alias=None):
+        self._objetivo.sum(field_ref, alias=alias)
+        return self
+
+    def get(self, transaction=None, **kwargs):
+        resultado = self._objetivo.get(transaction=_objetivo(transaction), **kwargs)
+        _registrar(consultas=1, lecturas=_lecturas_agregacion(resultado, self._alias_count))
+        return resultado
+
+
+class ColeccionInstrumentada(ConsultaInstrumentada):
+    def document(self, *args, **kwargs):
+        return DocumentoInstrumentado(self._objetivo.document(*args, **kwargs))
+
+    def add(self, document_data, *args, **kwargs):
+        _registrar(escrituras=1)
+        return self._objetivo.add(document_data, *args, **kwargs)
+
+
+class DocumentoInstrumentado(_Envoltorio):
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        _registrar(lecturas=1)
+        return self._objetivo.get(field_paths=field_paths, transaction=_objetivo(transaction), **kwargs)
+
+    def set(self, document_data, merge=False, **kwargs):
+        _registrar(escrituras=1)
+        return self._objetivo.set(document_data, merge=merge, **kwargs)
+
+    def update(self, field_updates, **kwargs):
+        _registrar(escrituras=1)
+        return self._objetivo.update(field_updates, **kwargs)
+
+    def delete(self, **kwargs):
+        _registrar(eliminaciones=1)
+        return self._objetivo.delete(**kwargs)
+
+    def collection(self, collection_id):
+        return ColeccionInstrumentada(self._objetivo.collection(collection_id))
+
+
+class EscritorInstrumentado(_Envoltorio):
+    """Envuelve un WriteBatch o una Transaction."""
+
+    def set(self, reference, document_data, merge=False):
+        _registrar(escrituras=1)
+        return self._objetivo.set(_objetivo(reference), document_data, merge=merge)
+
+    def update(self, reference, field_updates, **kwargs):
+        _registrar(escrituras=1)
+        return self._objetivo.update(_objetivo(reference), field_updates, **kwargs)
+
+    def delete(self, reference, **kwargs):
+        _registrar(eliminaciones=1)
+        return self._objetivo.delete(_objetivo(reference), **kwargs)
+
+    def __len__(self):
+        return len(self._objetivo)
+
+
+class ClienteInstrumentado(_Envoltorio):
+    """Envuelve un firestore.Client (o MemoriaClient/SQLiteClient) y cuenta sus operaciones."""
+
+    def collection(self, collection_path):
+        return ColeccionInstrumentada(self._objetivo.collection(collection_path))
+
+    def batch(self):
+        return EscritorInstrumentado(self._objetivo.batch())
+
+    def transaction(self, **kwargs):
+        return EscritorInstrumentado(self._objetivo.transaction(**kwargs))
+
+    def transactional(self, funcion):
+        """Como firestore.transactional, pero la función recibe la transacción instrumentada."""
+        base = getattr(self._objetivo, "transactional", gcfs.transactional)
+        envuelta = base(lambda transaccion, *args, **kwargs: funcion(EscritorInstrumentado(transaccion), *args, **kwargs))
+        return lambda transaccion, *args, **kwargs: envuelta(_objetivo(transaccion), *args, **kwargs)
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        cantidad = 0
+        try:
+            for snapshot in self._objetivo.get_all(
+                [_objetivo(ref) for ref in references], field_paths=field_paths, transaction=_objetivo(transaction), **kwargs
+            ):
+                cantidad += 1
+                yield snapshot
+        finally:
+            _registrar(consultas=1, lecturas=cantidad)
+
+
+
+# --- Cliente asíncrono (ver motor_async.py) ---
+
+class ConsultaAsyncInstrumentada(_Envoltorio):
+    """Envuelve una AsyncQuery: cuenta una consulta y los documentos que devuelve."""
+
+    def where(self, *args, **kwargs):
+        return ConsultaAsyncInstrumentada(self._objetivo.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return ConsultaAsyncInstrumentada(self._objetivo.order_by(*args, **kwargs))
+
+    def limit(self, *args, **kwargs):
+        return ConsultaAsyncInstrumentada(self._objetivo.limit(*args, **kwargs))
+
+    def select(self, *args, **kwargs):
+        return ConsultaAsyncInstrumentada(self._objetivo.select(*args, **kwargs))
+
+    def count(self, alias=None):
+        return AgregacionAsyncInstrumentada(self._objetivo.count(alias=alias), alias)
+
+    def sum(self, field_ref, alias=None):
+        return AgregacionAsyncInstrumentada(self._objetivo.sum(field_ref, alias=alias))
+
+    async def stream(self, transaction=None, **kwargs):
+        cantidad = 0
+        try:
+            async for snapshot in self._objetivo.stream(transaction=transaction, **kwargs):
+                cantidad += 1
+                yield snapshot
+        finally:
+            _registrar(consultas=1, lecturas=max(cantidad, 1))
+
+
+class AgregacionAsyncInstrumentada(AgregacionInstrumentada):
+    """Envuelve una AsyncAggregationQuery."""
+
+    async def get(self, transaction=None, **kwargs):
+        resultado = await self._objetivo.get(transaction=transaction, **kwargs)
+        _registrar(consultas=1, lecturas=_lecturas_agregacion(resultado, self._alias_count))
+        return resultado
+
+
+class ClienteAsyncInstrumentado(_Envoltorio):
+    """Envuelve un firestore.AsyncClient y cuenta sus lecturas (el motor asíncrono solo lee)."""
+
+    def collection(self, collection_path):
+        return ConsultaAsyncInstrumentada(self._objetivo.collection(collection_path))
+
+    async def get_all(self, references, field_paths=None, **kwargs):
+        cantidad = 0
+        try:
+            async for snapshot in self._objetivo.get_all(references, field_paths=field_paths, **kwargs):
+                cantidad += 1
+                yield snapshot
+        finally:
+            _registrar(consultas=1, lecturas=cantidad)
+
+
+# --- Páginas ---
+
+def presupuesto(pagina):
+    """Presupuesto de la página, con lo definido en BENJAS_PRESUPUESTOS por encima de los valores por defecto."""
+    resultado = dict(PRESUPUESTOS.get(pagina, {}))
+    configurado = os.environ.get("BENJAS_PRESUPUESTOS")
+    if configurado:
+        try:
+            resultado.update(json.loads(configurado).get(pagina, {}))
+        except (ValueError, AttributeError):
+            logger.warning("BENJAS_PRESUPUESTOS no es un JSON válido: %r", configurado)
+    return resultado
+
+
+def _excedidos(datos, limites):
+    return {campo: (datos[campo], maximo) for campo, maximo in limites.items() if datos.get(campo, 0) > maximo}
+
+
+def _ejecucion_streamlit():
+    """Contexto de la ejecución de Streamlit en curso, o None fuera de `streamlit run`."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def medir_callback(funcion):
+    """Decorador para los callbacks de widgets: sus operaciones suman a la próxima ejecución medida de la página."""
+    @functools.wraps(funcion)
+    def medido(*args, **kwargs):
+        contador = Contador()
+        token = _contador_actual.set(contador)
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            _contador_actual.reset(token)
+            if _ejecucion_streamlit() is not None:
+                import streamlit as st
+
+                pendientes = st.session_state.setdefault("operaciones_callbacks", {})
+                for campo, cantidad in contador.como_dict().items():
+                    if campo in Contador.CAMPOS:
+                        pendientes[campo] = pendientes.get(campo, 0) + cantidad
+    return medido
+
+
+@contextmanager
+def medir_pagina(pagina):
+    """
+    Cuenta las operaciones de una ejecución de la página (o de un fragmento que se vuelve a
+    ejecutar solo), más las de los callbacks que la precedieron. Al terminar las registra en
+    el log y, si BENJAS_DEBUG está activo, las muestra en la barra lateral.
+    Se puede usar como decorador. Anidada (un fragmento dentro de la ejecución completa de la
+    página) suma al contador que ya está activo.
+    """
+    actual = _contador_actual.get()
+    if actual is not None:
+        yield actual
+        return
+    contador = Contador()
+    ctx = _ejecucion_streamlit()
+    if ctx is not None:
+        import streamlit as st
+
+        contador.sumar(**st.session_state.pop("operaciones_callbacks", {}))
+    token = _contador_actual.set(contador)
+    try:
+        yield contador
+    finally:
+        _contador_actual.reset(token)
+        datos = contador.como_dict()
+        excedidos = _excedidos(datos, presupuesto(pagina))
+        logger.info(json.dumps({"evento": "operaciones_pagina", "pagina": pagina, **datos}, ensure_ascii=False))
+        for campo, (valor, maximo) in excedidos.items():
+            logger.warning(json.dumps(
+                {"evento": "presupuesto_excedido", "pagina": pagina, "campo": campo, "valor": valor, "maximo": maximo},
+                ensure_ascii=False,
+            ))
+    # Solo si la página terminó normalmente (no tras st.rerun() o st.stop())
+    if os.environ.get("BENJAS_DEBUG"):
+        _mostrar_debug(pagina, datos, excedidos, ctx)
+
+
+def _mostrar_debug(pagina, datos, excedidos, ctx):
+    import streamlit as st
+
+    historial = st.session_state.setdefault("debug_operaciones", [])
+    historial.append(dict(datos, pagina=pagina))
+    del historial[:-HISTORIAL_DEBUG]
+    # Un fragmento no puede escribir en la barra lateral: se ve en la próxima ejecución completa
+    if ctx is not None and ctx.fragment_ids_this_run:
+        return
+
+    with st.sidebar.expander("🛠️ Operaciones de base de datos", expanded=bool(excedidos)):
+        st.caption(f"{pagina}: última ejecución")
+        col1, col2 = st.columns(2)
+        col1.metric("Consultas", datos["consultas"])
+        col2.metric("Lecturas", datos["lecturas"])
+        col1.metric("Escrituras", datos["escrituras"])
+        col2.metric("Eliminaciones", datos["eliminaciones"])
+        st.caption(f"⏱️ {datos['segundos']:.2f} s")
+        for campo, (valor, maximo) in excedidos.items():
+            st.warning(f"Presupuesto de {campo} excedido: {valor} (máximo {maximo})")
+        st.dataframe(list(reversed(historial)), hide_index=True)
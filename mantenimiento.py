@@ -0,0 +1,97 @@
+"""
+Tareas de mantenimiento de datos.
+
+Uso:
+    python mantenimiento.py reconstruir-ultima-membresia
+    python mantenimiento.py normalizar-clientes
+    python mantenimiento.py reconciliar-resumenes [--desde AAAA-MM] [--hasta AAAA-MM] [--corregir]
+    python mantenimiento.py reconstruir-resumenes [--desde AAAA-MM] [--hasta AAAA-MM]
+    python mantenimiento.py reabrir-mes AAAA-MM [AAAA-MM ...]
+"""
+import argparse
+from datetime import date, datetime
+
+from cache_disco import CacheParquet
+from repositorio import obtener_repositorio
+
+
+def _mes(valor):
+    fecha = datetime.strptime(valor, "%Y-%m")
+    return fecha.year, fecha.month
+
+
+def _meses(desde, hasta):
+    year, month = desde
+    while (year, month) <= hasta:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def reconciliar_resumenes(repo, desde, hasta, corregir):
+    """Compara (y opcionalmente corrige) los resúmenes mes a mes. Retorna la cantidad de meses con diferencias."""
+    meses_con_diferencias = 0
+    for year, month in _meses(desde, hasta):
+        problemas = repo.reconciliar_resumenes(year, month, corregir=corregir)
+        if not problemas:
+            continue
+        meses_con_diferencias += 1
+        print(f"{year:04d}-{month:02d}: {len(problemas)} período(s) con diferencias" + (" (corregido)" if corregir else ""))
+        for periodo, diferencias in problemas.items():
+            for campo, esperado, guardado in diferencias:
+                print(f"    {periodo} {campo}: esperado {esperado}, guardado {guardado}")
+    return meses_con_diferencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento de Benjas Barber Club")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser(
+        "reconstruir-ultima-membresia",
+        help="Reconstruye la proyección 'ultima_membresia' desde la colección de membresías"
+             " (necesario para que los filtros por estado incluyan las membresías sin el campo 'activa')",
+    )
+    subparsers.add_parser(
+        "normalizar-clientes",
+        help="Completa nombre_normalizado en los clientes (necesario para el listado paginado y la búsqueda)",
+    )
+    for comando, ayuda in (
+        ("reconciliar-resumenes", "Compara los resúmenes diarios/mensuales con los datos originales"),
+        ("reconstruir-resumenes", "Recalcula los resúmenes diarios/mensuales desde los datos originales"),
+    ):
+        sub = subparsers.add_parser(comando, help=ayuda)
+        sub.add_argument("--desde", type=_mes, default=(2023, 1), help="Primer mes (AAAA-MM), por defecto 2023-01")
+        sub.add_argument("--hasta", type=_mes, default=(date.today().year, date.today().month), help="Último mes (AAAA-MM), por defecto el actual")
+        if comando == "reconciliar-resumenes":
+            sub.add_argument("--corregir", action="store_true", help="Reescribe los resúmenes que no coinciden")
+    sub = subparsers.add_parser(
+        "reabrir-mes",
+        help="Borra la cache en disco del Dashboard de meses cerrados corregidos (se vuelven a consultar)",
+    )
+    sub.add_argument("meses", type=_mes, nargs="+", help="Meses (AAAA-MM)")
+    args = parser.parse_args()
+
+    if args.comando == "reabrir-mes":
+        cache = CacheParquet()
+        for year, month in args.meses:
+            estado = "reabierto" if cache.reabrir(year, month) else "no estaba en la cache"
+            print(f"{year:04d}-{month:02d}: {estado}.")
+        print("Los procesos de la app en ejecución lo releen al reiniciarse o con el botón del Dashboard.")
+        return
+    repo = obtener_repositorio()
+
+    if args.comando == "reconstruir-ultima-membresia":
+        total = repo.reconstruir_ultima_membresia()
+        print(f"Proyección reconstruida para {total} cliente(s).")
+    elif args.comando == "normalizar-clientes":
+        total = repo.completar_nombres_normalizados()
+        print(f"{total} cliente(s) actualizado(s).")
+    elif args.comando == "reconciliar-resumenes":
+        meses = reconciliar_resumenes(repo, args.desde, args.hasta, args.corregir)
+        print(f"{meses} mes(es) con diferencias." if meses else "Los resúmenes coinciden con los datos.")
+    elif args.comando == "reconstruir-resumenes":
+        meses = reconciliar_resumenes(repo, args.desde, args.hasta, corregir=True)
+        print(f"Resúmenes reconstruidos ({meses} mes(es) corregidos).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Motor de lectura asíncrono para cargar los datos del Dashboard.
+
+Las consultas de un mes (ingresos, gastos y membresías), las de varios meses, las
+agregaciones de los KPIs y los lotes de lecturas de documentos sueltos (los nombres de los
+clientes) se lanzan juntas sobre el cliente asíncrono de Firestore. Un semáforo limita las consultas simultáneas de todo el
+proceso, y la demora de una carga es la de la consulta más lenta y no la suma.
+
+Streamlit ejecuta las páginas en hilos sin event loop. Por eso el motor mantiene un loop
+propio en un hilo aparte, y `ejecutar(corrutina)` es el adaptador sincrónico: la programa en
+ese loop y espera el resultado. El cliente asíncrono se crea dentro del loop, porque sus
+canales gRPC quedan ligados a él. Las corrutinas heredan el contexto de quien llama a
+`ejecutar`, así que sus lecturas suman al contador de la página (ver instrumentacion.py).
+
+Los backends locales no tienen cliente asíncrono. Con ellos cada consulta corre con el
+repositorio sincrónico en un hilo (asyncio.to_thread), con el mismo límite de concurrencia.
+"""
+import asyncio
+import threading
+
+from google.cloud import firestore as gcfs
+
+from instrumentacion import ClienteAsyncInstrumentado
+from repositorio import TAMANO_LOTE_LECTURA, crear_db_async, totales_agregacion
+from resumenes import CAMPO_FECHA, CAMPO_MONTO
+
+# Máximo de consultas simultáneas del proceso, para no superar las cuotas de Firestore
+MAX_CONSULTAS_CONCURRENTES = 4
+
+
+class MotorAsync:
+    """Lecturas concurrentes sobre un event loop propio, con un adaptador sincrónico."""
+
+    def __init__(self, repo, crear_cliente_async=crear_db_async, max_concurrentes=MAX_CONSULTAS_CONCURRENTES):
+        self.repo = repo  # Para los backends sin cliente asíncrono
+        self.crear_cliente_async = crear_cliente_async
+        self.max_concurrentes = max_concurrentes
+        self._lock = threading.Lock()
+        self._loop = None
+        self._limite = None
+        self._cliente = None
+
+    def _iniciar(self):
+        # Se llama con self._lock tomado
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="motor_async", daemon=True).start()
+
+        async def preparar():
+            self._limite = asyncio.Semaphore(self.max_concurrentes)
+            cliente = self.crear_cliente_async()
+            self._cliente = ClienteAsyncInstrumentado(cliente) if cliente is not None else None
+
+        try:
+            asyncio.run_coroutine_threadsafe(preparar(), loop).result()
+        except BaseException:
+            loop.call_soon_threadsafe(loop.stop)
+            raise
+        self._loop = loop
+
+    def ejecutar(self, corrutina):
+        """Adaptador sincrónico: ejecuta la corrutina en el loop del motor y retorna su resultado."""
+        with self._lock:
+            if self._loop is None:
+                self._iniciar()
+        return asyncio.run_coroutine_threadsafe(corrutina, self._loop).result()
+
+    async def recorrer_entre(self, coleccion, campo, desde, hasta, agregar, campos=None):
+        """
+        Llama a agregar(documento) con cada documento (con su id) cuyo `campo` está en el rango,
+        a medida que llegan, como Repositorio.iterar_entre (también con `campos`). Retorna la
+        cantidad de documentos.
+        """
+        async with self._limite:
+            if self._cliente is None:
+                return await asyncio.to_thread(_recorrer, self.repo.iterar_entre(coleccion, campo, desde, hasta, campos), agregar)
+            query = (
+                self._cliente.collection(coleccion)
+                .where(filter=gcfs.FieldFilter(campo, ">=", desde))
+                .where(filter=gcfs.FieldFilter(campo, "<=", hasta))
+            )
+            if campos:
+                query = query.select(campos)
+            cantidad = 0
+            async for snapshot in query.stream():
+                data = snapshot.to_dict()
+                data["id"] = snapshot.id
+                agregar(data)
+                cantidad += 1
+            return cantidad
+
+    async def totales_entre(self, coleccion, desde, hasta):
+        """Como Repositorio.totales_entre: {"cantidad", "centavos"} con una consulta de agregación."""
+        async with self._limite:
+            if self._cliente is None:
+                return await asyncio.to_thread(self.repo.totales_entre, coleccion, desde, hasta)
+            campo = CAMPO_FECHA[coleccion]
+            agregacion = (
+                self._cliente.collection(coleccion)
+                .where(filter=gcfs.FieldFilter(campo, ">=", desde))
+                .where(filter=gcfs.FieldFilter(campo, "<=", hasta))
+                .count(alias="cantidad")
+                .sum(CAMPO_MONTO[coleccion], alias="centavos")
+            )
+            return totales_agregacion(await agregacion.get())
+
+    async def obtener_nombres_clientes(self, dnis):
+        """Como Repositorio.obtener_nombres_clientes, pero con los lotes de lectura en paralelo. Retorna ({dni: nombre}, lecturas)."""
+        dnis = [dni for dni in dict.fromkeys(dnis) if dni]
+        lotes = [dnis[inicio:inicio + TAMANO_LOTE_LECTURA] for inicio in range(0, len(dnis), TAMANO_LOTE_LECTURA)]
+        nombres = {}
+        lecturas = 0
+        for nombres_lote, lecturas_lote in await asyncio.gather(*(self._nombres_lote(lote) for lote in lotes)):
+            nombres.update(nombres_lote)
+            lecturas += lecturas_lote
+        return nombres, lecturas
+
+    async def _nombres_lote(self, dnis):
+        async with self._limite:
+            if self._cliente is None:
+                return await asyncio.to_thread(self.repo.obtener_nombres_clientes, dnis)
+            refs = [self._cliente.collection("clientes").document(dni) for dni in dnis]
+            nombres = {}
+            lecturas = 0
+            async for cliente_doc in self._cliente.get_all(refs, field_paths=["nombre"]):
+                lecturas += 1
+                if cliente_doc.exists:
+                    nombres[cliente_doc.id] = cliente_doc.to_dict().get("nombre", "Cliente no encontrado")
+            return nombres, lecturas
+
+
+def _recorrer(documentos, agregar):
+    cantidad = 0
+    for doc in documentos:
+        agregar(doc)
+        cantidad += 1
+    return cantidad
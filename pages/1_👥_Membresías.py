@@ -1,40 +1,116 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore as admin_fs
-from google.cloud import firestore as gcfs
 from datetime import datetime, timedelta
 import pandas as pd
+from utils import (
+    aviso_clientes_truncados,
+    avisar,
+    buscar_clientes,
+    cambiar_estado_membresias,
+    crear_membresia,
+    eliminar_membresias,
+    guardar_precios_membresias,
+    indice_clientes,
+    medir_callback,
+    medir_pagina,
+    mostrar_avisos,
+    obtener_precios_membresias,
+    obtener_ultima_membresia_cacheada,
+    repo,
+)
 
-# --- Inicialización Firebase ---
-# Reutiliza la misma lógica para evitar re-inicializar la app
-if not firebase_admin._apps:
-    cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
-    firebase_admin.initialize_app(cred)
-db = admin_fs.client()
+# Coincidencias que se muestran en el selector de clientes
+MAX_CLIENTES_SELECTOR = 20
 
 
+def rango_vencimiento(filtro_vencimiento, hoy):
+    """
+    Rango [desde, antes) de fecha_vencimiento de cada filtro de vencimiento, con los mismos
+    cortes que el estado que muestra el listado. None si ese extremo no se filtra.
+    """
+    inicio_hoy = datetime.combine(hoy, datetime.min.time())
+    fin_por_vencer = inicio_hoy + timedelta(days=8)
+    return {
+        "Vigentes": (fin_por_vencer, None),
+        "Vencidas": (None, inicio_hoy),
+        "Por vencer (7 días)": (inicio_hoy, fin_por_vencer),
+    }.get(filtro_vencimiento, (None, None))
 
 
+def cargar_ultimas_membresias(filtro_estado, filtro_vencimiento, hoy):
+    """
+    Lee de la proyección la última membresía de los clientes que cumplen los filtros y la
+    guarda en la sesión. Los filtros se resuelven en la consulta (solo se leen los documentos
+    que coinciden); se vuelve a leer solo si cambian los filtros o el día.
+    """
+    consulta = (filtro_estado, filtro_vencimiento, hoy)
+    if st.session_state.get("membresias_consulta") != consulta or "membresias_lista" not in st.session_state:
+        activa = {"Activas": True, "Inactivas": False}.get(filtro_estado)
+        vence_desde, vence_antes = rango_vencimiento(filtro_vencimiento, hoy)
+        st.session_state["membresias_lista"] = {
+            m["dni_cliente"]: m
+            for m in repo.listar_ultimas_membresias(activa=activa, vence_desde=vence_desde, vence_antes=vence_antes)
+        }
+        st.session_state["membresias_consulta"] = consulta
+    return st.session_state["membresias_lista"]
+
+
+def ultimas_membresias():
+    """
+    Última membresía de cada cliente {dni: membresía} del listado, guardada en la sesión;
+    las acciones del listado la actualizan en el lugar.
+    """
+    return st.session_state.setdefault("membresias_lista", {})
+
+
+def membresias_seleccionadas():
+    """[(membresia_id, dni_cliente)] marcadas en el listado."""
+    return [
+        (m["id"], dni) for dni, m in ultimas_membresias().items()
+        if st.session_state.get(f"sel_memb_{m['id']}")
+    ]
+
+
+def limpiar_seleccion(membresias):
+    for membresia_id, _ in membresias:
+        st.session_state.pop(f"sel_memb_{membresia_id}", None)
+
+
+@medir_callback
+def cambiar_estado_listado(membresias, activa):
+    """Callback: activa o desactiva las membresías en una escritura y actualiza el listado sin releerlo."""
+    if not membresias:
+        avisar("Seleccione al menos una membresía.")
+        return
+    cambiar_estado_membresias(membresias, activa)
+    lista = ultimas_membresias()
+    for membresia_id, dni in membresias:
+        if dni in lista and lista[dni]["id"] == membresia_id:
+            lista[dni]["activa"] = activa
+    limpiar_seleccion(membresias)
+    avisar(f"{'✅ Activadas' if activa else '🚫 Desactivadas'}: {len(membresias)} membresía(s).")
+
+
+@medir_callback
+def eliminar_listado(membresias):
+    """Callback: elimina las membresías en una escritura y reemplaza en el listado la última de cada cliente."""
+    if not membresias:
+        avisar("Seleccione al menos una membresía.")
+        return
+    proyecciones = eliminar_membresias(membresias)
+    lista = ultimas_membresias()
+    for dni, proyeccion in proyecciones.items():
+        if proyeccion is None:
+            lista.pop(dni, None)
+        else:
+            lista[dni] = dict(proyeccion, id=proyeccion["membresia_id"])
+    limpiar_seleccion(membresias)
+    avisar(f"🗑️ Eliminadas: {len(membresias)} membresía(s).")
+
 
 def membresias_ui():
     st.subheader("💳 Gestión de Membresías")
 
-    # Obtener lista de clientes activos para el selectbox
-    clientes_activos = db.collection("clientes").where(filter=gcfs.FieldFilter("activo", "==", True)).stream()
-    clientes_options = {}
-    clientes_list = []
-    
-    for c in clientes_activos:
-        data = c.to_dict()
-        clientes_list.append((data['nombre'], data['dni']))
-    
-    # Ordenar en Python en lugar de Firebase
-    clientes_list.sort(key=lambda x: x[0])  # Ordenar por nombre
-    
-    for nombre, dni in clientes_list:
-        clientes_options[f"{nombre} (DNI: {dni})"] = dni
-
-    if not clientes_options:
+    if not indice_clientes.cantidad():
         st.warning("No hay clientes activos. Primero debe agregar clientes.")
         return
 
@@ -53,37 +129,8 @@ def membresias_ui():
         if not dni_cliente:
             return 'sin_membresia', None
             
-        # Obtener la ÚLTIMA membresía del cliente (la más reciente)
-        membresias_cliente = db.collection("membresias").where(filter=gcfs.FieldFilter("dni_cliente", "==", dni_cliente)).stream()
-        
-        # Convertir a lista y ordenar en Python
-        membresias_list = []
-        for m in membresias_cliente:
-            data = m.to_dict()
-            data["id"] = m.id
-            membresias_list.append(data)
-        
-        # Ordenar por created_at descendente (más reciente primero) y tomar la primera
-        if not membresias_list:
-            return 'sin_membresia', "Sin membresías"
-            
-        # Ordenar por created_at si existe, sino por fecha_alta
-        def get_sort_key(m):
-            if "created_at" in m and m["created_at"]:
-                return m["created_at"]
-            elif "fecha_alta" in m and m["fecha_alta"]:
-                return m["fecha_alta"]
-            else:
-                return datetime.min  # Para membresías sin fecha
-        
-        membresias_list.sort(key=get_sort_key, reverse=True)
-        ultima_membresia = membresias_list[0]
-        
-        # Convertir fechas
-        if "fecha_vencimiento" in ultima_membresia:
-            ultima_membresia["fecha_vencimiento"] = ultima_membresia["fecha_vencimiento"].date()
-        if "fecha_alta" in ultima_membresia:
-            ultima_membresia["fecha_alta"] = ultima_membresia["fecha_alta"].date()
+        # Obtener la ÚLTIMA membresía del cliente (una lectura, cacheada en la sesión)
+        ultima_membresia = obtener_ultima_membresia_cacheada(dni_cliente)
         
         if not ultima_membresia:
             return 'sin_membresia', "Sin membresías"
@@ -93,7 +140,7 @@ def membresias_ui():
             return 'sin_membresia', "Última membresía desactivada"
         
         hoy = datetime.now().date()
-        fecha_venc = ultima_membresia["fecha_vencimiento"]
+        fecha_venc = ultima_membresia["fecha_vencimiento"].date()
         tipo_membresia = ultima_membresia.get("tipo_membresia", "N/A")
         
         if fecha_venc < hoy:
@@ -109,20 +156,35 @@ def membresias_ui():
     # Controles fuera del formulario para mayor interactividad
     col1, col2 = st.columns(2)
     with col1:
+        # Solo las mejores coincidencias de la búsqueda van al selectbox. El texto se aplica
+        # al presionar Enter o salir del campo (st.text_input no vuelve a ejecutar por tecla)
+        busqueda_cliente = st.text_input(
+            "Buscar Cliente",
+            placeholder="Nombre, DNI o teléfono",
+            key="busqueda_cliente_membresia",
+        )
+        # Se pide uno más para saber si quedan coincidencias afuera
+        clientes = buscar_clientes(busqueda_cliente, MAX_CLIENTES_SELECTOR + 1)
+        clientes_options = {
+            f"{c['nombre']} (DNI: {c['dni']})": c['dni']
+            for c in clientes[:MAX_CLIENTES_SELECTOR]
+        }
         cliente_seleccionado = st.selectbox(
             "Seleccionar Cliente",
-            options=list(clientes_options.keys()) if clientes_options else ["No hay clientes activos"],
+            options=list(clientes_options.keys()) if clientes_options else ["Sin coincidencias"],
             disabled=not bool(clientes_options),
             help="Seleccione el cliente para la membresía",
             key="cliente_selector"
         )
+        if len(clientes) > MAX_CLIENTES_SELECTOR:
+            st.caption(aviso_clientes_truncados(busqueda_cliente, MAX_CLIENTES_SELECTOR))
         
         # Obtener estado del cliente seleccionado
         dni_cliente_actual = None
         estado_cliente = 'sin_membresia'
         mensaje_estado = ""
         
-        if clientes_options and cliente_seleccionado != "No hay clientes activos":
+        if clientes_options and cliente_seleccionado != "Sin coincidencias":
             dni_cliente_actual = clientes_options[cliente_seleccionado]
             estado_cliente, mensaje_estado = obtener_estado_cliente(dni_cliente_actual)
             
@@ -209,9 +271,8 @@ def membresias_ui():
         # Obtener precio sugerido desde la configuración
         precio_sugerido = 5000.0  # Valor por defecto
         try:
-            precios_config = db.collection("configuracion").document("precios_membresias").get()
-            if precios_config.exists:
-                precios = precios_config.to_dict()
+            precios = obtener_precios_membresias()
+            if precios:
                 precio_sugerido = precios.get(tipo_membresia, 500000) / 100  # Convertir de centavos
         except:
             pass  # Usar valor por defecto si hay error
@@ -240,7 +301,7 @@ def membresias_ui():
         with col4:
             # Mostrar resumen con estado del cliente
             st.markdown("**Resumen:**")
-            if clientes_options and cliente_seleccionado != "No hay clientes activos":
+            if clientes_options and cliente_seleccionado != "Sin coincidencias":
                 cliente_nombre = cliente_seleccionado.split(' (')[0]
                 st.write(f"👤 Cliente: {cliente_nombre}")
                 st.write(f"💳 Tipo: {tipo_membresia}")
@@ -265,7 +326,7 @@ def membresias_ui():
         submitted = st.form_submit_button("➕ Crear Membresía")
 
         if submitted:
-            if clientes_options and cliente_seleccionado != "No hay clientes activos":
+            if clientes_options and cliente_seleccionado != "Sin coincidencias":
                 dni_cliente = clientes_options[cliente_seleccionado]
                 
                 # Recalcular fecha de vencimiento con los valores actuales
@@ -286,12 +347,15 @@ def membresias_ui():
                     "metodo_pago": metodo_pago,
                     "notas": notas,
                     "activa": True,
-                    "created_at": gcfs.SERVER_TIMESTAMP,
-                    "updated_at": gcfs.SERVER_TIMESTAMP,
                 }
                 
-                db.collection("membresias").add(doc)
                 cliente_nombre = cliente_seleccionado.split(' (')[0]
+                membresia_id = crear_membresia(doc, cliente_nombre)
+                # La nueva membresía pasa a ser la última del cliente en el listado
+                if "membresias_lista" in st.session_state:
+                    st.session_state["membresias_lista"][dni_cliente] = dict(
+                        doc, id=membresia_id, membresia_id=membresia_id, nombre_cliente=cliente_nombre
+                    )
                 metodo_pago_display = metodo_pago.replace('_', ' ').title()
                 st.success(f"✅ Membresía {tipo_membresia} creada para **{cliente_nombre}**")
                 st.success(f"📅 Vence el: **{fecha_vencimiento_final.strftime('%d/%m/%Y')}**")
@@ -301,7 +365,17 @@ def membresias_ui():
 
     st.divider()
 
-    # --- Listado de membresías ---
+    listado_membresias_ui()
+
+
+@st.fragment
+@medir_pagina("Membresías")
+def listado_membresias_ui():
+    """
+    Listado de la última membresía de cada cliente. Es un fragmento: los filtros, la selección
+    y las acciones vuelven a ejecutar solo el listado, que se arma desde la copia de la sesión.
+    """
+    mostrar_avisos()
     st.write("**Lista de Membresías (Última por Cliente)**")
     
     # Filtros
@@ -311,62 +385,33 @@ def membresias_ui():
     with col2:
         filtro_vencimiento = st.selectbox("Filtrar por vencimiento", ["Todas", "Vigentes", "Vencidas", "Por vencer (7 días)"])
     
-    # Obtener todas las membresías y agrupar por cliente para obtener la más reciente
-    todas_membresias = db.collection("membresias").stream()
-    
-    # Convertir a lista y ordenar en Python
-    todas_membresias_list = []
-    for m in todas_membresias:
-        data = m.to_dict()
-        data["id"] = m.id
-        todas_membresias_list.append(data)
-    
-    # Ordenar por created_at descendente (más reciente primero)
-    def get_sort_key(m):
-        if "created_at" in m and m["created_at"]:
-            return m["created_at"]
-        elif "fecha_alta" in m and m["fecha_alta"]:
-            return m["fecha_alta"]
-        else:
-            return datetime.min
-    
-    todas_membresias_list.sort(key=get_sort_key, reverse=True)
-    
-    # Diccionario para almacenar la última membresía de cada cliente
-    ultimas_membresias = {}
+    with col3:
+        if st.button("🔄 Actualizar", help="Volver a leer el listado desde la base"):
+            st.session_state.pop("membresias_lista", None)
+
+    # Última membresía de cada cliente que cumple los filtros, guardada en la sesión (un documento por cliente)
     hoy = datetime.now().date()
+    membresias_data = []
+    for original in cargar_ultimas_membresias(filtro_estado, filtro_vencimiento, hoy).values():
+        # Las fechas y el estado se calculan sobre una copia: el listado de la sesión queda como en la base
+        data = dict(original)
+        if "fecha_alta" in data:
+            data["fecha_alta"] = data["fecha_alta"].date()
+        if "fecha_vencimiento" in data:
+            data["fecha_vencimiento"] = data["fecha_vencimiento"].date()
+
+        # Calcular estado de vencimiento
+        if data["fecha_vencimiento"] < hoy:
+            data["estado_vencimiento"] = "Vencida"
+        elif data["fecha_vencimiento"] <= hoy + timedelta(days=7):
+            data["estado_vencimiento"] = "Por vencer"
+        else:
+            data["estado_vencimiento"] = "Vigente"
+
+        membresias_data.append(data)
     
-    for data in todas_membresias_list:
-        dni_cliente = data.get("dni_cliente")
-        
-        # Solo mantener la primera (más reciente) membresía de cada cliente
-        if dni_cliente not in ultimas_membresias:
-            # Convertir fechas
-            if "fecha_alta" in data:
-                data["fecha_alta"] = data["fecha_alta"].date()
-            if "fecha_vencimiento" in data:
-                data["fecha_vencimiento"] = data["fecha_vencimiento"].date()
-                
-            # Calcular estado de vencimiento
-            if data["fecha_vencimiento"] < hoy:
-                data["estado_vencimiento"] = "Vencida"
-            elif data["fecha_vencimiento"] <= hoy + timedelta(days=7):
-                data["estado_vencimiento"] = "Por vencer"
-            else:
-                data["estado_vencimiento"] = "Vigente"
-            
-            # Obtener nombre del cliente
-            cliente = db.collection("clientes").document(data["dni_cliente"]).get()
-            if cliente.exists:
-                data["nombre_cliente"] = cliente.to_dict().get("nombre", "N/A")
-                ultimas_membresias[dni_cliente] = data
-            else:
-                data["nombre_cliente"] = "Cliente no encontrado"
-                ultimas_membresias[dni_cliente] = data
-    
-    # Convertir a lista para aplicar filtros
-    membresias_data = list(ultimas_membresias.values())
-    
+    # La consulta ya trae solo las que cumplen los filtros; se vuelven a aplicar sobre la copia
+    # de la sesión porque las acciones del listado y las altas la modifican sin releerla.
     # Aplicar filtro de estado
     if filtro_estado == "Activas":
         membresias_data = [m for m in membresias_data if m.get("activa", True)]
@@ -386,6 +431,21 @@ def membresias_ui():
         membresias_data.sort(key=lambda x: x.get("fecha_vencimiento", datetime.max.date()))
         
         st.info(f"📊 Mostrando {len(membresias_data)} cliente(s) con sus últimas membresías")
+
+        # Acciones sobre las membresías marcadas: una sola escritura por lotes
+        seleccionadas = membresias_seleccionadas()
+        col1, col2, col3, col4 = st.columns([1.5, 1, 1, 1])
+        with col1:
+            st.write(f"Seleccionadas: **{len(seleccionadas)}**")
+        with col2:
+            st.button("✅ Activar", key="bulk_activar_memb", on_click=cambiar_estado_listado, args=(seleccionadas, True),
+                      disabled=not seleccionadas)
+        with col3:
+            st.button("🚫 Desactivar", key="bulk_desactivar_memb", on_click=cambiar_estado_listado, args=(seleccionadas, False),
+                      disabled=not seleccionadas)
+        with col4:
+            st.button("🗑️ Eliminar", key="bulk_eliminar_memb", on_click=eliminar_listado, args=(seleccionadas,),
+                      disabled=not seleccionadas)
         
         for membresia in membresias_data:
             # Determinar color según estado
@@ -419,7 +479,10 @@ def membresias_ui():
 
                 
                 # Usar columnas para información + botones en la misma línea
-                col1, col2, col3, col4, col5, col6, col7, col8 = st.columns([2.2, 1.3, 1.0, 1.3, 1.0, 1.0, 0.7, 0.7])
+                col0, col1, col2, col3, col4, col5, col6, col7, col8 = st.columns([0.4, 2.2, 1.3, 1.0, 1.3, 1.0, 1.0, 0.7, 0.7])
+
+                with col0:
+                    st.checkbox("Seleccionar", key=f"sel_memb_{membresia['id']}", label_visibility="collapsed")
                 
                 with col1:
                     st.write(f"**{color_emoji} {membresia['nombre_cliente']}**")
@@ -449,21 +512,15 @@ def membresias_ui():
                 with col7:
                     # Botón para activar/desactivar
                     is_active = membresia.get("activa", True)
-                    if is_active:
-                        if st.button("🚫", key=f"toggle_memb_{membresia['id']}", help="Desactivar membresía"):
-                            db.collection("membresias").document(membresia["id"]).update({"activa": False})
-                            st.rerun()
-                    else:
-                        if st.button("✅", key=f"toggle_memb_{membresia['id']}", help="Activar membresía"):
-                            db.collection("membresias").document(membresia["id"]).update({"activa": True})
-                            st.rerun()
+                    una = [(membresia["id"], membresia["dni_cliente"])]
+                    st.button("🚫" if is_active else "✅", key=f"toggle_memb_{membresia['id']}",
+                              help="Desactivar membresía" if is_active else "Activar membresía",
+                              on_click=cambiar_estado_listado, args=(una, not is_active))
                 
                 with col8:
                     # Botón eliminar
-                    if st.button("🗑️", key=f"delete_memb_{membresia['id']}", help="Eliminar membresía"):
-                        db.collection("membresias").document(membresia["id"]).delete()
-                        st.success("Membresía eliminada.")
-                        st.rerun()
+                    st.button("🗑️", key=f"delete_memb_{membresia['id']}", help="Eliminar membresía",
+                              on_click=eliminar_listado, args=(una,))
                 
                 st.markdown("</div>", unsafe_allow_html=True)
     else:
@@ -521,11 +578,9 @@ def precios_membresias_ui():
                 "Trimestral": int(precio_trimestral * 100),
                 "Semestral": int(precio_semestral * 100),
                 "Anual": int(precio_anual * 100),
-                "updated_at": gcfs.SERVER_TIMESTAMP,
             }
             
-            # Guardar en Firebase con ID fijo para facilitar la consulta
-            db.collection("configuracion").document("precios_membresias").set(precios_config)
+            guardar_precios_membresias(precios_config)
             st.success("Precios de membresías actualizados ✅")
 
     st.divider()
@@ -534,10 +589,9 @@ def precios_membresias_ui():
     st.write("**Precios Actuales**")
     
     try:
-        precios_doc = db.collection("configuracion").document("precios_membresias").get()
+        precios = obtener_precios_membresias()
         
-        if precios_doc.exists:
-            precios = precios_doc.to_dict()
+        if precios:
             
             # Crear tabla de precios
             col1, col2, col3 = st.columns([2, 2, 2])
@@ -588,4 +642,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with medir_pagina("Membresías"):
+        main()
@@ -1,14 +1,47 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore as admin_fs
-from google.cloud import firestore as gcfs
-import pandas as pd
+from utils import avisar, cambiar_estado_clientes, crear_cliente, eliminar_clientes, medir_callback, medir_pagina, mostrar_avisos, repo
 
-# --- Inicialización Firebase ---
-if not firebase_admin._apps:
-    cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
-    firebase_admin.initialize_app(cred)
-db = admin_fs.client()
+# Cantidad de clientes por página del listado
+TAMANOS_PAGINA = [10, 25, 50, 100]
+TAMANO_PAGINA_POR_DEFECTO = 25
+
+
+def clientes_seleccionados(clientes_data):
+    return [c for c in clientes_data if st.session_state.get(f"sel_cliente_{c['dni']}")]
+
+
+def limpiar_seleccion(clientes):
+    for cliente in clientes:
+        st.session_state.pop(f"sel_cliente_{cliente['dni']}", None)
+
+
+@medir_callback
+def cambiar_estado_listado(clientes, activo):
+    """Callback: activa o desactiva los clientes en una escritura y actualiza la página sin releerla."""
+    if not clientes:
+        avisar("Seleccione al menos un cliente.")
+        return
+    cambiar_estado_clientes(clientes, activo)
+    for cliente in clientes:
+        cliente["activo"] = activo
+    limpiar_seleccion(clientes)
+    avisar(f"{'✅ Activados' if activo else '❌ Desactivados'}: {len(clientes)} cliente(s).")
+
+
+@medir_callback
+def eliminar_listado(clientes_data, clientes):
+    """Callback: elimina en una escritura los clientes sin membresías activas y los quita de la página."""
+    if not clientes:
+        avisar("Seleccione al menos un cliente.")
+        return
+    eliminados, con_activas = eliminar_clientes([c["dni"] for c in clientes])
+    quitados = set(eliminados)
+    clientes_data[:] = [c for c in clientes_data if c["dni"] not in quitados]
+    limpiar_seleccion(clientes)
+    if eliminados:
+        avisar(f"🗑️ Eliminados: {len(eliminados)} cliente(s).")
+    if con_activas:
+        avisar(f"⚠️ No se eliminaron {len(con_activas)} cliente(s) con membresías activas: {', '.join(con_activas)}")
 
 
 def clientes_ui():
@@ -26,8 +59,7 @@ def clientes_ui():
         if submitted:
             if nombre and dni:
                 # Verificar si el DNI ya existe
-                existing_client = db.collection("clientes").document(dni).get()
-                if existing_client.exists:
+                if repo.obtener_cliente(dni):
                     st.error(f"Ya existe un cliente con DNI: {dni}")
                 else:
                     doc = {
@@ -36,63 +68,86 @@ def clientes_ui():
                         "telefono": telefono,
                         "email": email,
                         "activo": True,
-                        "created_at": gcfs.SERVER_TIMESTAMP,
-                        "updated_at": gcfs.SERVER_TIMESTAMP,
                     }
-                    db.collection("clientes").document(dni).set(doc)
+                    crear_cliente(doc)
+                    st.session_state.pop("clientes_pagina", None)
                     st.success(f"Cliente '{nombre}' agregado ✅")
             else:
                 st.error("Complete nombre y DNI.")
 
     st.divider()
 
-    # --- Listado de clientes ---
+    listado_clientes_ui()
+
+
+@st.fragment
+@medir_pagina("Clientes")
+def listado_clientes_ui():
+    """Listado paginado de clientes. Es un fragmento: la búsqueda, la navegación y las acciones vuelven a ejecutar solo el listado."""
+    mostrar_avisos()
+    # --- Listado de clientes (una página a la vez, ordenada en el servidor) ---
     st.write("**Lista de Clientes**")
-    clientes = db.collection("clientes").stream()
-    
-    clientes_data = []
-    for c in clientes:
-        data = c.to_dict()
-        data["id"] = c.id
-        clientes_data.append(data)
-    
-    # Ordenar por nombre en Python
+    col_busqueda, col_tamano = st.columns([4, 1])
+    busqueda = col_busqueda.text_input("Buscar por nombre o DNI", placeholder="Ej: pérez o 3012")
+    tamano = col_tamano.selectbox("Por página", TAMANOS_PAGINA, index=TAMANOS_PAGINA.index(TAMANO_PAGINA_POR_DEFECTO))
+
+    # Cursores de inicio de las páginas visitadas; se reinician al cambiar la búsqueda o el tamaño
+    if st.session_state.get("clientes_consulta") != (busqueda, tamano):
+        st.session_state["clientes_consulta"] = (busqueda, tamano)
+        st.session_state["clientes_cursores"] = [None]
+    cursores = st.session_state["clientes_cursores"]
+
+    # La página actual se guarda en la sesión: las acciones del listado la actualizan en el
+    # lugar y solo se vuelve a consultar al cambiar de página, búsqueda o tamaño
+    clave_pagina = (busqueda, tamano, len(cursores))
+    pagina = st.session_state.get("clientes_pagina")
+    if pagina is None or pagina[0] != clave_pagina:
+        pagina = (clave_pagina, *repo.pagina_clientes(tamano, cursores[-1], busqueda))
+        st.session_state["clientes_pagina"] = pagina
+    _, clientes_data, siguiente = pagina
+
     if clientes_data:
-        clientes_data.sort(key=lambda x: x.get("nombre", ""))
-        df_clientes = pd.DataFrame(clientes_data)
-        
-        # Mostrar tabla de clientes
-        for _, cliente in df_clientes.iterrows():
+        # Acciones sobre los clientes marcados: una sola escritura por lotes
+        seleccionados = clientes_seleccionados(clientes_data)
+        col1, col2, col3, col4 = st.columns([1.5, 1, 1, 1])
+        col1.write(f"Seleccionados: **{len(seleccionados)}**")
+        col2.button("✅ Activar", key="bulk_activar_clientes", on_click=cambiar_estado_listado,
+                    args=(seleccionados, True), disabled=not seleccionados)
+        col3.button("❌ Desactivar", key="bulk_desactivar_clientes", on_click=cambiar_estado_listado,
+                    args=(seleccionados, False), disabled=not seleccionados)
+        col4.button("🗑️ Eliminar", key="bulk_eliminar_clientes", on_click=eliminar_listado,
+                    args=(clientes_data, seleccionados), disabled=not seleccionados,
+                    help="No se eliminan los clientes con membresías activas")
+
+        for cliente in clientes_data:
             is_active = cliente.get("activo", True)
             
-            col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
+            col0, col1, col2, col3, col4, col5 = st.columns([0.4, 3, 2, 2, 2, 1])
+            col0.checkbox("Seleccionar", key=f"sel_cliente_{cliente['dni']}", label_visibility="collapsed")
             col1.write(cliente["nombre"])
             col2.write(f"DNI: {cliente['dni']}")
             col3.write(cliente.get("telefono", "N/A"))
             
             # Botón para activar/desactivar
-            if is_active:
-                if col4.button("✅ Desactivar", key=f"toggle_cliente_{cliente['dni']}", help="Desactivar cliente"):
-                    db.collection("clientes").document(cliente["dni"]).update({"activo": False})
-                    st.rerun()
-            else:
-                if col4.button("❌ Activar", key=f"toggle_cliente_{cliente['dni']}", help="Activar cliente"):
-                    db.collection("clientes").document(cliente["dni"]).update({"activo": True})
-                    st.rerun()
+            col4.button("✅ Desactivar" if is_active else "❌ Activar", key=f"toggle_cliente_{cliente['dni']}",
+                        help="Desactivar cliente" if is_active else "Activar cliente",
+                        on_click=cambiar_estado_listado, args=([cliente], not is_active))
             
-            # Botón eliminar
-            if col5.button("🗑️", key=f"delete_cliente_{cliente['dni']}", help="Eliminar cliente"):
-                # Verificar si tiene membresías activas
-                membresias_activas = db.collection("membresias").where(filter=gcfs.FieldFilter("dni_cliente", "==", cliente["dni"])).where(filter=gcfs.FieldFilter("activa", "==", True)).get()
-                if len(membresias_activas) > 0:
-                    st.error("No se puede eliminar el cliente. Tiene membresías activas.")
-                else:
-                    db.collection("clientes").document(cliente["dni"]).delete()
-                    st.success(f"Cliente '{cliente['nombre']}' eliminado.")
-                    st.rerun()
+            # Botón eliminar (no elimina clientes con membresías activas)
+            col5.button("🗑️", key=f"delete_cliente_{cliente['dni']}", help="Eliminar cliente",
+                        on_click=eliminar_listado, args=(clientes_data, [cliente]))
+    elif busqueda.strip():
+        st.info(f"No se encontraron clientes para '{busqueda.strip()}'.")
     else:
         st.info("No hay clientes registrados.")
 
+    # --- Navegación entre páginas ---
+    if len(cursores) > 1 or siguiente is not None:
+        col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+        col_anterior.button("◀ Anterior", disabled=len(cursores) == 1, on_click=cursores.pop)
+        col_pagina.caption(f"Página {len(cursores)}")
+        col_siguiente.button("Siguiente ▶", disabled=siguiente is None, on_click=cursores.append, args=(siguiente,))
+
 
 def main():
     st.set_page_config(page_title="Clientes - Benjas", page_icon="👥", layout="wide")
@@ -102,4 +157,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with medir_pagina("Clientes"):
+        main()
@@ -1,74 +1,60 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore as admin_fs
-from google.cloud import firestore as gcfs
 from datetime import date, datetime
-from utils import get_dashboard_data
-
-# --- Inicialización Firebase ---
-if not firebase_admin._apps:
-    cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
-    firebase_admin.initialize_app(cred)
-db = admin_fs.client()
-
-
-@st.cache_data
-def get_clientes():
-    """Obtiene los clientes activos de Firebase y los cachea."""
-    clientes = db.collection("clientes").where(filter=gcfs.FieldFilter("activo", "==", True)).stream()
-    clientes_list = []
-    for c in clientes:
-        data = c.to_dict()
-        clientes_list.append({
-            'dni': c.id,
-            'nombre': data.get('nombre', ''),
-            'display_name': f"{data.get('nombre', '')} (DNI: {c.id})"
-        })
-    
-    # Ordenar por nombre
-    clientes_list.sort(key=lambda x: x['nombre'])
-    return clientes_list
-
-
-@st.cache_data
-def get_productos():
-    """Obtiene los productos activos de Firebase y los cachea."""
-    # Consulta 1: Productos donde 'activo' es explícitamente True
-    productos_activos_ref = db.collection("productos").where(filter=gcfs.FieldFilter("activo", "==", True)).stream()
-    
-    # Consulta 2: Productos donde el campo 'activo' no existe (para compatibilidad con datos antiguos)
-    productos_sin_campo_activo_ref = db.collection("productos").where(filter=gcfs.FieldFilter("activo", "==", None)).stream()
-
-    productos_dict = {}
-    # Usamos un diccionario para evitar duplicados si un producto apareciera en ambas consultas (poco probable)
-    
-    # Procesar la primera consulta
-    for p in productos_activos_ref:
-        prod_data = p.to_dict()
-        productos_dict[p.id] = prod_data
-        productos_dict[p.id]['id'] = p.id
-
-    # La segunda consulta no es necesaria con la lógica actual de creación, pero es una buena práctica para robustez.
-    # En este caso, la lógica de creación siempre añade 'activo': True, por lo que la primera consulta es suficiente.
-    return list(productos_dict.values())
+from utils import (
+    METODOS_PAGO,
+    aviso_clientes_truncados,
+    avisar,
+    buscar_clientes,
+    eliminar_ingreso,
+    get_productos,
+    medir_callback,
+    medir_pagina,
+    mostrar_avisos,
+    registrar_ingreso,
+    repo,
+)
+
+# Coincidencias que se muestran en el selector de clientes
+MAX_CLIENTES_SELECTOR = 20
+
+# Cantidad de ingresos que se muestran en el listado de los últimos registrados
+CANTIDAD_RECIENTES = 10
+
+
+def ingresos_recientes():
+    """Últimos ingresos guardados en la sesión: se leen de la base la primera vez y después se actualizan en el lugar."""
+    if "ingresos_recientes" not in st.session_state:
+        st.session_state["ingresos_recientes"] = repo.ultimos_ingresos(CANTIDAD_RECIENTES)
+    return st.session_state["ingresos_recientes"]
+
+
+def agregar_reciente(doc, ingreso_id):
+    """Agrega al listado de la sesión un ingreso recién registrado, si está entre los últimos."""
+    if "ingresos_recientes" not in st.session_state:
+        return
+    recientes = st.session_state["ingresos_recientes"]
+    recientes.append(dict(doc, id=ingreso_id))
+    # Las fechas leídas vienen en UTC y las del formulario sin zona (se guardan como UTC)
+    recientes.sort(key=lambda d: d["fecha"].replace(tzinfo=None), reverse=True)
+    del recientes[CANTIDAD_RECIENTES:]
+
+
+@medir_callback
+def eliminar_reciente(ingreso):
+    """Callback: elimina el ingreso y lo quita del listado de la sesión."""
+    eliminar_ingreso(ingreso["id"])
+    avisar(f"Ingreso del {ingreso['fecha'].strftime('%Y-%m-%d')} eliminado.")
+    st.session_state["ingresos_recientes"] = [d for d in ingresos_recientes() if d["id"] != ingreso["id"]]
 
 
 def ingresos_ui():
     st.subheader("💵 Registro de Ingresos")
 
-    # Limpiar la caché de productos y clientes cada vez que se carga la página para asegurar datos frescos.
-    get_productos.clear()
-    get_clientes.clear()
-
+    # Cacheados por versión: solo se vuelven a leer si cambió el catálogo
     productos = get_productos()
-    clientes = get_clientes()
     
     product_names = ["-- Ingreso Manual --"] + [p['nombre'] for p in productos]
     product_map = {p['nombre']: p for p in productos}
-    
-    # Preparar opciones para clientes
-    cliente_options = ["-- Cliente Manual --"] + [c['display_name'] for c in clientes]
-    cliente_map = {c['display_name']: c for c in clientes}
 
     selected_product_name = st.selectbox(
         "Producto/Servicio (opcional)", 
@@ -80,6 +66,16 @@ def ingresos_ui():
     if selected_product_name != "-- Ingreso Manual --":
         initial_monto = product_map[selected_product_name]['precio_centavos'] / 100.0
 
+    # Búsqueda de cliente fuera del formulario para que las opciones se actualicen al presionar
+    # Enter o salir del campo, sin enviar el formulario
+    busqueda_cliente = st.text_input("Buscar cliente (opcional)", placeholder="Nombre, DNI o teléfono")
+    # Se pide uno más para saber si quedan coincidencias afuera
+    clientes = buscar_clientes(busqueda_cliente, MAX_CLIENTES_SELECTOR + 1)
+    cliente_map = {f"{c['nombre']} (DNI: {c['dni']})": c for c in clientes[:MAX_CLIENTES_SELECTOR]}
+    if len(clientes) > MAX_CLIENTES_SELECTOR:
+        st.caption(aviso_clientes_truncados(busqueda_cliente, MAX_CLIENTES_SELECTOR))
+    cliente_options = ["-- Cliente Manual --"] + list(cliente_map)
+
     with st.form("nuevo_ingreso"):
         fecha_ingreso = st.date_input("Fecha del Ingreso", value=date.today())
 
@@ -96,7 +92,7 @@ def ingresos_ui():
             cliente_manual = st.text_input("Nombre del Cliente (manual)")
         
         operador = st.text_input("Operador")
-        metodo_pago = st.selectbox("Método de pago", ["efectivo", "débito", "crédito", "transferencia", "qr", "mp"])
+        metodo_pago = st.selectbox("Método de pago", METODOS_PAGO)
         monto = st.number_input("Monto total (ARS)", min_value=0.0, step=100.0, value=initial_monto, key="monto_input")
         consumicion = st.text_input("Consumición (opcional)")
         submitted = st.form_submit_button("➕ Registrar")
@@ -134,17 +130,26 @@ def ingresos_ui():
                 "consumicion": consumicion,
                 "items": items_list,
                 "monto_total_centavos": int(monto * 100),
-                "created_at": gcfs.SERVER_TIMESTAMP,
-                "updated_at": gcfs.SERVER_TIMESTAMP,
             }
-            db.collection("ingresos").add(doc)
+            # Registra el ingreso y lo agrega a la caché del dashboard de ese mes
+            ingreso_id = registrar_ingreso(doc)
+            agregar_reciente(doc, ingreso_id)
             st.success("Ingreso registrado ✅")
-            # Limpiar la caché del dashboard para que refleje el nuevo ingreso
-            get_dashboard_data.clear()
 
     st.divider()
-    st.subheader("Últimos Ingresos Registrados")
-    ingresos = db.collection("ingresos").order_by("fecha", direction=admin_fs.Query.DESCENDING).limit(10).stream()
+    ultimos_ingresos_ui()
+
+
+@st.fragment
+@medir_pagina("Ingresos")
+def ultimos_ingresos_ui():
+    """Últimos ingresos registrados. Es un fragmento: eliminar uno vuelve a ejecutar solo el listado."""
+    mostrar_avisos()
+    col_titulo, col_actualizar = st.columns([4, 1])
+    col_titulo.subheader("Últimos Ingresos Registrados")
+    if col_actualizar.button("🔄 Actualizar", help="Volver a leer los últimos ingresos desde la base"):
+        st.session_state.pop("ingresos_recientes", None)
+    ingresos = ingresos_recientes()
     
     # Encabezados para la lista
     col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
@@ -153,16 +158,13 @@ def ingresos_ui():
     col3.markdown("**Operador**")
     col4.markdown("**Monto**")
 
-    for i in ingresos:
-        d = i.to_dict()
+    for d in ingresos:
         col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
         col1.write(d["fecha"].strftime("%Y-%m-%d %H:%M"))
         col2.write(d.get("cliente", "N/A"))
         col3.write(d.get("operador", "N/A"))
         col4.write(f"${d['monto_total_centavos']/100:,.2f}")
-        if col5.button("🗑️", key=i.id, help="Eliminar ingreso"):
-            db.collection("ingresos").document(i.id).delete()
-            st.warning(f"Ingreso del {d['fecha'].strftime('%Y-%m-%d')} eliminado.")
-            st.rerun()
+        col5.button("🗑️", key=d["id"], help="Eliminar ingreso", on_click=eliminar_reciente, args=(d,))
 
-ingresos_ui()
\ No newline at end of file
+with medir_pagina("Ingresos"):
+    ingresos_ui()
@@ -1,15 +1,45 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore as admin_fs
-from google.cloud import firestore as gcfs
 from datetime import date, datetime
-from utils import get_dashboard_data
+from utils import (
+    CONCEPTOS_GASTO,
+    METODOS_PAGO,
+    avisar,
+    eliminar_gasto,
+    medir_callback,
+    medir_pagina,
+    mostrar_avisos,
+    registrar_gasto,
+    repo,
+)
 
-# --- Inicialización Firebase ---
-if not firebase_admin._apps:
-    cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
-    firebase_admin.initialize_app(cred)
-db = admin_fs.client()
+# Cantidad de gastos que se muestran en el listado de los últimos registrados
+CANTIDAD_RECIENTES = 10
+
+
+def gastos_recientes():
+    """Últimos gastos guardados en la sesión: se leen de la base la primera vez y después se actualizan en el lugar."""
+    if "gastos_recientes" not in st.session_state:
+        st.session_state["gastos_recientes"] = repo.ultimos_gastos(CANTIDAD_RECIENTES)
+    return st.session_state["gastos_recientes"]
+
+
+def agregar_reciente(doc, gasto_id):
+    """Agrega al listado de la sesión un gasto recién registrado, si está entre los últimos."""
+    if "gastos_recientes" not in st.session_state:
+        return
+    recientes = st.session_state["gastos_recientes"]
+    recientes.append(dict(doc, id=gasto_id))
+    # Las fechas leídas vienen en UTC y las del formulario sin zona (se guardan como UTC)
+    recientes.sort(key=lambda d: d["fecha"].replace(tzinfo=None), reverse=True)
+    del recientes[CANTIDAD_RECIENTES:]
+
+
+@medir_callback
+def eliminar_reciente(gasto):
+    """Callback: elimina el gasto y lo quita del listado de la sesión."""
+    eliminar_gasto(gasto["id"])
+    avisar(f"Gasto de '{gasto['concepto']}' eliminado.")
+    st.session_state["gastos_recientes"] = [d for d in gastos_recientes() if d["id"] != gasto["id"]]
 
 
 def gastos_ui():
@@ -17,10 +47,10 @@ def gastos_ui():
 
     with st.form("nuevo_gasto"):
         fecha_gasto = st.date_input("Fecha del Gasto", value=date.today())
-        concepto = st.selectbox("Concepto", ["insumos", "alquiler", "servicios", "mantenimiento", "marketing", "otros"])
+        concepto = st.selectbox("Concepto", CONCEPTOS_GASTO)
         proveedor = st.text_input("Proveedor")
         descripcion = st.text_area("Descripción")
-        metodo_pago = st.selectbox("Método de pago", ["efectivo", "débito", "crédito", "transferencia", "qr", "mp"])
+        metodo_pago = st.selectbox("Método de pago", METODOS_PAGO)
         monto = st.number_input("Monto (ARS)", min_value=0.0, step=100.0)
         submitted = st.form_submit_button("➕ Registrar")
 
@@ -32,17 +62,26 @@ def gastos_ui():
                 "descripcion": descripcion,
                 "metodo_pago": metodo_pago,
                 "monto_centavos": int(monto * 100),
-                "created_at": gcfs.SERVER_TIMESTAMP,
-                "updated_at": gcfs.SERVER_TIMESTAMP,
             }
-            db.collection("gastos").add(doc)
+            # Registra el gasto y lo agrega a la caché del dashboard de ese mes
+            gasto_id = registrar_gasto(doc)
+            agregar_reciente(doc, gasto_id)
             st.success("Gasto registrado ✅")
-            # Limpiar la caché del dashboard para que refleje el nuevo gasto
-            get_dashboard_data.clear()
 
     st.divider()
-    st.subheader("Últimos Gastos Registrados")
-    gastos = db.collection("gastos").order_by("fecha", direction=admin_fs.Query.DESCENDING).limit(10).stream()
+    ultimos_gastos_ui()
+
+
+@st.fragment
+@medir_pagina("Gastos")
+def ultimos_gastos_ui():
+    """Últimos gastos registrados. Es un fragmento: eliminar uno vuelve a ejecutar solo el listado."""
+    mostrar_avisos()
+    col_titulo, col_actualizar = st.columns([4, 1])
+    col_titulo.subheader("Últimos Gastos Registrados")
+    if col_actualizar.button("🔄 Actualizar", help="Volver a leer los últimos gastos desde la base"):
+        st.session_state.pop("gastos_recientes", None)
+    gastos = gastos_recientes()
 
     # Encabezados para la lista
     col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
@@ -51,16 +90,13 @@ def gastos_ui():
     col3.markdown("**Proveedor**")
     col4.markdown("**Monto**")
 
-    for g in gastos:
-        d = g.to_dict()
+    for d in gastos:
         col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
         col1.write(d["fecha"].strftime("%Y-%m-%d %H:%M"))
         col2.write(d.get("concepto", "N/A"))
         col3.write(d.get("proveedor", "N/A"))
         col4.write(f"${d['monto_centavos']/100:,.2f}")
-        if col5.button("🗑️", key=g.id, help="Eliminar gasto"):
-            db.collection("gastos").document(g.id).delete()
-            st.warning(f"Gasto de '{d['concepto']}' eliminado.")
-            st.rerun()
+        col5.button("🗑️", key=d["id"], help="Eliminar gasto", on_click=eliminar_reciente, args=(d,))
 
-gastos_ui()
\ No newline at end of file
+with medir_pagina("Gastos"):
+    gastos_ui()
@@ -1,148 +1,358 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore as admin_fs
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from datetime import datetime
+import xlsxwriter
+from datetime import date, datetime
 import io
 from calendar import monthrange
-from utils import get_dashboard_data, initialize_firebase
+from utils import (
+    METODOS_PAGO_MEMBRESIA,
+    get_dashboard_data_rango,
+    get_membresias_rango,
+    get_resumen_rango,
+    get_totales_rango,
+    huella_dashboard,
+    huella_membresias,
+    huella_resumenes,
+    medir_pagina,
+    mes_cerrado,
+    reabrir_mes,
+)
 
-# --- Inicialización Firebase ---
-db = initialize_firebase()
+def hojas_reporte(df_ing, df_gas, df_membresias, df_items):
+    """Prepara las hojas del reporte: lista de (nombre, DataFrame con columnas legibles)."""
+    hojas = []
 
-def to_excel(df_ing, df_gas, df_membresias):
-    """Convierte los dataframes de ingresos, gastos y membresías a un archivo Excel en memoria."""
+    if not df_ing.empty:
+        df_ing_download = df_ing[['fecha', 'cliente', 'operador', 'metodo_pago', 'monto_total']].copy()
+        # Unir los nombres de los items de cada ingreso en un string legible
+        nombres_items = df_items['nombre'].astype(object).fillna('').groupby(df_items['ingreso_id'], sort=False).agg(', '.join)
+        df_ing_download['productos'] = df_ing['id'].map(nombres_items).fillna('N/A')
+        df_ing_download['consumicion'] = df_ing['consumicion']
+        # Quitar la información de zona horaria para compatibilidad con Excel
+        df_ing_download['fecha'] = df_ing_download['fecha'].dt.tz_localize(None)
+        df_ing_download = df_ing_download.rename(columns={
+            'fecha': 'Fecha',
+            'cliente': 'Cliente',
+            'operador': 'Operador',
+            'metodo_pago': 'Método de Pago',
+            'monto_total': 'Monto (ARS)',
+            'productos': 'Productos/Servicios',
+            'consumicion': 'Consumición',
+        })
+        hojas.append(('Ingresos', df_ing_download))
+
+    if not df_gas.empty:
+        df_gas_download = df_gas[['fecha', 'concepto', 'proveedor', 'metodo_pago', 'monto', 'descripcion']].copy()
+        # Quitar la información de zona horaria para compatibilidad con Excel
+        df_gas_download['fecha'] = df_gas_download['fecha'].dt.tz_localize(None)
+        df_gas_download = df_gas_download.rename(columns={
+            'fecha': 'Fecha',
+            'concepto': 'Concepto',
+            'proveedor': 'Proveedor',
+            'metodo_pago': 'Método de Pago',
+            'monto': 'Monto (ARS)',
+            'descripcion': 'Descripción',
+        })
+        hojas.append(('Gastos', df_gas_download))
+
+    if not df_membresias.empty:
+        df_membresias_download = df_membresias[['fecha_alta', 'nombre_cliente', 'dni_cliente', 'tipo_membresia', 'precio', 'metodo_pago_display', 'fecha_vencimiento']].copy()
+        # Quitar la información de zona horaria para compatibilidad con Excel
+        df_membresias_download['fecha_alta'] = df_membresias_download['fecha_alta'].dt.tz_localize(None)
+        df_membresias_download['fecha_vencimiento'] = df_membresias_download['fecha_vencimiento'].dt.tz_localize(None)
+        df_membresias_download = df_membresias_download.rename(columns={
+            'fecha_alta': 'Fecha Alta',
+            'nombre_cliente': 'Cliente',
+            'dni_cliente': 'DNI',
+            'tipo_membresia': 'Tipo',
+            'precio': 'Precio (ARS)',
+            'metodo_pago_display': 'Método Pago',
+            'fecha_vencimiento': 'Vencimiento',
+        })
+        hojas.append(('Membresías', df_membresias_download))
+
+    return hojas
+
+
+def to_excel(hojas):
+    """
+    Escribe las hojas en un archivo Excel en memoria.
+    Usa el modo constant_memory de xlsxwriter: cada fila se vuelca al escribirse, así que
+    la planilla no se arma completa en memoria aunque el período tenga muchos registros.
+    """
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        if not df_ing.empty:
-            df_ing.to_excel(writer, sheet_name='Ingresos', index=False)
-        if not df_gas.empty:
-            df_gas.to_excel(writer, sheet_name='Gastos', index=False)
-        if not df_membresias.empty:
-            df_membresias.to_excel(writer, sheet_name='Membresías', index=False)
-    processed_data = output.getvalue()
-    return processed_data
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'default_date_format': 'dd/mm/yyyy hh:mm'})
+    encabezado = workbook.add_format({'bold': True})
+    for nombre, df in hojas:
+        hoja = workbook.add_worksheet(nombre)
+        hoja.write_row(0, 0, list(df.columns), encabezado)
+        # En modo constant_memory las filas deben escribirse en orden
+        for fila, valores in enumerate(df.itertuples(index=False, name=None), start=1):
+            for columna, valor in enumerate(valores):
+                if isinstance(valor, np.generic):
+                    valor = valor.item()
+                if valor is None or valor is pd.NaT or (isinstance(valor, float) and np.isnan(valor)):
+                    continue
+                hoja.write(fila, columna, valor)
+    workbook.close()
+    return output.getvalue()
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def reporte_excel(huella, _df_ing, _df_gas, _df_membresias, _df_items):
+    """Reporte en Excel del período, cacheado por la huella de los datos (los DataFrames no se hashean)."""
+    return to_excel(hojas_reporte(_df_ing, _df_gas, _df_membresias, _df_items))
+
+
+# Largo máximo del período (días) para cada agregación de la evolución: (días, frecuencia, nombre)
+GRANULARIDADES = ((92, "D", "diaria"), (731, "W", "semanal"), (None, "M", "mensual"))
+# A partir de esta cantidad de puntos la evolución se dibuja con WebGL (Scattergl) en lugar de SVG
+PUNTOS_WEBGL = 100
+COLORES_EVOLUCION = {
+    'Ingresos (Servicios)': '#28a745',
+    'Ingresos (Membresías)': '#17a2b8',
+    'Gastos': '#dc3545'
+}
+
+
+def desglose_a_df(desglose, columna):
+    """Convierte un desglose del resumen ({valor: {"centavos", "cantidad"}}) en un DataFrame."""
+    return pd.DataFrame(
+        [{columna: clave, "monto": v["centavos"] / 100, "cantidad": v["cantidad"]} for clave, v in desglose.items() if v["cantidad"] > 0],
+        columns=[columna, "monto", "cantidad"],
+    )
+
+
+def evolucion_a_df(resumenes_diarios, dias):
+    """
+    Montos de ingresos, gastos y membresías por día a partir de los resúmenes diarios, sumados por
+    semana o por mes si el período es largo. Retorna (DataFrame con fecha, monto y tipo, granularidad).
+    """
+    _, frecuencia, granularidad = next(g for g in GRANULARIDADES if g[0] is None or dias <= g[0])
+    filas_evolucion = []
+    for seccion, tipo in (("ingresos", "Ingresos (Servicios)"), ("gastos", "Gastos"), ("membresias", "Ingresos (Membresías)")):
+        for dia in resumenes_diarios:
+            if dia[seccion]["cantidad"] > 0:
+                filas_evolucion.append({"fecha": dia["fecha"], "monto": dia[seccion]["centavos"] / 100, "tipo": tipo})
+    df = pd.DataFrame(filas_evolucion, columns=["fecha", "monto", "tipo"])
+    # Los resúmenes son por día calendario: la hora y la zona no importan
+    df["fecha"] = pd.to_datetime(df["fecha"], utc=True).dt.tz_localize(None).dt.normalize()
+    if frecuencia != "D" and not df.empty:
+        # Cada día pasa al primer día de su semana (lunes) o de su mes
+        df["fecha"] = df["fecha"].dt.to_period(frecuencia).dt.start_time
+        df = df.groupby(["tipo", "fecha"], as_index=False, sort=False)["monto"].sum()
+    return df, granularidad
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def figuras_resumen(huella, _resumen, _resumenes_diarios, dias):
+    """
+    Gráficos del período que salen de los resúmenes, como specs de Plotly ({nombre: dict}).
+    Se cachean por la huella de los datos: los reruns no repiten los agrupamientos ni arman las figuras.
+    """
+    res_ing, res_gas, res_memb = _resumen["ingresos"], _resumen["gastos"], _resumen["membresias"]
+    figuras = {}
+
+    # --- Evolución temporal ingresos vs gastos vs membresías ---
+    df_all, granularidad = evolucion_a_df(_resumenes_diarios, dias)
+    if not df_all.empty:
+        # Gráfico de línea con marcadores; con muchos puntos, en WebGL
+        fig_evolucion = px.line(
+            df_all, x="fecha", y="monto", color="tipo",
+            title=f"Evolución {granularidad} de Ingresos vs Gastos",
+            markers=True,
+            color_discrete_map=COLORES_EVOLUCION,
+            render_mode="webgl" if len(df_all) > PUNTOS_WEBGL else "svg",
+        )
+        figuras["evolucion"] = fig_evolucion.to_dict()
+
+    # --- Distribución de ingresos por método de pago ---
+    if res_ing["cantidad"] > 0:
+        fig_pago = px.pie(desglose_a_df(res_ing["por_metodo_pago"], "metodo_pago"), names="metodo_pago", values="monto",
+                          title="Ingresos por método de pago", hole=0.4)
+        fig_pago.update_traces(textposition='inside', textinfo='percent+label')
+        figuras["pago"] = fig_pago.to_dict()
+
+    # --- Gastos por concepto ---
+    if res_gas["cantidad"] > 0:
+        df_gas_grouped = desglose_a_df(res_gas["por_concepto"], "concepto").sort_values("monto", ascending=False)
+        fig_gas = px.bar(df_gas_grouped,
+                         x="concepto", y="monto",
+                         title="Gastos por concepto")
+        figuras["gastos"] = fig_gas.to_dict()
+
+    # --- Membresías ---
+    if res_memb["cantidad"] > 0:
+        df_tipos = desglose_a_df(res_memb["por_tipo"], "tipo_membresia")
+        df_pagos = desglose_a_df(res_memb["por_metodo_pago"], "metodo_pago")
+        df_pagos["metodo_pago_display"] = df_pagos["metodo_pago"].map(METODOS_PAGO_MEMBRESIA).fillna("Efectivo")  # Default para registros antiguos
+        df_pagos = df_pagos.groupby("metodo_pago_display", as_index=False)[["monto", "cantidad"]].sum()
+
+        # Distribución por tipo de membresía
+        fig_tipos = px.pie(df_tipos, names="tipo_membresia", values="cantidad",
+                          title="Distribución de Tipos de Membresía", hole=0.4)
+        fig_tipos.update_traces(textposition='inside', textinfo='percent+label')
+        figuras["tipos"] = fig_tipos.to_dict()
+
+        # Ingresos por tipo de membresía
+        ingresos_tipo = df_tipos.sort_values("monto", ascending=False)
+        fig_ingresos_tipo = px.bar(ingresos_tipo,
+                                 x="tipo_membresia", y="monto",
+                                 title="Ingresos por Tipo de Membresía",
+                                 color="monto",
+                                 color_continuous_scale="Blues")
+        figuras["ingresos_tipo"] = fig_ingresos_tipo.to_dict()
+
+        # Distribución por método de pago
+        fig_pagos = px.pie(df_pagos, names="metodo_pago_display", values="cantidad",
+                          title="Métodos de Pago en Membresías", hole=0.4)
+        fig_pagos.update_traces(textposition='inside', textinfo='percent+label')
+        figuras["pagos_membresias"] = fig_pagos.to_dict()
+
+        # Ingresos por método de pago
+        ingresos_pago = df_pagos.sort_values("monto", ascending=False)
+        fig_ingresos_pago = px.bar(ingresos_pago,
+                                 x="metodo_pago_display", y="monto",
+                                 title="Ingresos por Método de Pago",
+                                 color="monto",
+                                 color_continuous_scale="Greens")
+        figuras["ingresos_pago_membresias"] = fig_ingresos_pago.to_dict()
+
+    # --- Top Productos/Servicios vendidos ---
+    if res_ing["por_producto"]:
+        top_productos = desglose_a_df(res_ing["por_producto"], "producto").sort_values("cantidad", ascending=False)
+        fig_top_prod = px.bar(top_productos.head(10), x='producto', y='cantidad', title='Top 10 Productos/Servicios más vendidos')
+        figuras["top_productos"] = fig_top_prod.to_dict()
+
+    # --- Top operadores (ventas) ---
+    if res_ing["cantidad"] > 0:
+        fig_op = px.bar(desglose_a_df(res_ing["por_operador"], "operador"),
+                        x="operador", y="monto",
+                        title="Ingresos por operador/barbero")
+        figuras["operadores"] = fig_op.to_dict()
+
+    return figuras
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def figura_top_clientes(huella, _df_membresias):
+    """Spec del top clientes por ingresos en membresías del período (None si hay menos de dos), cacheado por la huella."""
+    clientes_membresias = _df_membresias.groupby(["nombre_cliente", "dni_cliente"]).agg({
+        "precio": "sum",
+        "tipo_membresia": "count"
+    }).reset_index()
+    clientes_membresias.rename(columns={"tipo_membresia": "cantidad_membresias"}, inplace=True)
+    clientes_membresias = clientes_membresias.sort_values("precio", ascending=False).head(10)
+
+    if len(clientes_membresias) < 2:
+        return None
+    fig_top_clientes = px.bar(clientes_membresias,
+                            x="nombre_cliente", y="precio",
+                            title="Top Clientes por Ingresos en Membresías",
+                            hover_data=["cantidad_membresias"])
+    return fig_top_clientes.to_dict()
 
 
 def dashboard_ui():
     st.subheader("📊 Dashboard Financiero")
 
-    # --- Filtros de fecha (mes y año) ---
+    # --- Filtros de fecha (mes, trimestre, año o rango personalizado) ---
     today = datetime.today()
     # Crear una lista de años, desde 2023 hasta el año actual
     years = list(range(2023, today.year + 1))
     # Crear un diccionario de meses para mostrar nombres en lugar de números
     month_names = {1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"}
     
+    modo = st.radio("Período", ["Mes", "Trimestre", "Año", "Personalizado"], horizontal=True)
     col1, col2 = st.columns(2)
-    selected_year = col1.selectbox("Año", options=years, index=len(years) - 1)
-    selected_month = col2.selectbox("Mes", options=list(month_names.keys()), format_func=lambda x: month_names[x], index=today.month - 1)
+    if modo == "Personalizado":
+        fecha_desde = col1.date_input("Desde", value=date(today.year, today.month, 1))
+        fecha_hasta = col2.date_input("Hasta", value=today.date())
+        etiqueta = f"{fecha_desde.strftime('%d/%m/%Y')} al {fecha_hasta.strftime('%d/%m/%Y')}"
+    else:
+        selected_year = col1.selectbox("Año", options=years, index=len(years) - 1)
+        if modo == "Mes":
+            selected_month = col2.selectbox("Mes", options=list(month_names.keys()), format_func=lambda x: month_names[x], index=today.month - 1)
+            mes_desde = mes_hasta = selected_month
+            etiqueta = f"{month_names[selected_month]} {selected_year}"
+        elif modo == "Trimestre":
+            trimestre = col2.selectbox("Trimestre", options=[1, 2, 3, 4], format_func=lambda x: f"T{x}", index=(today.month - 1) // 3)
+            mes_desde, mes_hasta = 3 * trimestre - 2, 3 * trimestre
+            etiqueta = f"T{trimestre} {selected_year}"
+        else:
+            mes_desde, mes_hasta = 1, 12
+            etiqueta = f"{selected_year}"
+        fecha_desde = date(selected_year, mes_desde, 1)
+        fecha_hasta = date(selected_year, mes_hasta, monthrange(selected_year, mes_hasta)[1])
+    # No consultar meses futuros
+    fecha_hasta = min(fecha_hasta, today.date())
+
+    # Los meses cerrados se guardan en cache; si se corrigieron por fuera de la app hay que releerlos
+    if modo == "Mes" and mes_cerrado((selected_year, selected_month)):
+        if st.button("🔄 Releer el mes desde la base", help="Usar después de corregir datos de este mes por fuera de la app"):
+            reabrir_mes(selected_year, selected_month)
+            st.rerun()
 
     st.divider()
 
     # Título dinámico
-    st.header(f"Resumen de {month_names[selected_month]} {selected_year}")
+    st.header(f"Resumen de {etiqueta}")
 
-    # --- Obtener datos de forma optimizada ---
-    df_ing, df_gas, df_membresias = get_dashboard_data(selected_year, selected_month)
+    if fecha_desde > fecha_hasta:
+        st.info(f"No se encontraron datos para {etiqueta}.")
+        return
+
+    # --- Totales del período: consultas de agregación, sin descargar documentos ---
+    totales = get_totales_rango(fecha_desde, fecha_hasta)
 
     # --- Mensaje si no hay datos para el período seleccionado ---
-    if df_ing.empty and df_gas.empty and df_membresias.empty:
-        st.info(f"No se encontraron datos para {month_names[selected_month]} de {selected_year}.")
-        # Limpiar la caché si se cambia de mes y no hay datos, para forzar recarga si se vuelve al mes anterior.
-        get_dashboard_data.clear()
-        st.info(f"No se encontraron datos para {month_names[selected_month]} de {selected_year}.")
+    if all(totales[seccion]["cantidad"] == 0 for seccion in ("ingresos", "gastos", "membresias")):
+        st.info(f"No se encontraron datos para {etiqueta}.")
         return
 
     # --- Botón de descarga ---
-    # Preparar dataframes para la descarga
-    df_ing_download = df_ing.copy()
-    df_gas_download = df_gas.copy()
-    df_membresias_download = df_membresias.copy()
-
-    if not df_ing_download.empty:
-        # Convertir la lista de items a un string legible
-        df_ing_download['items'] = df_ing_download['items'].apply(lambda items: ', '.join([item.get('nombre', '') for item in items]) if isinstance(items, list) and items else 'N/A')
-        # Quitar la información de zona horaria para compatibilidad con Excel
-        df_ing_download['fecha'] = df_ing_download['fecha'].dt.tz_localize(None)
-        # Seleccionar y renombrar columnas
-        df_ing_download = df_ing_download[['fecha', 'cliente', 'operador', 'metodo_pago', 'monto_total', 'items', 'consumicion']]
-        df_ing_download.columns = ['Fecha', 'Cliente', 'Operador', 'Método de Pago', 'Monto (ARS)', 'Productos/Servicios', 'Consumición']
-
-    if not df_gas_download.empty:
-        # Quitar la información de zona horaria para compatibilidad con Excel
-        df_gas_download['fecha'] = df_gas_download['fecha'].dt.tz_localize(None)
-        # Seleccionar y renombrar columnas
-        df_gas_download = df_gas_download[['fecha', 'concepto', 'proveedor', 'metodo_pago', 'monto', 'descripcion']]
-        df_gas_download.columns = ['Fecha', 'Concepto', 'Proveedor', 'Método de Pago', 'Monto (ARS)', 'Descripción']
+    # El detalle del período se consulta y el Excel se genera solo al hacer clic; se reutiliza mientras los datos no cambien
+    def descargar_reporte():
+        frames = get_dashboard_data_rango(fecha_desde, fecha_hasta)
+        return reporte_excel(huella_dashboard(fecha_desde, fecha_hasta), *frames)
 
-    if not df_membresias_download.empty:
-        # Quitar la información de zona horaria para compatibilidad con Excel
-        df_membresias_download['fecha_alta'] = df_membresias_download['fecha_alta'].dt.tz_localize(None)
-        df_membresias_download['fecha_vencimiento'] = df_membresias_download['fecha_vencimiento'].dt.tz_localize(None)
-        # Seleccionar y renombrar columnas
-        df_membresias_download = df_membresias_download[['fecha_alta', 'nombre_cliente', 'dni_cliente', 'tipo_membresia', 'precio', 'metodo_pago_display', 'fecha_vencimiento']]
-        df_membresias_download.columns = ['Fecha Alta', 'Cliente', 'DNI', 'Tipo', 'Precio (ARS)', 'Método Pago', 'Vencimiento']
-
-    excel_data = to_excel(df_ing_download, df_gas_download, df_membresias_download)
     st.download_button(
         label="📥 Descargar Reporte en Excel",
-        data=excel_data,
-        file_name=f"Reporte_{month_names[selected_month]}_{selected_year}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        data=descargar_reporte,
+        file_name=f"Reporte_{etiqueta.replace(' ', '_').replace('/', '-')}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore",
     )
 
     # --- KPIs principales ---
     col1, col2, col3, col4 = st.columns(4)
-    total_ingresos = df_ing["monto_total"].sum() if not df_ing.empty else 0
-    total_gastos = df_gas["monto"].sum() if not df_gas.empty else 0
-    total_membresias = df_membresias["precio"].sum() if not df_membresias.empty else 0
+    total_ingresos = totales["ingresos"]["centavos"] / 100
+    total_gastos = totales["gastos"]["centavos"] / 100
+    total_membresias = totales["membresias"]["centavos"] / 100
     
     # Sumar membresías a los ingresos totales
     ingresos_totales_con_membresias = total_ingresos + total_membresias
     utilidad = ingresos_totales_con_membresias - total_gastos
     
     col1.metric("💵 Ingresos (Servicios)", f"${total_ingresos:,.2f}")
-    col2.metric("� Ingresos (Membresías)", f"${total_membresias:,.2f}", help=f"{len(df_membresias)} membresías vendidas")
+    col2.metric("� Ingresos (Membresías)", f"${total_membresias:,.2f}", help=f"{totales['membresias']['cantidad']} membresías vendidas")
     col3.metric("📉 Total Gastos", f"${total_gastos:,.2f}")
     col4.metric("📈 Utilidad Neta", f"${utilidad:,.2f}")
 
     st.divider()
 
+    # --- Resúmenes precalculados (pocas lecturas por mes sin importar el volumen) ---
+    resumen, resumenes_diarios = get_resumen_rango(fecha_desde, fecha_hasta)
+    res_ing, res_gas, res_memb = resumen["ingresos"], resumen["gastos"], resumen["membresias"]
+    figuras = figuras_resumen(
+        huella_resumenes(fecha_desde, fecha_hasta), resumen, resumenes_diarios, (fecha_hasta - fecha_desde).days + 1
+    )
+
     # --- Evolución temporal ingresos vs gastos vs membresías ---
-    if not df_ing.empty or not df_gas.empty or not df_membresias.empty:
-        df_all = pd.DataFrame()
-        
-        if not df_ing.empty:
-            df_ing_plot = df_ing.groupby(df_ing["fecha"].dt.date)["monto_total"].sum().reset_index()
-            df_ing_plot["tipo"] = "Ingresos (Servicios)"
-            df_ing_plot.rename(columns={"monto_total": "monto"}, inplace=True)
-            df_all = pd.concat([df_all, df_ing_plot])
-
-        if not df_gas.empty:
-            df_gas_plot = df_gas.groupby(df_gas["fecha"].dt.date)["monto"].sum().reset_index()
-            df_gas_plot["tipo"] = "Gastos"
-            df_all = pd.concat([df_all, df_gas_plot])
-            
-        if not df_membresias.empty:
-            df_membresias_plot = df_membresias.groupby(df_membresias["fecha_alta"].dt.date)["precio"].sum().reset_index()
-            df_membresias_plot["tipo"] = "Ingresos (Membresías)"
-            df_membresias_plot.rename(columns={"fecha_alta": "fecha", "precio": "monto"}, inplace=True)
-            df_all = pd.concat([df_all, df_membresias_plot])
-
-        # Gráfico de línea con marcadores
-        fig_evolucion = px.line(
-            df_all, x="fecha", y="monto", color="tipo",
-            title="Evolución diaria de Ingresos vs Gastos", 
-            markers=True,
-            color_discrete_map={
-                'Ingresos (Servicios)': '#28a745',
-                'Ingresos (Membresías)': '#17a2b8', 
-                'Gastos': '#dc3545'
-            }
-        )
-        st.plotly_chart(fig_evolucion, use_container_width=True)
+    if "evolucion" in figuras:
+        st.plotly_chart(figuras["evolucion"], use_container_width=True)
 
     st.divider()
 
@@ -151,128 +361,68 @@ def dashboard_ui():
 
     with col_graf_1:
         # --- Distribución de ingresos por método de pago ---
-        if not df_ing.empty:
-            fig_pago = px.pie(df_ing, names="metodo_pago", values="monto_total",
-                              title="Ingresos por método de pago", hole=0.4)
-            fig_pago.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig_pago, use_container_width=True)
+        if "pago" in figuras:
+            st.plotly_chart(figuras["pago"], use_container_width=True)
         else:
             st.info("No hay datos de ingresos para mostrar este gráfico.")
 
     with col_graf_2:
         # --- Gastos por concepto ---
-        if not df_gas.empty:
-            df_gas_grouped = df_gas.groupby("concepto")["monto"].sum().reset_index().sort_values("monto", ascending=False)
-            fig_gas = px.bar(df_gas_grouped,
-                             x="concepto", y="monto",
-                             title="Gastos por concepto")
-            st.plotly_chart(fig_gas, use_container_width=True)
+        if "gastos" in figuras:
+            st.plotly_chart(figuras["gastos"], use_container_width=True)
         else:
             st.info("No hay datos de gastos para mostrar este gráfico.")
 
     st.divider()
 
     # --- SECCIÓN DE MEMBRESÍAS ---
-    if not df_membresias.empty:
+    if res_memb["cantidad"] > 0:
         st.subheader("👥 Análisis de Membresías")
         
         # KPIs de membresías
         col_m1, col_m2, col_m3, col_m4 = st.columns(4)
-        
-        total_membresias_vendidas = len(df_membresias)
-        precio_promedio = df_membresias["precio"].mean()
-        tipo_mas_popular = df_membresias["tipo_membresia"].mode().iloc[0] if not df_membresias.empty else "N/A"
+
+        # Cantidad y monto de la misma agregación que los KPIs principales, para que el promedio sea coherente
+        total_membresias_vendidas = totales["membresias"]["cantidad"]
+        precio_promedio = totales["membresias"]["centavos"] / 100 / total_membresias_vendidas if total_membresias_vendidas else 0
+        tipo_mas_popular = max(res_memb["por_tipo"], key=lambda tipo: res_memb["por_tipo"][tipo]["cantidad"])
         
         col_m1.metric("📊 Membresías Vendidas", f"{total_membresias_vendidas}")
         col_m2.metric("💰 Precio Promedio", f"${precio_promedio:,.2f}")
         col_m3.metric("🏆 Tipo Más Popular", tipo_mas_popular)
         col_m4.metric("📈 Ingresos Totales", f"${total_membresias:,.2f}")
         
-        # Gráficos de membresías
+        # Gráficos de membresías: tipos y métodos de pago
         col_graf_m1, col_graf_m2 = st.columns(2)
-        
-        with col_graf_m1:
-            # Distribución por tipo de membresía
-            tipo_counts = df_membresias["tipo_membresia"].value_counts().reset_index()
-            fig_tipos = px.pie(tipo_counts, names="tipo_membresia", values="count",
-                              title="Distribución de Tipos de Membresía", hole=0.4)
-            fig_tipos.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig_tipos, use_container_width=True)
-        
-        with col_graf_m2:
-            # Ingresos por tipo de membresía
-            ingresos_tipo = df_membresias.groupby("tipo_membresia")["precio"].sum().reset_index().sort_values("precio", ascending=False)
-            fig_ingresos_tipo = px.bar(ingresos_tipo,
-                                     x="tipo_membresia", y="precio",
-                                     title="Ingresos por Tipo de Membresía",
-                                     color="precio",
-                                     color_continuous_scale="Blues")
-            st.plotly_chart(fig_ingresos_tipo, use_container_width=True)
-        
-        # Gráficos adicionales de métodos de pago
+        col_graf_m1.plotly_chart(figuras["tipos"], use_container_width=True)
+        col_graf_m2.plotly_chart(figuras["ingresos_tipo"], use_container_width=True)
         col_graf_m3, col_graf_m4 = st.columns(2)
-        
-        with col_graf_m3:
-            # Distribución por método de pago
-            if "metodo_pago_display" in df_membresias.columns:
-                pago_counts = df_membresias["metodo_pago_display"].value_counts().reset_index()
-                fig_pagos = px.pie(pago_counts, names="metodo_pago_display", values="count",
-                                  title="Métodos de Pago en Membresías", hole=0.4)
-                fig_pagos.update_traces(textposition='inside', textinfo='percent+label')
-                st.plotly_chart(fig_pagos, use_container_width=True)
-            else:
-                st.info("Información de métodos de pago no disponible para este período.")
-        
-        with col_graf_m4:
-            # Ingresos por método de pago
-            if "metodo_pago_display" in df_membresias.columns:
-                ingresos_pago = df_membresias.groupby("metodo_pago_display")["precio"].sum().reset_index().sort_values("precio", ascending=False)
-                fig_ingresos_pago = px.bar(ingresos_pago,
-                                         x="metodo_pago_display", y="precio",
-                                         title="Ingresos por Método de Pago",
-                                         color="precio",
-                                         color_continuous_scale="Greens")
-                st.plotly_chart(fig_ingresos_pago, use_container_width=True)
-            else:
-                st.info("Información de métodos de pago no disponible para este período.")
+        col_graf_m3.plotly_chart(figuras["pagos_membresias"], use_container_width=True)
+        col_graf_m4.plotly_chart(figuras["ingresos_pago_membresias"], use_container_width=True)
         
         # Top clientes por membresías (si hay múltiples en el mes)
-        if len(df_membresias) > 1:
-            clientes_membresias = df_membresias.groupby(["nombre_cliente", "dni_cliente"]).agg({
-                "precio": "sum",
-                "tipo_membresia": "count"
-            }).reset_index()
-            clientes_membresias.rename(columns={"tipo_membresia": "cantidad_membresias"}, inplace=True)
-            clientes_membresias = clientes_membresias.sort_values("precio", ascending=False).head(10)
-            
-            if len(clientes_membresias) > 1:
-                fig_top_clientes = px.bar(clientes_membresias,
-                                        x="nombre_cliente", y="precio",
-                                        title="Top Clientes por Ingresos en Membresías",
-                                        hover_data=["cantidad_membresias"])
-                st.plotly_chart(fig_top_clientes, use_container_width=True)
+        # Necesita el detalle de las membresías: se consulta al final, cuando el resto ya está a la vista
+        lugar_top_clientes = st.container() if res_memb["cantidad"] > 1 else None
     else:
+        lugar_top_clientes = None
         st.info("💡 No hay membresías vendidas en este período para mostrar análisis específico.")
 
     st.divider()
 
     # --- NUEVO: Top Productos/Servicios vendidos ---
-    if not df_ing.empty and 'items' in df_ing.columns:
-        # 'Explota' la lista de items para tener una fila por cada item vendido
-        df_items = df_ing.explode('items').dropna(subset=['items'])
-        if not df_items.empty:
-            df_items['nombre_producto'] = df_items['items'].apply(lambda x: x.get('nombre', 'Desconocido'))
-            top_productos = df_items['nombre_producto'].value_counts().reset_index()
-            top_productos.columns = ['producto', 'cantidad']
-            
-            fig_top_prod = px.bar(top_productos.head(10), x='producto', y='cantidad', title='Top 10 Productos/Servicios más vendidos')
-            st.plotly_chart(fig_top_prod, use_container_width=True)
+    if "top_productos" in figuras:
+        st.plotly_chart(figuras["top_productos"], use_container_width=True)
 
     # --- Top operadores (ventas) ---
-    if not df_ing.empty:
-        fig_op = px.bar(df_ing.groupby("operador")["monto_total"].sum().reset_index(),
-                        x="operador", y="monto_total",
-                        title="Ingresos por operador/barbero")
-        st.plotly_chart(fig_op, use_container_width=True)
+    if "operadores" in figuras:
+        st.plotly_chart(figuras["operadores"], use_container_width=True)
+
+    if lugar_top_clientes is not None:
+        # Solo las membresías: los meses que falten se consultan sin traer ingresos ni gastos
+        df_membresias = get_membresias_rango(fecha_desde, fecha_hasta)
+        fig_top_clientes = figura_top_clientes(huella_membresias(fecha_desde, fecha_hasta), df_membresias)
+        if fig_top_clientes is not None:
+            lugar_top_clientes.plotly_chart(fig_top_clientes, use_container_width=True)
 
-dashboard_ui()
\ No newline at end of file
+with medir_pagina("Dashboard"):
+    dashboard_ui()
@@ -1,14 +1,36 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore as admin_fs
-from google.cloud import firestore as gcfs
+from utils import (
+    avisar,
+    cambiar_estado_productos,
+    crear_producto,
+    eliminar_productos,
+    listar_productos,
+    medir_callback,
+    medir_pagina,
+    mostrar_avisos,
+)
 
-# --- Inicialización Firebase ---
-# Reutiliza la misma lógica para evitar re-inicializar la app
-if not firebase_admin._apps:
-    cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
-    firebase_admin.initialize_app(cred)
-db = admin_fs.client()
+
+def productos_seleccionados(productos):
+    return [p["id"] for p in productos if st.session_state.get(f"sel_prod_{p['id']}")]
+
+
+@medir_callback
+def cambiar_estado_listado(producto_ids, activo):
+    """Callback: activa o desactiva los productos en una escritura por lotes."""
+    cambiar_estado_productos(producto_ids, activo)
+    for producto_id in producto_ids:
+        st.session_state.pop(f"sel_prod_{producto_id}", None)
+    avisar(f"{'✅ Activados' if activo else '❌ Desactivados'}: {len(producto_ids)} producto(s).")
+
+
+@medir_callback
+def eliminar_listado(producto_ids):
+    """Callback: elimina los productos en una escritura por lotes."""
+    eliminar_productos(producto_ids)
+    for producto_id in producto_ids:
+        st.session_state.pop(f"sel_prod_{producto_id}", None)
+    avisar(f"🗑️ Eliminados: {len(producto_ids)} producto(s).")
 
 
 def productos_ui():
@@ -30,40 +52,52 @@ def productos_ui():
                     "precio_centavos": int(precio * 100),
                     "categoria": categoria,
                     "activo": True,
-                    "created_at": gcfs.SERVER_TIMESTAMP,
-                    "updated_at": gcfs.SERVER_TIMESTAMP,
                 }
-                db.collection("productos").add(doc)
+                crear_producto(doc)
                 st.success(f"Producto '{nombre}' agregado ✅")
             else:
                 st.error("Complete nombre y precio válido.")
 
     st.divider()
 
-    # --- Listado de productos ---
-    productos = db.collection("productos").stream()
-    for p in productos:
-        data = p.to_dict()
+    listado_productos_ui()
+
+
+@st.fragment
+@medir_pagina("Productos")
+def listado_productos_ui():
+    """Listado de productos. Es un fragmento: la selección y las acciones vuelven a ejecutar solo el listado."""
+    mostrar_avisos()
+    # El listado sale del almacén compartido, que después de cada escritura solo relee lo que cambió
+    productos = listar_productos()
+
+    # Acciones sobre los productos marcados: una sola escritura por lotes
+    seleccionados = productos_seleccionados(productos)
+    col1, col2, col3, col4 = st.columns([1.5, 1, 1, 1])
+    col1.write(f"Seleccionados: **{len(seleccionados)}**")
+    col2.button("✅ Activar", key="bulk_activar_prod", on_click=cambiar_estado_listado,
+                args=(seleccionados, True), disabled=not seleccionados)
+    col3.button("❌ Desactivar", key="bulk_desactivar_prod", on_click=cambiar_estado_listado,
+                args=(seleccionados, False), disabled=not seleccionados)
+    col4.button("🗑️ Eliminar", key="bulk_eliminar_prod", on_click=eliminar_listado,
+                args=(seleccionados,), disabled=not seleccionados)
+
+    for data in productos:
         is_active = data.get("activo", True)  # Considerar activo si el campo no existe
 
-        col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
+        col0, col1, col2, col3, col4, col5 = st.columns([0.4, 3, 2, 2, 2, 1])
+        col0.checkbox("Seleccionar", key=f"sel_prod_{data['id']}", label_visibility="collapsed")
         col1.write(data["nombre"])
         col2.write(data["tipo"])
         col3.write(f"${data['precio_centavos']/100:,.2f}")
 
         # Columna para cambiar el estado (Activo/Inactivo)
-        if is_active:
-            if col4.button("✅ Desactivar", key=f"toggle_{p.id}", help="Marcar como inactivo"):
-                db.collection("productos").document(p.id).update({"activo": False})
-                st.rerun()
-        else:
-            if col4.button("❌ Activar", key=f"toggle_{p.id}", help="Marcar como activo"):
-                db.collection("productos").document(p.id).update({"activo": True})
-                st.rerun()
-
-        if col5.button("🗑️", key=f"delete_{p.id}", help="Eliminar producto permanentemente"):
-            db.collection("productos").document(p.id).delete()
-            st.warning(f"Producto '{data['nombre']}' eliminado.")
-            st.rerun()
-
-productos_ui()
\ No newline at end of file
+        col4.button("✅ Desactivar" if is_active else "❌ Activar", key=f"toggle_{data['id']}",
+                    help="Marcar como inactivo" if is_active else "Marcar como activo",
+                    on_click=cambiar_estado_listado, args=([data["id"]], not is_active))
+
+        col5.button("🗑️", key=f"delete_{data['id']}", help="Eliminar producto permanentemente",
+                    on_click=eliminar_listado, args=([data["id"]],))
+
+with medir_pagina("Productos"):
+    productos_ui()
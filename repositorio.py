@@ -0,0 +1,844 @@
+"""
+Capa de acceso a datos de Benjas Barber Club.
+
+Todas las páginas leen y escriben a través de `Repositorio`, de modo que el cacheo, el
+procesamiento por lotes y la medición se agregan en un solo lugar. El backend se elige con
+la variable de entorno BENJAS_BACKEND:
+
+- "firestore" (por defecto): Firestore real, con las credenciales de st.secrets["FIREBASE"].
+- "memoria": base en memoria del proceso (ver backend_local.MemoriaClient).
+- "sqlite": archivo SQLite local, ruta en BENJAS_SQLITE_PATH (por defecto "benjas.sqlite3").
+
+El cliente del repositorio compartido cuenta sus operaciones (ver instrumentacion.py).
+"""
+import os
+import unicodedata
+from calendar import monthrange
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, TypedDict
+
+from google.cloud import firestore as gcfs
+
+from instrumentacion import ClienteInstrumentado
+from resumenes import (
+    CAMPO_FECHA,
+    CAMPO_MONTO,
+    COLECCION_RESUMENES_DIARIOS,
+    COLECCION_RESUMENES_MENSUALES,
+    calcular_resumenes,
+    diferencias,
+    escribir_aporte,
+    escribir_aportes,
+)
+
+SERVER_TIMESTAMP = gcfs.SERVER_TIMESTAMP
+
+# Proyección con la última membresía de cada cliente (ID = DNI)
+COLECCION_ULTIMA_MEMBRESIA = "ultima_membresia"
+# Cantidad máxima de documentos por lectura múltiple (get_all)
+TAMANO_LOTE_LECTURA = 100
+# Máximo de valores de un filtro "in" de Firestore
+MAXIMO_FILTRO_IN = 30
+# Membresías por escritura en las acciones masivas (cada una suma varias operaciones al lote)
+TAMANO_LOTE_MEMBRESIAS = 150
+# Máximo de operaciones por escritura en lote de Firestore
+TAMANO_LOTE_ESCRITURA = 500
+
+BACKENDS = ("firestore", "memoria", "sqlite")
+
+# Documento de "configuracion" con un contador por catálogo ("productos", "clientes") que
+# se incrementa en cada escritura, para que las caches detecten cambios con una lectura
+DOCUMENTO_VERSIONES_CATALOGO = "versiones_catalogo"
+
+# Límite superior para las búsquedas por prefijo (">= prefijo" y "< prefijo + FIN_PREFIJO")
+FIN_PREFIJO = "\uf8ff"
+
+
+# --- Formas de los documentos ---
+
+# Valores que ofrecen los formularios de Ingresos y Gastos
+METODOS_PAGO = ["efectivo", "débito", "crédito", "transferencia", "qr", "mp"]
+CONCEPTOS_GASTO = ["insumos", "alquiler", "servicios", "mantenimiento", "marketing", "otros"]
+
+class Cliente(TypedDict, total=False):
+    dni: str
+    nombre: str
+    nombre_normalizado: str  # nombre en minúsculas y sin acentos, para ordenar y buscar
+    telefono: str
+    email: str
+    activo: bool
+    created_at: datetime
+    updated_at: datetime
+
+
+class ItemIngreso(TypedDict):
+    producto_id: str
+    nombre: str
+    precio_centavos: int
+
+
+class Producto(TypedDict, total=False):
+    id: str
+    nombre: str
+    tipo: str
+    precio_centavos: int
+    categoria: str
+    activo: bool
+    created_at: datetime
+    updated_at: datetime
+
+
+class Ingreso(TypedDict, total=False):
+    id: str
+    fecha: datetime
+    cliente: str
+    cliente_dni: Optional[str]
+    operador: str
+    metodo_pago: str
+    consumicion: str
+    items: List[ItemIngreso]
+    monto_total_centavos: int
+    created_at: datetime
+    updated_at: datetime
+
+
+class Gasto(TypedDict, total=False):
+    id: str
+    fecha: datetime
+    concepto: str
+    proveedor: str
+    descripcion: str
+    metodo_pago: str
+    monto_centavos: int
+    created_at: datetime
+    updated_at: datetime
+
+
+class Membresia(TypedDict, total=False):
+    id: str
+    dni_cliente: str
+    tipo_membresia: str
+    fecha_alta: datetime
+    fecha_vencimiento: datetime
+    precio_centavos: int
+    metodo_pago: str
+    notas: str
+    activa: bool
+    created_at: datetime
+    updated_at: datetime
+
+
+class UltimaMembresia(Membresia, total=False):
+    membresia_id: str
+    nombre_cliente: str
+
+
+# Precios por tipo de membresía, en centavos ({"Mensual": 500000, ...})
+PreciosMembresias = Dict[str, int]
+
+
+# --- Backends ---
+
+def _inicializar_firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    # Asegura que la app de Firebase se inicialice solo una vez
+    if not firebase_admin._apps:
+        import streamlit as st
+
+        cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
+        firebase_admin.initialize_app(cred)
+
+
+def crear_db(backend=None, ruta_sqlite=None):
+    """Crea el cliente de base de datos del backend indicado (o el de BENJAS_BACKEND)."""
+    backend = backend or os.environ.get("BENJAS_BACKEND", "firestore")
+    if backend == "firestore":
+        from firebase_admin import firestore as admin_fs
+
+        _inicializar_firebase()
+        return admin_fs.client()
+    if backend == "memoria":
+        from backend_local import MemoriaClient
+
+        return MemoriaClient()
+    if backend == "sqlite":
+        from backend_local import SQLiteClient
+
+        return SQLiteClient(ruta_sqlite or os.environ.get("BENJAS_SQLITE_PATH", "benjas.sqlite3"))
+    raise ValueError(f"Backend desconocido: {backend!r} (opciones: {', '.join(BACKENDS)})")
+
+
+def crear_db_async(backend=None):
+    """
+    Crea el cliente asíncrono del backend (firestore.AsyncClient), o None si el backend no
+    tiene cliente asíncrono (los backends locales). Se debe crear en el event loop que lo usa.
+    """
+    backend = backend or os.environ.get("BENJAS_BACKEND", "firestore")
+    if backend != "firestore":
+        return None
+    from firebase_admin import firestore_async
+
+    _inicializar_firebase()
+    return firestore_async.client()
+
+
+_repositorio = None
+
+
+def obtener_repositorio():
+    """Retorna el repositorio compartido por todo el proceso."""
+    global _repositorio
+    if _repositorio is None:
+        _repositorio = Repositorio(ClienteInstrumentado(crear_db()))
+    return _repositorio
+
+
+# --- Utilidades ---
+
+def _con_id(snapshot):
+    data = snapshot.to_dict()
+    data["id"] = snapshot.id
+    return data
+
+
+def _con_marcas_de_tiempo(doc):
+    doc = dict(doc)
+    doc.setdefault("created_at", SERVER_TIMESTAMP)
+    doc.setdefault("updated_at", SERVER_TIMESTAMP)
+    return doc
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin acentos y con los espacios colapsados ("  José  PÉREZ" -> "jose perez")."""
+    sin_acentos = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(sin_acentos.lower().split())
+
+
+def limites_mes(year, month):
+    """Primer y último instante de un mes."""
+    _, num_days = monthrange(year, month)
+    return datetime(year, month, 1), datetime(year, month, num_days, 23, 59, 59)
+
+
+def totales_agregacion(resultado):
+    """{"cantidad", "centavos"} a partir del resultado de una agregación count("cantidad") + sum("centavos")."""
+    valores = {r.alias: r.value for r in (resultado[0] if resultado else [])}
+    return {"cantidad": int(valores.get("cantidad") or 0), "centavos": int(valores.get("centavos") or 0)}
+
+
+def get_sort_key_membresia(m):
+    """Clave para ordenar membresías: created_at si existe, sino fecha_alta."""
+    if m.get("created_at"):
+        return m["created_at"]
+    elif m.get("fecha_alta"):
+        return m["fecha_alta"]
+    else:
+        return datetime.min.replace(tzinfo=timezone.utc)  # Para membresías sin fecha
+
+
+def proyeccion_membresia(membresia_id, data, nombre_cliente) -> UltimaMembresia:
+    """Arma el documento de la proyección a partir de una membresía."""
+    proyeccion = {k: v for k, v in data.items() if k != "id"}
+    # Siempre presente: los filtros por estado son igualdades sobre `activa`, y Firestore no
+    # devuelve los documentos sin el campo (las membresías antiguas sin él se consideran activas)
+    proyeccion["activa"] = data.get("activa", True)
+    proyeccion["membresia_id"] = membresia_id
+    proyeccion["nombre_cliente"] = nombre_cliente
+    return proyeccion
+
+
+class Repositorio:
+    """Operaciones tipadas sobre las colecciones de la app, independientes del backend."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _rango(self, coleccion, campo, desde, hasta):
+        return (
+            self.db.collection(coleccion)
+            .where(filter=gcfs.FieldFilter(campo, ">=", desde))
+            .where(filter=gcfs.FieldFilter(campo, "<=", hasta))
+        )
+
+    def iterar_entre(self, coleccion, campo, desde, hasta, campos=None) -> Iterable[dict]:
+        """
+        Documentos (con su id) cuyo `campo` está en el rango, a medida que llegan de la consulta.
+        Con `campos`, cada documento trae solo esos campos (select).
+        """
+        query = self._rango(coleccion, campo, desde, hasta)
+        if campos:
+            query = query.select(campos)
+        return (_con_id(d) for d in query.stream())
+
+    def _en_transaccion(self, funcion):
+        """Ejecuta funcion(transaction) en una transacción del backend."""
+        transactional = getattr(self.db, "transactional", gcfs.transactional)
+        return transactional(funcion)(self.db.transaction())
+
+    def _crear_con_resumen(self, coleccion, doc):
+        """Crea un documento y suma su aporte a los resúmenes en la misma escritura."""
+        doc = _con_marcas_de_tiempo(doc)
+        ref = self.db.collection(coleccion).document()
+        batch = self.db.batch()
+        batch.set(ref, doc)
+        escribir_aporte(batch, self.db, coleccion, doc)
+        batch.commit()
+        return ref.id
+
+    def _eliminar_con_resumen(self, coleccion, doc_id):
+        """Elimina un documento y resta su aporte a los resúmenes dentro de una transacción."""
+        ref = self.db.collection(coleccion).document(doc_id)
+
+        def eliminar(transaction):
+            snapshot = ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            data = snapshot.to_dict()
+            transaction.delete(ref)
+            escribir_aporte(transaction, self.db, coleccion, data, signo=-1)
+            return data
+
+        return self._en_transaccion(eliminar)
+
+    def _incrementar_version(self, escritor, catalogo):
+        """Agrega al lote el incremento de la versión del catálogo."""
+        escritor.set(
+            self.db.collection("configuracion").document(DOCUMENTO_VERSIONES_CATALOGO),
+            {catalogo: gcfs.Increment(1), "updated_at": SERVER_TIMESTAMP},
+            merge=True,
+        )
+
+    def _escribir_con_version(self, catalogo, tipo, ref, data=None):
+        """Aplica una escritura (set/update/delete) y el incremento de la versión en un solo lote."""
+        self._escribir_varios_con_version(catalogo, [(tipo, ref, data)])
+
+    def _escribir_varios_con_version(self, catalogo, operaciones):
+        """Aplica escrituras (tipo, ref, data) en lotes, cada uno con el incremento de la versión del catálogo."""
+        tamano = TAMANO_LOTE_ESCRITURA - 1
+        for inicio in range(0, len(operaciones), tamano):
+            batch = self.db.batch()
+            for tipo, ref, data in operaciones[inicio:inicio + tamano]:
+                if tipo == "delete":
+                    batch.delete(ref)
+                else:
+                    getattr(batch, tipo)(ref, data)
+            self._incrementar_version(batch, catalogo)
+            batch.commit()
+
+    def _leer_varios(self, coleccion, doc_ids, transaction=None) -> Dict[str, dict]:
+        """{id: datos} de los documentos que existen, con lecturas múltiples por lotes."""
+        doc_ids = list(dict.fromkeys(doc_ids))
+        encontrados = {}
+        for inicio in range(0, len(doc_ids), TAMANO_LOTE_LECTURA):
+            refs = [self.db.collection(coleccion).document(d) for d in doc_ids[inicio:inicio + TAMANO_LOTE_LECTURA]]
+            for snapshot in self.db.get_all(refs, transaction=transaction):
+                if snapshot.exists:
+                    encontrados[snapshot.id] = snapshot.to_dict()
+        return encontrados
+
+    def _membresias_de_clientes(self, dnis, **filtros) -> List[Membresia]:
+        """Membresías de varios clientes, con consultas "in" de hasta MAXIMO_FILTRO_IN DNIs."""
+        dnis = list(dict.fromkeys(dnis))
+        membresias = []
+        for inicio in range(0, len(dnis), MAXIMO_FILTRO_IN):
+            query = self.db.collection("membresias").where(
+                filter=gcfs.FieldFilter("dni_cliente", "in", dnis[inicio:inicio + MAXIMO_FILTRO_IN])
+            )
+            for campo, valor in filtros.items():
+                query = query.where(filter=gcfs.FieldFilter(campo, "==", valor))
+            membresias += [_con_id(m) for m in query.stream()]
+        return membresias
+
+    def obtener_versiones_catalogo(self) -> Dict[str, int]:
+        """Versiones actuales de los catálogos (una lectura)."""
+        versiones = self.db.collection("configuracion").document(DOCUMENTO_VERSIONES_CATALOGO).get()
+        data = versiones.to_dict() if versiones.exists else {}
+        return {catalogo: data.get(catalogo, 0) for catalogo in ("productos", "clientes")}
+
+    def _escribir_en_lotes(self, operaciones):
+        """Aplica operaciones (ref, data) en lotes; data=None elimina el documento."""
+        for inicio in range(0, len(operaciones), TAMANO_LOTE_ESCRITURA):
+            batch = self.db.batch()
+            for ref, data in operaciones[inicio:inicio + TAMANO_LOTE_ESCRITURA]:
+                if data is None:
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, data)
+            batch.commit()
+
+    def importar_lote(self, coleccion, documentos):
+        """
+        Escribe documentos importados [(id, data)] en un solo lote, con IDs fijos para que
+        repetir el lote no los duplique. No actualiza los resúmenes: después de importar
+        ingresos o gastos hay que reconciliar los meses afectados. Los clientes se escriben con
+        set, así que quien llama debe omitir los DNIs que ya existen. Los clientes incrementan
+        la versión del catálogo en el mismo lote (hasta TAMANO_LOTE_ESCRITURA - 1 documentos).
+        """
+        batch = self.db.batch()
+        for doc_id, data in documentos:
+            if coleccion == "clientes":
+                data = dict(data, nombre_normalizado=normalizar_texto(data.get("nombre")))
+            batch.set(self.db.collection(coleccion).document(doc_id), _con_marcas_de_tiempo(data))
+        if coleccion == "clientes":
+            self._incrementar_version(batch, "clientes")
+        batch.commit()
+
+    # --- Clientes ---
+
+    def listar_clientes(self) -> List[Cliente]:
+        """Todos los clientes, ordenados por nombre."""
+        clientes = [_con_id(c) for c in self.db.collection("clientes").stream()]
+        clientes.sort(key=lambda x: x.get("nombre", ""))
+        return clientes
+
+    def consulta_clientes_activos(self):
+        """Consulta de los clientes activos (para mantenerla en memoria con listeners)."""
+        return self.db.collection("clientes").where(filter=gcfs.FieldFilter("activo", "==", True))
+
+    def listar_clientes_activos(self) -> List[Cliente]:
+        """Clientes activos, ordenados por nombre."""
+        clientes = [_con_id(c) for c in self.consulta_clientes_activos().stream()]
+        clientes.sort(key=lambda x: x.get("nombre", ""))
+        return clientes
+
+    def pagina_clientes(self, cantidad, despues_de=None, busqueda="") -> Tuple[List[Cliente], Optional[object]]:
+        """
+        Una página de clientes ordenada por nombre en el servidor, a partir del cursor `despues_de`.
+        Con `busqueda` filtra por prefijo del DNI (si es numérica) o del nombre normalizado.
+        Retorna (clientes, cursor de la página siguiente o None si no hay más).
+        """
+        busqueda = busqueda.strip()
+        query = self.db.collection("clientes")
+        if busqueda.isdigit():
+            campo, prefijo = "dni", busqueda
+        else:
+            campo, prefijo = "nombre_normalizado", normalizar_texto(busqueda)
+        if prefijo:
+            query = (
+                query.where(filter=gcfs.FieldFilter(campo, ">=", prefijo))
+                .where(filter=gcfs.FieldFilter(campo, "<", prefijo + FIN_PREFIJO))
+            )
+        query = query.order_by(campo)
+        if despues_de is not None:
+            query = query.start_after(despues_de)
+        # Se pide un cliente más para saber si hay otra página
+        snapshots = list(query.limit(cantidad + 1).stream())
+        siguiente = snapshots[cantidad - 1] if len(snapshots) > cantidad else None
+        return [_con_id(c) for c in snapshots[:cantidad]], siguiente
+
+    def completar_nombres_normalizados(self) -> int:
+        """
+        Agrega (o corrige) nombre_normalizado en los clientes que lo necesiten; los clientes sin
+        ese campo no aparecen en el listado paginado. Retorna la cantidad de clientes actualizados.
+        """
+        actualizaciones = []
+        for c in self.db.collection("clientes").select(["nombre", "nombre_normalizado"]).stream():
+            data = c.to_dict()
+            normalizado = normalizar_texto(data.get("nombre"))
+            if data.get("nombre_normalizado") != normalizado:
+                actualizaciones.append((c.reference, normalizado))
+        for inicio in range(0, len(actualizaciones), TAMANO_LOTE_ESCRITURA):
+            batch = self.db.batch()
+            for ref, normalizado in actualizaciones[inicio:inicio + TAMANO_LOTE_ESCRITURA]:
+                batch.update(ref, {"nombre_normalizado": normalizado})
+            batch.commit()
+        return len(actualizaciones)
+
+    def obtener_cliente(self, dni) -> Optional[Cliente]:
+        cliente = self.db.collection("clientes").document(dni).get()
+        return _con_id(cliente) if cliente.exists else None
+
+    def obtener_nombres_clientes(self, dnis: Iterable[str]) -> Tuple[Dict[str, str], int]:
+        """
+        Obtiene los nombres de varios clientes con lecturas múltiples por lotes en lugar de un get() por cliente.
+        Retorna un diccionario {dni: nombre} y la cantidad de documentos leídos.
+        """
+        dnis = [dni for dni in dict.fromkeys(dnis) if dni]
+        nombres = {}
+        lecturas = 0
+        for inicio in range(0, len(dnis), TAMANO_LOTE_LECTURA):
+            refs = [self.db.collection("clientes").document(dni) for dni in dnis[inicio:inicio + TAMANO_LOTE_LECTURA]]
+            for cliente_doc in self.db.get_all(refs, field_paths=["nombre"]):
+                lecturas += 1
+                if cliente_doc.exists:
+                    nombres[cliente_doc.id] = cliente_doc.to_dict().get("nombre", "Cliente no encontrado")
+        return nombres, lecturas
+
+    def obtener_clientes(self, dnis: Iterable[str], campos=None) -> Dict[str, Cliente]:
+        """Clientes existentes entre los DNIs ({dni: cliente}), con lecturas múltiples por lotes y solo `campos` si se indican."""
+        dnis = [dni for dni in dict.fromkeys(dnis) if dni]
+        clientes = {}
+        for inicio in range(0, len(dnis), TAMANO_LOTE_LECTURA):
+            refs = [self.db.collection("clientes").document(dni) for dni in dnis[inicio:inicio + TAMANO_LOTE_LECTURA]]
+            for cliente_doc in self.db.get_all(refs, field_paths=campos):
+                if cliente_doc.exists:
+                    clientes[cliente_doc.id] = _con_id(cliente_doc)
+        return clientes
+
+    def crear_cliente(self, doc: Cliente):
+        """Crea un cliente usando su DNI como ID."""
+        doc = dict(doc, nombre_normalizado=normalizar_texto(doc.get("nombre")))
+        ref = self.db.collection("clientes").document(doc["dni"])
+        self._escribir_con_version("clientes", "set", ref, _con_marcas_de_tiempo(doc))
+
+    def cambiar_estado_cliente(self, dni, activo):
+        self._escribir_con_version("clientes", "update", self.db.collection("clientes").document(dni), {"activo": activo})
+
+    def cambiar_estado_clientes(self, dnis, activo):
+        """Activa o desactiva varios clientes en una escritura por lotes."""
+        coleccion = self.db.collection("clientes")
+        self._escribir_varios_con_version("clientes", [("update", coleccion.document(dni), {"activo": activo}) for dni in dnis])
+
+    def clientes_con_membresias_activas(self, dnis) -> set:
+        """DNIs, de entre los dados, que tienen alguna membresía activa."""
+        return {m["dni_cliente"] for m in self._membresias_de_clientes(dnis, activa=True)}
+
+    def eliminar_clientes(self, dnis):
+        """Elimina varios clientes en una escritura por lotes, como eliminar_cliente."""
+        proyecciones = self._leer_varios(COLECCION_ULTIMA_MEMBRESIA, dnis)
+        operaciones = [("delete", self.db.collection("clientes").document(dni), None) for dni in dnis]
+        operaciones += [
+            ("update", self.db.collection(COLECCION_ULTIMA_MEMBRESIA).document(dni), {"nombre_cliente": "Cliente no encontrado"})
+            for dni in proyecciones
+        ]
+        self._escribir_varios_con_version("clientes", operaciones)
+
+    def cliente_tiene_membresias_activas(self, dni) -> bool:
+        query = (
+            self.db.collection("membresias")
+            .where(filter=gcfs.FieldFilter("dni_cliente", "==", dni))
+            .where(filter=gcfs.FieldFilter("activa", "==", True))
+            .limit(1)
+        )
+        return len(query.get()) > 0
+
+    def eliminar_cliente(self, dni):
+        """Elimina un cliente y refleja en su proyección de membresía que ya no existe."""
+        self._escribir_con_version("clientes", "delete", self.db.collection("clientes").document(dni))
+        proyeccion_ref = self.db.collection(COLECCION_ULTIMA_MEMBRESIA).document(dni)
+        if proyeccion_ref.get().exists:
+            proyeccion_ref.update({"nombre_cliente": "Cliente no encontrado"})
+
+    # --- Productos ---
+
+    def consulta_productos(self):
+        """Colección de productos (para mantenerla en memoria con listeners)."""
+        return self.db.collection("productos")
+
+    def listar_productos(self) -> List[Producto]:
+        return [_con_id(p) for p in self.consulta_productos().stream()]
+
+    def listar_productos_activos(self) -> List[Producto]:
+        query = self.db.collection("productos").where(filter=gcfs.FieldFilter("activo", "==", True))
+        return [_con_id(p) for p in query.stream()]
+
+    def crear_producto(self, doc: Producto) -> str:
+        ref = self.db.collection("productos").document()
+        self._escribir_con_version("productos", "set", ref, _con_marcas_de_tiempo(doc))
+        return ref.id
+
+    def cambiar_estado_producto(self, producto_id, activo):
+        ref = self.db.collection("productos").document(producto_id)
+        self._escribir_con_version("productos", "update", ref, {"activo": activo})
+
+    def eliminar_producto(self, producto_id):
+        self._escribir_con_version("productos", "delete", self.db.collection("productos").document(producto_id))
+
+    def cambiar_estado_productos(self, producto_ids, activo):
+        coleccion = self.db.collection("productos")
+        self._escribir_varios_con_version("productos", [("update", coleccion.document(p), {"activo": activo}) for p in producto_ids])
+
+    def eliminar_productos(self, producto_ids):
+        coleccion = self.db.collection("productos")
+        self._escribir_varios_con_version("productos", [("delete", coleccion.document(p), None) for p in producto_ids])
+
+    # --- Ingresos ---
+
+    def crear_ingreso(self, doc: Ingreso) -> str:
+        return self._crear_con_resumen("ingresos", doc)
+
+    def eliminar_ingreso(self, ingreso_id) -> Optional[Ingreso]:
+        return self._eliminar_con_resumen("ingresos", ingreso_id)
+
+    def ultimos_ingresos(self, cantidad=10) -> List[Ingreso]:
+        query = self.db.collection("ingresos").order_by("fecha", direction=gcfs.Query.DESCENDING).limit(cantidad)
+        return [_con_id(i) for i in query.stream()]
+
+    def ingresos_entre(self, desde, hasta) -> List[Ingreso]:
+        return list(self.iterar_entre("ingresos", "fecha", desde, hasta))
+
+    # --- Gastos ---
+
+    def crear_gasto(self, doc: Gasto) -> str:
+        return self._crear_con_resumen("gastos", doc)
+
+    def eliminar_gasto(self, gasto_id) -> Optional[Gasto]:
+        return self._eliminar_con_resumen("gastos", gasto_id)
+
+    def ultimos_gastos(self, cantidad=10) -> List[Gasto]:
+        query = self.db.collection("gastos").order_by("fecha", direction=gcfs.Query.DESCENDING).limit(cantidad)
+        return [_con_id(g) for g in query.stream()]
+
+    def gastos_entre(self, desde, hasta) -> List[Gasto]:
+        return list(self.iterar_entre("gastos", "fecha", desde, hasta))
+
+    # --- Membresías ---
+
+    def membresias_entre(self, desde, hasta) -> List[Membresia]:
+        """Membresías dadas de alta en el rango de fechas."""
+        return list(self.iterar_entre("membresias", "fecha_alta", desde, hasta))
+
+    def obtener_ultima_membresia(self, dni_cliente) -> Optional[UltimaMembresia]:
+        """
+        Obtiene la membresía más reciente de un cliente con una lectura de su proyección (id = DNI),
+        que se mantiene al día en cada escritura. Las membresías sin created_at cuentan por su
+        fecha_alta, como en get_sort_key_membresia.
+        """
+        proyeccion = self.db.collection(COLECCION_ULTIMA_MEMBRESIA).document(dni_cliente).get()
+        if not proyeccion.exists:
+            return None
+        data = proyeccion.to_dict()
+        data["id"] = data["membresia_id"]
+        return data
+
+    def listar_ultimas_membresias(self, activa=None, vence_desde=None, vence_antes=None) -> List[UltimaMembresia]:
+        """
+        Última membresía de cada cliente, leída de la proyección (id = ID de la membresía) y
+        ordenada por vencimiento. Los filtros se resuelven en la consulta: igualdad sobre `activa`
+        y rango [vence_desde, vence_antes) sobre `fecha_vencimiento`. Filtrar por `activa`
+        requiere el índice compuesto (activa, fecha_vencimiento) definido en firestore.indexes.json,
+        y que todas las proyecciones tengan `activa`: las escritas antes de que proyeccion_membresia
+        lo completara se corrigen una vez con `python mantenimiento.py reconstruir-ultima-membresia`.
+        """
+        query = self.db.collection(COLECCION_ULTIMA_MEMBRESIA)
+        if activa is not None:
+            query = query.where(filter=gcfs.FieldFilter("activa", "==", activa))
+        if vence_desde is not None:
+            query = query.where(filter=gcfs.FieldFilter("fecha_vencimiento", ">=", vence_desde))
+        if vence_antes is not None:
+            query = query.where(filter=gcfs.FieldFilter("fecha_vencimiento", "<", vence_antes))
+        membresias = []
+        for m in query.order_by("fecha_vencimiento").stream():
+            data = m.to_dict()
+            data["id"] = data["membresia_id"]
+            membresias.append(data)
+        return membresias
+
+    def crear_membresia(self, doc: Membresia, nombre_cliente) -> str:
+        """Crea una membresía y actualiza la proyección del cliente y los resúmenes en la misma escritura."""
+        doc = _con_marcas_de_tiempo(doc)
+        membresia_ref = self.db.collection("membresias").document()
+        batch = self.db.batch()
+        batch.set(membresia_ref, doc)
+        batch.set(
+            self.db.collection(COLECCION_ULTIMA_MEMBRESIA).document(doc["dni_cliente"]),
+            proyeccion_membresia(membresia_ref.id, doc, nombre_cliente),
+        )
+        escribir_aporte(batch, self.db, "membresias", doc)
+        batch.commit()
+        return membresia_ref.id
+
+    def cambiar_estado_membresia(self, membresia_id, dni_cliente, activa):
+        """Activa o desactiva una membresía y, si es la última del cliente, también su proyección."""
+        self.cambiar_estado_membresias([(membresia_id, dni_cliente)], activa)
+
+    def eliminar_membresia(self, membresia_id, dni_cliente) -> Optional[Membresia]:
+        """Elimina una membresía, resta su aporte a los resúmenes y recalcula la proyección del cliente."""
+        eliminada = self._eliminar_con_resumen("membresias", membresia_id)
+        self.recalcular_ultima_membresia(dni_cliente)
+        return eliminada
+
+    def cambiar_estado_membresias(self, membresias, activa):
+        """
+        Activa o desactiva varias membresías [(membresia_id, dni_cliente)] en transacciones por
+        lotes, junto con las proyecciones de los clientes de las que son la última. Las proyecciones
+        se leen dentro de la transacción: si un alta cambia la de un cliente mientras tanto, la
+        transacción se reintenta en lugar de pisarla con la membresía anterior.
+        """
+        for inicio in range(0, len(membresias), TAMANO_LOTE_MEMBRESIAS):
+            parte = membresias[inicio:inicio + TAMANO_LOTE_MEMBRESIAS]
+
+            def cambiar(transaction):
+                proyecciones = self._leer_varios(
+                    COLECCION_ULTIMA_MEMBRESIA, [dni for _, dni in parte], transaction=transaction
+                )
+                for membresia_id, dni_cliente in parte:
+                    transaction.update(self.db.collection("membresias").document(membresia_id), {"activa": activa})
+                    if proyecciones.get(dni_cliente, {}).get("membresia_id") == membresia_id:
+                        transaction.update(
+                            self.db.collection(COLECCION_ULTIMA_MEMBRESIA).document(dni_cliente), {"activa": activa}
+                        )
+
+            self._en_transaccion(cambiar)
+
+    def eliminar_membresias(self, membresias) -> Tuple[List[Membresia], Dict[str, Optional[UltimaMembresia]]]:
+        """
+        Elimina varias membresías [(membresia_id, dni_cliente)]: en cada escritura borra un lote,
+        resta sus aportes a los resúmenes (un incremento por período) y recalcula la proyección
+        de los clientes afectados. Retorna (membresías eliminadas con su id, {dni: nueva proyección o None}).
+        """
+        eliminadas = []
+        nuevas_proyecciones = {}
+        for inicio in range(0, len(membresias), TAMANO_LOTE_MEMBRESIAS):
+            parte = membresias[inicio:inicio + TAMANO_LOTE_MEMBRESIAS]
+            ids = {membresia_id for membresia_id, _ in parte}
+            dnis = list(dict.fromkeys(dni for _, dni in parte))
+            # Lo que queda de cada cliente sin las membresías a eliminar, leído antes de la transacción
+            restantes = {}
+            for m in self._membresias_de_clientes(dnis):
+                if m["id"] not in ids:
+                    restantes.setdefault(m["dni_cliente"], []).append(m)
+            proyecciones = self._leer_varios(COLECCION_ULTIMA_MEMBRESIA, dnis)
+            sin_proyeccion = [dni for dni in dnis if dni in restantes and dni not in proyecciones]
+            nombres, _ = self.obtener_nombres_clientes(sin_proyeccion)
+
+            def eliminar(transaction):
+                existentes = self._leer_varios("membresias", ids, transaction=transaction)
+                for membresia_id in existentes:
+                    transaction.delete(self.db.collection("membresias").document(membresia_id))
+                escribir_aportes(transaction, self.db, "membresias", existentes.values(), signo=-1)
+                cambios = {}
+                for dni in dnis:
+                    proyeccion_ref = self.db.collection(COLECCION_ULTIMA_MEMBRESIA).document(dni)
+                    if dni not in restantes:
+                        transaction.delete(proyeccion_ref)
+                        cambios[dni] = None
+                        continue
+                    ultima = max(restantes[dni], key=get_sort_key_membresia)
+                    nombre = proyecciones.get(dni, {}).get("nombre_cliente") or nombres.get(dni, "Cliente no encontrado")
+                    cambios[dni] = proyeccion_membresia(ultima["id"], ultima, nombre)
+                    transaction.set(proyeccion_ref, cambios[dni])
+                return [dict(data, id=membresia_id) for membresia_id, data in existentes.items()], cambios
+
+            eliminadas_parte, cambios = self._en_transaccion(eliminar)
+            eliminadas += eliminadas_parte
+            nuevas_proyecciones.update(cambios)
+        return eliminadas, nuevas_proyecciones
+
+    def recalcular_ultima_membresia(self, dni_cliente, nombre_cliente=None) -> Optional[UltimaMembresia]:
+        """Vuelve a calcular la proyección de un cliente a partir de sus membresías."""
+        proyeccion_ref = self.db.collection(COLECCION_ULTIMA_MEMBRESIA).document(dni_cliente)
+        query = self.db.collection("membresias").where(filter=gcfs.FieldFilter("dni_cliente", "==", dni_cliente))
+        membresias_list = [_con_id(m) for m in query.stream()]
+
+        if not membresias_list:
+            proyeccion_ref.delete()
+            return None
+
+        ultima = max(membresias_list, key=get_sort_key_membresia)
+        if nombre_cliente is None:
+            nombres, _ = self.obtener_nombres_clientes([dni_cliente])
+            nombre_cliente = nombres.get(dni_cliente, "Cliente no encontrado")
+        proyeccion = proyeccion_membresia(ultima["id"], ultima, nombre_cliente)
+        proyeccion_ref.set(proyeccion)
+        return proyeccion
+
+    def reconstruir_ultima_membresia(self) -> int:
+        """
+        Reconstruye toda la proyección desde la colección de membresías.
+        Pensado para ejecutarse una vez sobre los datos existentes o ante inconsistencias.
+        Retorna la cantidad de clientes proyectados.
+        """
+        ultimas = {}
+        for m in self.db.collection("membresias").stream():
+            data = _con_id(m)
+            dni_cliente = data.get("dni_cliente")
+            if not dni_cliente:
+                continue
+            if dni_cliente not in ultimas or get_sort_key_membresia(data) > get_sort_key_membresia(ultimas[dni_cliente]):
+                ultimas[dni_cliente] = data
+
+        nombres, _ = self.obtener_nombres_clientes(ultimas.keys())
+        coleccion = self.db.collection(COLECCION_ULTIMA_MEMBRESIA)
+        operaciones = [
+            (coleccion.document(dni), proyeccion_membresia(data["id"], data, nombres.get(dni, "Cliente no encontrado")))
+            for dni, data in ultimas.items()
+        ]
+        # Proyecciones de clientes que ya no tienen membresías
+        operaciones += [(p.reference, None) for p in coleccion.stream() if p.id not in ultimas]
+        self._escribir_en_lotes(operaciones)
+        return len(ultimas)
+
+    # --- Resúmenes ---
+
+    def obtener_resumenes_mes(self, year, month) -> Tuple[Optional[dict], List[dict]]:
+        """
+        Resumen mensual (None si el mes nunca se resumió) y resúmenes diarios del mes,
+        ordenados por fecha. Son como máximo 32 lecturas sin importar el volumen del mes.
+        """
+        mes_doc = self.db.collection(COLECCION_RESUMENES_MENSUALES).document(f"{year:04d}-{month:02d}").get()
+        desde, hasta = limites_mes(year, month)
+        query = self._rango(COLECCION_RESUMENES_DIARIOS, "fecha", desde, hasta).order_by("fecha")
+        dias = [d.to_dict() for d in query.stream()]
+        return (mes_doc.to_dict() if mes_doc.exists else None), dias
+
+    def totales_entre(self, coleccion, desde, hasta) -> Dict[str, int]:
+        """
+        Cantidad de documentos de la colección en el rango de fechas y suma de sus montos
+        ({"cantidad", "centavos"}), con una consulta de agregación: no descarga los documentos.
+        """
+        agregacion = (
+            self._rango(coleccion, CAMPO_FECHA[coleccion], desde, hasta)
+            .count(alias="cantidad")
+            .sum(CAMPO_MONTO[coleccion], alias="centavos")
+        )
+        return totales_agregacion(agregacion.get())
+
+    def calcular_resumenes_mes(self, year, month) -> Tuple[dict, dict]:
+        """Resúmenes diarios y mensual de un mes calculados desde los documentos originales."""
+        desde, hasta = limites_mes(year, month)
+        return calcular_resumenes(
+            self.ingresos_entre(desde, hasta),
+            self.gastos_entre(desde, hasta),
+            self.membresias_entre(desde, hasta),
+        )
+
+    def reconciliar_resumenes(self, year, month, corregir=False) -> Dict[str, list]:
+        """
+        Compara los resúmenes guardados de un mes con los datos originales.
+        Retorna {periodo: [(campo, esperado, guardado), ...]} con los que no coinciden y,
+        si corregir=True, reescribe los resúmenes del mes con los valores esperados.
+        """
+        periodo_mes = f"{year:04d}-{month:02d}"
+        diarios, mensuales = self.calcular_resumenes_mes(year, month)
+        mes_actual, dias_actuales = self.obtener_resumenes_mes(year, month)
+        actuales = {d["periodo"]: d for d in dias_actuales}
+
+        problemas = {}
+        for periodo, esperado, actual in [(periodo_mes, mensuales.get(periodo_mes), mes_actual)] + [
+            (dia, diarios.get(dia), actuales.get(dia)) for dia in sorted(set(diarios) | set(actuales))
+        ]:
+            diferencias_periodo = diferencias(esperado, actual)
+            if diferencias_periodo:
+                problemas[periodo] = diferencias_periodo
+
+        if corregir and problemas:
+            def con_fecha_de_calculo(resumen):
+                return dict(resumen, updated_at=SERVER_TIMESTAMP) if resumen else None
+
+            operaciones = [(
+                self.db.collection(COLECCION_RESUMENES_MENSUALES).document(periodo_mes),
+                con_fecha_de_calculo(mensuales.get(periodo_mes)),
+            )]
+            operaciones += [
+                (self.db.collection(COLECCION_RESUMENES_DIARIOS).document(dia), con_fecha_de_calculo(diarios.get(dia)))
+                for dia in set(diarios) | set(actuales)
+            ]
+            self._escribir_en_lotes(operaciones)
+        return problemas
+
+    # --- Configuración ---
+
+    def documento_precios_membresias(self):
+        # ID fijo para facilitar la consulta
+        return self.db.collection("configuracion").document("precios_membresias")
+
+    def obtener_precios_membresias(self) -> Optional[PreciosMembresias]:
+        precios_doc = self.documento_precios_membresias().get()
+        return precios_doc.to_dict() if precios_doc.exists else None
+
+    def guardar_precios_membresias(self, precios: PreciosMembresias):
+        precios = dict(precios, updated_at=SERVER_TIMESTAMP)
+        self.documento_precios_membresias().set(precios)
@@ -0,0 +1,206 @@
+"""
+Resúmenes (rollups) diarios y mensuales para el Dashboard.
+
+Cada ingreso, gasto o membresía suma su aporte a dos documentos: el del día
+(colección "resumenes_diarios", ID "AAAA-MM-DD") y el del mes ("resumenes_mensuales",
+ID "AAAA-MM"). Cada documento guarda, en centavos y cantidades:
+
+    {
+        "periodo": "2024-05-12",
+        "fecha": datetime(2024, 5, 12),
+        "ingresos": {"centavos", "cantidad", "por_metodo_pago", "por_operador", "por_producto"},
+        "gastos": {"centavos", "cantidad", "por_metodo_pago", "por_concepto"},
+        "membresias": {"centavos", "cantidad", "por_metodo_pago", "por_tipo"},
+    }
+
+donde cada "por_*" es un mapa {valor: {"centavos", "cantidad"}}. Las escrituras usan
+Increment con set(merge=True), así que altas y bajas se aplican sin leer el resumen.
+"""
+from datetime import datetime
+
+from google.cloud import firestore as gcfs
+
+COLECCION_RESUMENES_DIARIOS = "resumenes_diarios"
+COLECCION_RESUMENES_MENSUALES = "resumenes_mensuales"
+
+# Campo de fecha que determina el día de cada documento
+CAMPO_FECHA = {"ingresos": "fecha", "gastos": "fecha", "membresias": "fecha_alta"}
+# Campo con el monto (en centavos) que suma cada documento
+CAMPO_MONTO = {"ingresos": "monto_total_centavos", "gastos": "monto_centavos", "membresias": "precio_centavos"}
+SIN_ESPECIFICAR = "Sin especificar"
+
+
+def _clave_mapa(valor):
+    # Firestore no admite nombres de campo vacíos
+    valor = str(valor).strip() if valor is not None else ""
+    return valor or SIN_ESPECIFICAR
+
+
+def _desglose(valor, centavos, signo):
+    return {_clave_mapa(valor): {"centavos": signo * centavos, "cantidad": signo}}
+
+
+def aporte(coleccion, doc, signo=1):
+    """
+    Aporte de un documento al resumen, como mapa anidado de números.
+    signo=1 para altas y signo=-1 para bajas.
+    """
+    if coleccion == "ingresos":
+        centavos = doc.get(CAMPO_MONTO["ingresos"], 0)
+        productos = {}
+        for item in doc.get("items") or []:
+            nombre = _clave_mapa(item.get("nombre"))
+            productos.setdefault(nombre, {"centavos": 0, "cantidad": 0})
+            productos[nombre]["centavos"] += signo * item.get("precio_centavos", 0)
+            productos[nombre]["cantidad"] += signo
+        return {"ingresos": {
+            "centavos": signo * centavos,
+            "cantidad": signo,
+            "por_metodo_pago": _desglose(doc.get("metodo_pago"), centavos, signo),
+            "por_operador": _desglose(doc.get("operador"), centavos, signo),
+            "por_producto": productos,
+        }}
+    if coleccion == "gastos":
+        centavos = doc.get(CAMPO_MONTO["gastos"], 0)
+        return {"gastos": {
+            "centavos": signo * centavos,
+            "cantidad": signo,
+            "por_metodo_pago": _desglose(doc.get("metodo_pago"), centavos, signo),
+            "por_concepto": _desglose(doc.get("concepto"), centavos, signo),
+        }}
+    if coleccion == "membresias":
+        centavos = doc.get(CAMPO_MONTO["membresias"], 0)
+        return {"membresias": {
+            "centavos": signo * centavos,
+            "cantidad": signo,
+            # Registros antiguos sin método de pago se consideran en efectivo
+            "por_metodo_pago": _desglose(doc.get("metodo_pago") or "efectivo", centavos, signo),
+            "por_tipo": _desglose(doc.get("tipo_membresia"), centavos, signo),
+        }}
+    raise ValueError(f"Colección sin resumen: {coleccion}")
+
+
+def periodos(fecha):
+    """IDs del resumen diario y mensual que corresponden a una fecha."""
+    return fecha.strftime("%Y-%m-%d"), fecha.strftime("%Y-%m")
+
+
+def inicio_periodo(periodo):
+    formato = "%Y-%m-%d" if len(periodo) == 10 else "%Y-%m"
+    return datetime.strptime(periodo, formato)
+
+
+def _como_incrementos(aporte_doc):
+    # Un mapa vacío con merge=True reemplazaría al existente, así que se omite
+    return {
+        k: _como_incrementos(v) if isinstance(v, dict) else gcfs.Increment(v)
+        for k, v in aporte_doc.items()
+        if not (isinstance(v, dict) and not v)
+    }
+
+
+def escribir_aporte(escritor, db, coleccion, doc, signo=1):
+    """
+    Agrega al lote o transacción `escritor` los incrementos del documento sobre sus
+    resúmenes diario y mensual.
+    """
+    dia, mes = periodos(doc[CAMPO_FECHA[coleccion]])
+    incrementos = _como_incrementos(aporte(coleccion, doc, signo))
+    for coleccion_resumen, periodo in ((COLECCION_RESUMENES_DIARIOS, dia), (COLECCION_RESUMENES_MENSUALES, mes)):
+        escritor.set(
+            db.collection(coleccion_resumen).document(periodo),
+            dict(incrementos, periodo=periodo, fecha=inicio_periodo(periodo), updated_at=gcfs.SERVER_TIMESTAMP),
+            merge=True,
+        )
+
+
+def escribir_aportes(escritor, db, coleccion, docs, signo=1):
+    """
+    Como escribir_aporte para varios documentos: suma los aportes por período y escribe un
+    solo incremento por resumen, en lugar de uno por documento.
+    """
+    por_periodo = {}
+    for doc in docs:
+        aporte_doc = aporte(coleccion, doc, signo)
+        for periodo in periodos(doc[CAMPO_FECHA[coleccion]]):
+            sumar(por_periodo.setdefault(periodo, {}), aporte_doc)
+    for periodo, aporte_periodo in por_periodo.items():
+        coleccion_resumen = COLECCION_RESUMENES_DIARIOS if len(periodo) == 10 else COLECCION_RESUMENES_MENSUALES
+        escritor.set(
+            db.collection(coleccion_resumen).document(periodo),
+            dict(_como_incrementos(aporte_periodo), periodo=periodo, fecha=inicio_periodo(periodo), updated_at=gcfs.SERVER_TIMESTAMP),
+            merge=True,
+        )
+    return len(por_periodo)
+
+
+def sumar(destino, aporte_doc):
+    """Suma un aporte sobre un resumen en memoria."""
+    for clave, valor in aporte_doc.items():
+        if isinstance(valor, dict):
+            sumar(destino.setdefault(clave, {}), valor)
+        else:
+            destino[clave] = destino.get(clave, 0) + valor
+    return destino
+
+
+def calcular_resumenes(ingresos=(), gastos=(), membresias=()):
+    """
+    Calcula desde los documentos originales los resúmenes diarios y mensuales.
+    Retorna ({periodo_dia: resumen}, {periodo_mes: resumen}).
+    """
+    diarios, mensuales = {}, {}
+    for coleccion, docs in (("ingresos", ingresos), ("gastos", gastos), ("membresias", membresias)):
+        for doc in docs:
+            fecha = doc.get(CAMPO_FECHA[coleccion])
+            if not fecha:
+                continue
+            dia, mes = periodos(fecha)
+            aporte_doc = aporte(coleccion, doc)
+            sumar(diarios.setdefault(dia, {"periodo": dia, "fecha": inicio_periodo(dia)}), aporte_doc)
+            sumar(mensuales.setdefault(mes, {"periodo": mes, "fecha": inicio_periodo(mes)}), aporte_doc)
+    return diarios, mensuales
+
+
+def _sin_ceros(valor):
+    """Quita los desgloses que quedaron en cero tras las bajas, para poder comparar."""
+    if not isinstance(valor, dict):
+        return valor
+    limpio = {k: _sin_ceros(v) for k, v in valor.items() if k not in ("periodo", "fecha", "updated_at")}
+    return {
+        k: v for k, v in limpio.items()
+        if not (isinstance(v, dict) and (not v or v.get("cantidad") == 0 and v.get("centavos", 0) == 0))
+    }
+
+
+def diferencias(esperado, actual, ruta=""):
+    """Lista de (ruta, esperado, actual) donde dos resúmenes no coinciden."""
+    esperado, actual = _sin_ceros(esperado or {}), _sin_ceros(actual or {})
+    resultado = []
+    for clave in sorted(set(esperado) | set(actual)):
+        e, a = esperado.get(clave), actual.get(clave)
+        sub_ruta = f"{ruta}.{clave}" if ruta else clave
+        if isinstance(e, dict) or isinstance(a, dict):
+            resultado += diferencias(e, a, sub_ruta)
+        elif (e or 0) != (a or 0):
+            resultado.append((sub_ruta, e or 0, a or 0))
+    return resultado
+
+
+def vacio():
+    """Resumen sin movimientos."""
+    return {
+        "ingresos": {"centavos": 0, "cantidad": 0, "por_metodo_pago": {}, "por_operador": {}, "por_producto": {}},
+        "gastos": {"centavos": 0, "cantidad": 0, "por_metodo_pago": {}, "por_concepto": {}},
+        "membresias": {"centavos": 0, "cantidad": 0, "por_metodo_pago": {}, "por_tipo": {}},
+    }
+
+
+def completar(resumen):
+    """Completa un resumen leído con las secciones que falten."""
+    resumen = resumen or {}
+    completo = sumar(vacio(), _sin_ceros(resumen))
+    for clave in ("periodo", "fecha"):
+        if clave in resumen:
+            completo[clave] = resumen[clave]
+    return completo
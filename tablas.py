@@ -0,0 +1,199 @@
+"""
+Conversión de documentos de Firestore a DataFrames con tipos definidos por un esquema.
+
+En lugar de juntar los documentos en una lista de dicts y dejar que pandas infiera los
+tipos, cada documento se vuelca a medida que llega en columnas tipadas:
+
+- Centavos: enteros de 64 bits (0 si falta el campo).
+- Fecha: datetime64[ns, UTC] (NaT si falta; las fechas sin zona se toman como UTC).
+- Categoria: códigos enteros más la lista de valores distintos (métodos de pago, operadores...).
+- Booleano y Texto.
+
+Los items de cada ingreso se aplanan durante la misma pasada en un DataFrame aparte, con una
+fila por item y el id y la fecha del ingreso, en lugar de quedar como listas de dicts.
+"""
+import array
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAT = np.iinfo(np.int64).min
+
+
+class Texto:
+    def __init__(self):
+        self.valores = []
+
+    def agregar(self, valor):
+        self.valores.append(valor)
+
+    def serie(self):
+        # El tipo de texto lo elige pandas (str desde pandas 3), igual que al leer de Parquet
+        return pd.Series(self.valores) if self.valores else pd.Series([], dtype=object)
+
+
+class Categoria:
+    def __init__(self):
+        self.codigos = array.array("i")
+        self.categorias = {}
+
+    def agregar(self, valor):
+        if valor is None:
+            self.codigos.append(-1)
+        else:
+            self.codigos.append(self.categorias.setdefault(valor, len(self.categorias)))
+
+    def serie(self):
+        codigos = np.frombuffer(self.codigos, dtype=np.int32) if self.codigos else np.empty(0, dtype=np.int32)
+        return pd.Series(pd.Categorical.from_codes(codigos, categories=list(self.categorias)))
+
+
+class Centavos:
+    def __init__(self):
+        self.valores = array.array("q")
+
+    def agregar(self, valor):
+        self.valores.append(int(valor or 0))
+
+    def serie(self):
+        return pd.Series(np.frombuffer(self.valores, dtype=np.int64) if self.valores else np.empty(0, dtype=np.int64))
+
+
+class Fecha:
+    def __init__(self):
+        self.valores = array.array("q")
+
+    def agregar(self, valor):
+        if not isinstance(valor, datetime):
+            self.valores.append(_NAT)
+            return
+        if valor.tzinfo is None:
+            valor = valor.replace(tzinfo=timezone.utc)
+        # Aritmética entera: sin pasar por float para no perder microsegundos
+        diferencia = valor - _EPOCA
+        self.valores.append(((diferencia.days * 86400 + diferencia.seconds) * 10**6 + diferencia.microseconds) * 1000)
+
+    def serie(self):
+        nanosegundos = np.frombuffer(self.valores, dtype=np.int64) if self.valores else np.empty(0, dtype=np.int64)
+        return pd.Series(nanosegundos.view("datetime64[ns]")).dt.tz_localize("UTC")
+
+
+class Booleano:
+    def __init__(self):
+        self.valores = array.array("B")
+
+    def agregar(self, valor):
+        self.valores.append(bool(valor))
+
+    def serie(self):
+        return pd.Series(np.frombuffer(self.valores, dtype=np.bool_) if self.valores else np.empty(0, dtype=np.bool_))
+
+
+ESQUEMA_INGRESOS = {
+    "id": Texto,
+    "fecha": Fecha,
+    "cliente": Texto,
+    "cliente_dni": Texto,
+    "operador": Categoria,
+    "metodo_pago": Categoria,
+    "consumicion": Texto,
+    "monto_total_centavos": Centavos,
+}
+# Una fila por item de ingreso; "ingreso_id" y "fecha" vienen del ingreso
+ESQUEMA_ITEMS = {
+    "ingreso_id": Texto,
+    "fecha": Fecha,
+    "producto_id": Categoria,
+    "nombre": Categoria,
+    "precio_centavos": Centavos,
+}
+ESQUEMA_GASTOS = {
+    "id": Texto,
+    "fecha": Fecha,
+    "concepto": Categoria,
+    "proveedor": Texto,
+    "descripcion": Texto,
+    "metodo_pago": Categoria,
+    "monto_centavos": Centavos,
+}
+ESQUEMA_MEMBRESIAS = {
+    "id": Texto,
+    "dni_cliente": Texto,
+    "tipo_membresia": Categoria,
+    "fecha_alta": Fecha,
+    "fecha_vencimiento": Fecha,
+    "precio_centavos": Centavos,
+    "metodo_pago": Categoria,
+    "notas": Texto,
+    "activa": Booleano,
+}
+
+
+def proyectar_esquema(esquema, campos):
+    """El esquema con solo los campos indicados, en su orden."""
+    return {campo: tipo for campo, tipo in esquema.items() if campo in campos}
+
+
+class Tabla:
+    """Columnas tipadas según un esquema {campo: tipo}, que se completan documento a documento."""
+
+    def __init__(self, esquema):
+        self.columnas = {campo: tipo() for campo, tipo in esquema.items()}
+
+    def agregar(self, doc):
+        for campo, columna in self.columnas.items():
+            columna.agregar(doc.get(campo))
+
+    def frame(self):
+        return pd.DataFrame({campo: columna.serie() for campo, columna in self.columnas.items()})
+
+
+def frame_documentos(documentos, esquema):
+    """DataFrame con las columnas del esquema a partir de un iterable de documentos (dicts)."""
+    tabla = Tabla(esquema)
+    for doc in documentos:
+        tabla.agregar(doc)
+    return tabla.frame()
+
+
+class TablaIngresos:
+    """Ingresos y sus items aplanados, que se completan documento a documento."""
+
+    def __init__(self, esquema_ingresos=ESQUEMA_INGRESOS, esquema_items=ESQUEMA_ITEMS):
+        self.ingresos = Tabla(esquema_ingresos)
+        self.items = Tabla(esquema_items)
+
+    def agregar(self, doc):
+        self.ingresos.agregar(doc)
+        for item in doc.get("items") or []:
+            self.items.agregar(dict(item, ingreso_id=doc.get("id"), fecha=doc.get("fecha")))
+
+    def frames(self):
+        """(ingresos, items)"""
+        return self.ingresos.frame(), self.items.frame()
+
+
+def frames_ingresos(documentos, esquema_ingresos=ESQUEMA_INGRESOS, esquema_items=ESQUEMA_ITEMS):
+    """Retorna (ingresos, items) a partir de un iterable de ingresos, recorriéndolo una sola vez."""
+    tabla = TablaIngresos(esquema_ingresos, esquema_items)
+    for doc in documentos:
+        tabla.agregar(doc)
+    return tabla.frames()
+
+
+def concatenar(frames):
+    """Concatena DataFrames del mismo esquema conservando las columnas categóricas."""
+    frames = list(frames)
+    no_vacios = [df for df in frames if not df.empty] or frames[:1]
+    if not no_vacios:
+        return pd.DataFrame()
+    if len(no_vacios) == 1:
+        return no_vacios[0].reset_index(drop=True)
+    df = pd.concat(no_vacios, ignore_index=True)
+    # Con categorías distintas en cada parte, concat deja la columna como object
+    for campo, tipo in no_vacios[0].dtypes.items():
+        if isinstance(tipo, pd.CategoricalDtype) and not isinstance(df[campo].dtype, pd.CategoricalDtype):
+            df[campo] = df[campo].astype("category")
+    return df
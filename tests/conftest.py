@@ -0,0 +1,20 @@
+"""
+Fixtures compartidas: los tests corren contra el backend en memoria (backend_local.MemoriaClient),
+sin credenciales de Firebase. Ejecutar desde la raíz del repositorio con `python -m pytest -q`.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("BENJAS_BACKEND", "memoria")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend_local import MemoriaClient  # noqa: E402
+from repositorio import Repositorio  # noqa: E402
+
+
+@pytest.fixture
+def repo():
+    """Repositorio sobre una base en memoria vacía."""
+    return Repositorio(MemoriaClient())
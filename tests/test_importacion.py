@@ -0,0 +1,130 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+import importacion
+from cache_disco import CacheParquet
+
+ENCABEZADOS_GASTOS = "fecha,concepto,proveedor,descripcion,metodo_pago,monto\n"
+
+
+@pytest.fixture
+def importar(repo, tmp_path, monkeypatch):
+    """Corre la línea de comandos de importación sobre el repositorio en memoria."""
+    monkeypatch.setattr(importacion, "obtener_repositorio", lambda: repo)
+    monkeypatch.setattr(importacion, "CacheParquet", lambda: CacheParquet(str(tmp_path / "cache")))
+    # Lotes chicos para que los archivos de prueba se escriban en varios lotes
+    monkeypatch.setattr(importacion, "TAMANO_LOTE_ESCRITURA", 3)
+
+    def correr(coleccion, ruta, *opciones):
+        monkeypatch.setattr(sys, "argv", ["importacion.py", coleccion, str(ruta), "--paralelos", "1", *opciones])
+        importacion.main()
+
+    return correr
+
+
+def _archivo_gastos(tmp_path, cantidad):
+    ruta = tmp_path / "gastos.csv"
+    filas = "".join(f"2024-03-{1 + i % 28:02d},insumos,Proveedor {i},,efectivo,{100 + i}\n" for i in range(cantidad))
+    ruta.write_text(ENCABEZADOS_GASTOS + filas, encoding="utf-8")
+    return ruta
+
+
+def _documentos(repo, coleccion):
+    return {snapshot.id: snapshot.to_dict() for snapshot in repo.db.collection(coleccion).stream()}
+
+
+def test_repetir_la_importacion_no_duplica(repo, importar, tmp_path):
+    ruta = _archivo_gastos(tmp_path, 10)
+    importar("gastos", ruta)
+    primeros = _documentos(repo, "gastos")
+    assert len(primeros) == 10
+
+    # Sin el punto de control se vuelve a escribir todo, con los mismos IDs
+    os.remove(f"{ruta}.importacion.json")
+    importar("gastos", ruta)
+    assert set(_documentos(repo, "gastos")) == set(primeros)
+
+
+def test_ids_por_archivo_y_fila(repo):
+    convertidor = importacion.Convertidor("gastos", "huella", repo)
+    fila = {"fecha": "2024-03-01", "concepto": "insumos", "metodo_pago": "efectivo", "monto": "100"}
+    assert convertidor.documento(2, fila)[0] == convertidor.documento(2, fila)[0]
+    assert convertidor.documento(2, fila)[0] != convertidor.documento(3, fila)[0]
+    assert importacion.Convertidor("gastos", "otra", repo).documento(2, fila)[0] != convertidor.documento(2, fila)[0]
+
+
+def test_continua_desde_el_punto_de_control(repo, importar, tmp_path, monkeypatch):
+    ruta = _archivo_gastos(tmp_path, 10)
+    importar_lote = repo.importar_lote
+    llamadas = []
+
+    def fallar_en_el_segundo_lote(coleccion, documentos):
+        llamadas.append(len(documentos))
+        if len(llamadas) == 2:
+            raise RuntimeError("se cortó la conexión")
+        importar_lote(coleccion, documentos)
+
+    monkeypatch.setattr(repo, "importar_lote", fallar_en_el_segundo_lote)
+    with pytest.raises(RuntimeError):
+        importar("gastos", ruta)
+    control = importacion.PuntoDeControl(f"{ruta}.importacion.json", "gastos", importacion.huella_archivo(ruta))
+    assert control.datos["filas_confirmadas"] == 4  # Encabezado en la fila 1 y un lote de 3 filas
+    assert not control.datos["completo"]
+
+    monkeypatch.setattr(repo, "importar_lote", importar_lote)
+    importar("gastos", ruta)
+    gastos = _documentos(repo, "gastos")
+    assert len(gastos) == 10
+    assert sorted(g["proveedor"] for g in gastos.values()) == sorted(f"Proveedor {i}" for i in range(10))
+
+    # Los resúmenes del mes se reconcilian al terminar
+    assert repo.reconciliar_resumenes(2024, 3) == {}
+
+
+def test_archivo_completo_no_se_vuelve_a_escribir(repo, importar, tmp_path, monkeypatch, capsys):
+    ruta = _archivo_gastos(tmp_path, 4)
+    importar("gastos", ruta)
+    monkeypatch.setattr(repo, "importar_lote", lambda *args: pytest.fail("no debería escribir"))
+    importar("gastos", ruta)
+    assert "ya fue importado" in capsys.readouterr().out
+
+
+def test_punto_de_control_de_otro_archivo(tmp_path):
+    ruta = str(tmp_path / "control.json")
+    importacion.PuntoDeControl(ruta, "gastos", "a").guardar(filas_confirmadas=5)
+    with pytest.raises(SystemExit):
+        importacion.PuntoDeControl(ruta, "gastos", "b")
+
+
+def test_clientes_existentes(repo, importar, tmp_path):
+    repo.crear_cliente({"dni": "111", "nombre": "Ana", "telefono": "", "email": "", "activo": True})
+    repo.crear_cliente({"dni": "222", "nombre": "Beto", "telefono": "", "email": "", "activo": True})
+    ruta = tmp_path / "clientes.csv"
+    ruta.write_text("dni,nombre,telefono,email,activo\n111,Ana,,,si\n222,Otro Nombre,,,si\n333,Carla,,,si\n", encoding="utf-8")
+
+    # Un DNI existente con otros datos es una fila inválida: no se escribe nada
+    importar("clientes", ruta)
+    assert repo.obtener_cliente("333") is None
+
+    # Con --omitir-invalidas se importa el nuevo, el igual se omite y el distinto no se reemplaza
+    importar("clientes", ruta, "--omitir-invalidas")
+    assert repo.obtener_cliente("333")["nombre"] == "Carla"
+    assert repo.obtener_cliente("222")["nombre"] == "Beto"
+
+
+def test_ingresos_con_productos_del_catalogo(repo, importar, tmp_path):
+    repo.crear_producto({"nombre": "Corte Clásico", "tipo": "servicio", "precio_centavos": 60000, "categoria": "", "activo": True})
+    ruta = tmp_path / "ingresos.csv"
+    ruta.write_text(
+        "fecha,cliente,cliente_dni,operador,metodo_pago,monto,productos,consumicion\n"
+        "01/03/2024 10:30,Ana,,A,qr,,corte clasico,\n",
+        encoding="utf-8",
+    )
+    importar("ingresos", ruta)
+    (ingreso,) = _documentos(repo, "ingresos").values()
+    assert ingreso["fecha"] == datetime(2024, 3, 1, 10, 30, tzinfo=timezone.utc)
+    assert ingreso["monto_total_centavos"] == 60000
+    assert ingreso["items"][0]["nombre"] == "Corte Clásico"
@@ -0,0 +1,79 @@
+import pytest
+
+from indice_clientes import IndiceClientes
+
+
+def _cliente(dni, nombre, telefono="", activo=True):
+    return {"dni": dni, "nombre": nombre, "telefono": telefono, "email": "", "activo": activo}
+
+
+@pytest.fixture
+def indice(repo):
+    for cliente in (
+        _cliente("30111222", "José Pérez", "11 4444-5555"),
+        _cliente("30111333", "Josefina Paz"),
+        _cliente("27000111", "Jorge Perales", "351 222-3333"),
+        _cliente("40999888", "Ana Jos"),
+        _cliente("41000000", "Pedro Inactivo", activo=False),
+    ):
+        repo.crear_cliente(cliente)
+    return IndiceClientes(repo.listar_clientes_activos, ttl=600)
+
+
+def _dnis(resultados):
+    return [c["dni"] for c in resultados]
+
+
+def test_prefijo_no_incluye_claves_fuera_del_rango(indice):
+    # "jos" abarca jose, josefina y jos, pero no jorge (anterior) ni otras palabras posteriores
+    assert set(_dnis(indice.buscar("jos"))) == {"30111222", "30111333", "40999888"}
+    assert _dnis(indice.buscar("jose")) == ["30111222", "30111333"]
+    assert _dnis(indice.buscar("josefinas")) == []
+
+
+def test_coincidencia_exacta_primero(indice):
+    # "jos" es la palabra completa de Ana Jos: va antes que los prefijos aunque su nombre ordene después
+    assert _dnis(indice.buscar("jos"))[0] == "40999888"
+
+
+def test_sin_acentos_ni_mayusculas(indice):
+    assert _dnis(indice.buscar("PÉREZ")) == ["30111222"]
+    assert _dnis(indice.buscar("  jose   perez ")) == ["30111222"]
+
+
+def test_todas_las_palabras_deben_coincidir(indice):
+    assert _dnis(indice.buscar("jo pa")) == ["30111333"]
+    assert _dnis(indice.buscar("jorge paz")) == []
+
+
+def test_digitos_buscan_dni_y_telefono(indice):
+    assert set(_dnis(indice.buscar("30111"))) == {"30111222", "30111333"}
+    assert _dnis(indice.buscar("30111222")) == ["30111222"]
+    assert _dnis(indice.buscar("3512")) == ["27000111"]
+    # El prefijo de DNI no alcanza a los DNIs siguientes en orden
+    assert _dnis(indice.buscar("301113")) == ["30111333"]
+
+
+def test_solo_clientes_activos(indice):
+    assert _dnis(indice.buscar("pedro")) == []
+    assert indice.cantidad() == 4
+
+
+def test_sin_texto_retorna_los_primeros_por_nombre(indice):
+    assert _dnis(indice.buscar("", limite=2)) == ["40999888", "27000111"]
+
+
+def test_limite(indice):
+    assert len(indice.buscar("j", limite=2)) == 2
+
+
+def test_actualizar_y_quitar_sin_recargar(indice):
+    indice.buscar("")  # Carga el índice
+    indice.actualizar(_cliente("50000000", "Josué Nuevo"))
+    assert "50000000" in _dnis(indice.buscar("josu"))
+    indice.actualizar(_cliente("30111222", "José Pérez", activo=False))
+    assert _dnis(indice.buscar("perez")) == []
+    indice.quitar("30111333")
+    assert _dnis(indice.buscar("paz")) == []
+    # Las claves quitadas no dejan restos que rompan los rangos de búsqueda
+    assert set(_dnis(indice.buscar("jos"))) == {"40999888", "50000000"}
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from datos_sinteticos import generar
+from motor_async import MotorAsync
+from repositorio import limites_mes
+from resumenes import CAMPO_FECHA
+
+COLECCIONES = ("ingresos", "gastos", "membresias")
+
+
+@pytest.fixture
+def repo_con_datos(repo):
+    generar(repo.db, 3000, meses=3)
+    return repo
+
+
+@pytest.fixture
+def motor(repo_con_datos):
+    # Sin cliente asíncrono: las consultas corren sobre el repositorio en hilos
+    return MotorAsync(repo_con_datos, crear_cliente_async=lambda: None, max_concurrentes=2)
+
+
+def _meses(cantidad):
+    hoy = date.today().replace(day=1)
+    meses = []
+    for _ in range(cantidad):
+        meses.append((hoy.year, hoy.month))
+        hoy = (hoy - timedelta(days=1)).replace(day=1)
+    return meses
+
+
+def _totales_resumen(resumen, coleccion):
+    seccion = (resumen or {}).get(coleccion, {})
+    return {"centavos": seccion.get("centavos", 0), "cantidad": seccion.get("cantidad", 0)}
+
+
+def test_totales_del_mes_igual_a_los_resumenes(repo_con_datos, motor):
+    for year, month in _meses(3):
+        desde, hasta = limites_mes(year, month)
+        _, mensuales = repo_con_datos.calcular_resumenes_mes(year, month)
+        calculado = mensuales.get(f"{year:04d}-{month:02d}")
+        guardado, _ = repo_con_datos.obtener_resumenes_mes(year, month)
+        for coleccion in COLECCIONES:
+            esperado = _totales_resumen(calculado, coleccion)
+            assert _totales_resumen(guardado, coleccion) == esperado
+            assert repo_con_datos.totales_entre(coleccion, desde, hasta) == esperado
+            assert motor.ejecutar(motor.totales_entre(coleccion, desde, hasta)) == esperado
+
+
+def test_totales_de_un_rango_parcial_igual_a_los_resumenes_diarios(repo_con_datos, motor):
+    year, month = _meses(2)[1]
+    diarios, _ = repo_con_datos.calcular_resumenes_mes(year, month)
+    desde, hasta = datetime(year, month, 5), datetime(year, month, 20, 23, 59, 59)
+    dias = [r for periodo, r in diarios.items() if f"{year:04d}-{month:02d}-05" <= periodo <= f"{year:04d}-{month:02d}-20"]
+
+    async def todas():
+        return await asyncio.gather(*(motor.totales_entre(c, desde, hasta) for c in COLECCIONES))
+
+    for coleccion, totales in zip(COLECCIONES, motor.ejecutar(todas())):
+        esperado = {
+            "centavos": sum(_totales_resumen(r, coleccion)["centavos"] for r in dias),
+            "cantidad": sum(_totales_resumen(r, coleccion)["cantidad"] for r in dias),
+        }
+        assert esperado["cantidad"] > 0
+        assert totales == esperado
+
+
+def test_totales_sin_documentos(repo):
+    desde, hasta = limites_mes(2000, 1)
+    assert repo.totales_entre("gastos", desde, hasta) == {"centavos": 0, "cantidad": 0}
+
+
+def test_recorrer_entre_igual_a_la_consulta_del_repositorio(repo_con_datos, motor):
+    desde, hasta = limites_mes(*_meses(1)[0])
+    ids = []
+    cantidad = motor.ejecutar(motor.recorrer_entre("gastos", CAMPO_FECHA["gastos"], desde, hasta, lambda doc: ids.append(doc["id"])))
+    assert cantidad == len(ids)
+    assert sorted(ids) == sorted(g["id"] for g in repo_con_datos.gastos_entre(desde, hasta))
+
+
+def test_nombres_de_clientes_en_lotes(repo_con_datos, motor):
+    clientes = repo_con_datos.listar_clientes()
+    dnis = [c["dni"] for c in clientes] + ["no-existe", None]
+    nombres, lecturas = motor.ejecutar(motor.obtener_nombres_clientes(dnis))
+    assert nombres == {c["dni"]: c["nombre"] for c in clientes}
+    assert lecturas == len(clientes) + 1
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from resumenes import calcular_resumenes, diferencias, periodos
+
+INGRESOS = [
+    {"fecha": datetime(2024, 3, 1, 10), "operador": "A", "metodo_pago": "qr", "monto_total_centavos": 900,
+     "items": [{"nombre": "Corte", "precio_centavos": 600}, {"nombre": "Barba", "precio_centavos": 300}]},
+    {"fecha": datetime(2024, 3, 1, 18), "operador": "", "metodo_pago": "efectivo", "monto_total_centavos": 600,
+     "items": [{"nombre": "Corte", "precio_centavos": 600}]},
+    {"fecha": datetime(2024, 3, 2, 9), "operador": "B", "metodo_pago": "qr", "monto_total_centavos": 500, "items": []},
+]
+GASTOS = [{"fecha": datetime(2024, 3, 2, 12), "concepto": "insumos", "metodo_pago": "efectivo", "monto_centavos": 250}]
+MEMBRESIAS = [{"fecha_alta": datetime(2024, 3, 1, 11), "tipo_membresia": "Mensual", "metodo_pago": None, "precio_centavos": 5000}]
+
+
+def _ingreso(fecha, centavos, metodo_pago="efectivo"):
+    return {"fecha": fecha, "cliente": "Ana", "cliente_dni": None, "operador": "A", "metodo_pago": metodo_pago,
+            "consumicion": "", "items": [{"producto_id": "p1", "nombre": "Corte", "precio_centavos": centavos}],
+            "monto_total_centavos": centavos}
+
+
+def test_periodos():
+    assert periodos(datetime(2024, 3, 1, 23, 59)) == ("2024-03-01", "2024-03")
+
+
+def test_calcular_resumenes():
+    diarios, mensuales = calcular_resumenes(INGRESOS, GASTOS, MEMBRESIAS)
+    assert sorted(diarios) == ["2024-03-01", "2024-03-02"]
+    mes = mensuales["2024-03"]
+    assert mes["ingresos"]["centavos"] == 2000
+    assert mes["ingresos"]["cantidad"] == 3
+    assert mes["ingresos"]["por_metodo_pago"]["qr"] == {"centavos": 1400, "cantidad": 2}
+    assert mes["ingresos"]["por_operador"]["Sin especificar"] == {"centavos": 600, "cantidad": 1}
+    assert mes["ingresos"]["por_producto"]["Corte"] == {"centavos": 1200, "cantidad": 2}
+    assert mes["gastos"]["por_concepto"]["insumos"] == {"centavos": 250, "cantidad": 1}
+    # Las membresías sin método de pago se cuentan en efectivo
+    assert mes["membresias"]["por_metodo_pago"] == {"efectivo": {"centavos": 5000, "cantidad": 1}}
+    assert diarios["2024-03-01"]["ingresos"]["centavos"] == 1500
+    assert diarios["2024-03-02"]["gastos"]["centavos"] == 250
+    assert "membresias" not in diarios["2024-03-02"]
+
+
+def test_calcular_resumenes_omite_documentos_sin_fecha():
+    diarios, mensuales = calcular_resumenes(gastos=[{"fecha": None, "monto_centavos": 100}])
+    assert diarios == {} and mensuales == {}
+
+
+def test_diferencias():
+    _, esperado = calcular_resumenes(INGRESOS, GASTOS, MEMBRESIAS)
+    esperado = esperado["2024-03"]
+    assert diferencias(esperado, esperado) == []
+
+    _, actual = calcular_resumenes(INGRESOS[:2], GASTOS, MEMBRESIAS)
+    assert diferencias(esperado, actual["2024-03"]) == [
+        ("ingresos.cantidad", 3, 2),
+        ("ingresos.centavos", 2000, 1500),
+        ("ingresos.por_metodo_pago.qr.cantidad", 2, 1),
+        ("ingresos.por_metodo_pago.qr.centavos", 1400, 900),
+        ("ingresos.por_operador.B.cantidad", 1, 0),
+        ("ingresos.por_operador.B.centavos", 500, 0),
+    ]
+    assert diferencias(None, esperado)[0] == ("gastos.cantidad", 0, 1)
+
+
+def test_diferencias_ignora_desgloses_en_cero_y_metadatos():
+    esperado = {"periodo": "2024-03", "gastos": {"centavos": 100, "cantidad": 1, "por_concepto": {"insumos": {"centavos": 100, "cantidad": 1}}}}
+    actual = {"periodo": "otro", "updated_at": datetime(2024, 4, 1), "gastos": {
+        "centavos": 100, "cantidad": 1,
+        "por_concepto": {"insumos": {"centavos": 100, "cantidad": 1}, "alquiler": {"centavos": 0, "cantidad": 0}},
+    }}
+    assert diferencias(esperado, actual) == []
+
+
+def test_resumenes_incrementales_coinciden_con_los_calculados(repo):
+    ids = [repo.crear_ingreso(_ingreso(datetime(2024, 3, 1 + i % 3, 10), 100 * (i + 1), ("qr", "efectivo")[i % 2])) for i in range(6)]
+    repo.crear_gasto({"fecha": datetime(2024, 3, 2, 12), "concepto": "insumos", "proveedor": "", "descripcion": "",
+                      "metodo_pago": "efectivo", "monto_centavos": 250})
+    repo.eliminar_ingreso(ids[0])
+    repo.eliminar_ingreso(ids[3])
+    assert repo.reconciliar_resumenes(2024, 3) == {}
+
+    mensual, diarios = repo.obtener_resumenes_mes(2024, 3)
+    assert mensual["ingresos"]["cantidad"] == 4
+    assert [d["periodo"] for d in diarios] == ["2024-03-01", "2024-03-02", "2024-03-03"]
+
+
+def test_reconciliar_corrige_resumenes_desactualizados(repo):
+    repo.crear_ingreso(_ingreso(datetime(2024, 3, 5, 10), 700))
+    # Un documento escrito sin pasar por el repositorio no suma a los resúmenes
+    repo.db.collection("ingresos").document("directo").set(_ingreso(datetime(2024, 3, 5, 11), 300))
+    problemas = repo.reconciliar_resumenes(2024, 3, corregir=True)
+    assert ("ingresos.centavos", 1000, 700) in problemas["2024-03"]
+    assert repo.reconciliar_resumenes(2024, 3) == {}
+    assert repo.obtener_resumenes_mes(2024, 3)[0]["ingresos"]["centavos"] == 1000
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from tablas import (
+    ESQUEMA_GASTOS,
+    ESQUEMA_INGRESOS,
+    ESQUEMA_MEMBRESIAS,
+    concatenar,
+    frame_documentos,
+    frames_ingresos,
+    proyectar_esquema,
+)
+
+
+def test_tipos_de_las_columnas():
+    df = frame_documentos(
+        [{"id": "g1", "fecha": datetime(2024, 3, 1, 10), "concepto": "insumos", "metodo_pago": "efectivo", "monto_centavos": 1500}],
+        ESQUEMA_GASTOS,
+    )
+    assert list(df.columns) == list(ESQUEMA_GASTOS)
+    assert str(df["fecha"].dtype) == "datetime64[ns, UTC]"
+    assert isinstance(df["concepto"].dtype, pd.CategoricalDtype)
+    assert df["monto_centavos"].dtype == "int64"
+
+
+def test_campos_faltantes():
+    df = frame_documentos([{"id": "m1"}, {"id": "m2", "fecha_alta": "no es fecha", "activa": True}], ESQUEMA_MEMBRESIAS)
+    assert df["fecha_alta"].isna().all()
+    assert df["precio_centavos"].tolist() == [0, 0]
+    assert df["tipo_membresia"].isna().all()
+    assert df["activa"].tolist() == [False, True]
+
+
+def test_fechas_sin_zona_se_toman_como_utc_sin_perder_microsegundos():
+    sin_zona = datetime(2024, 3, 1, 10, 30, 15, 123456)
+    con_zona = datetime(2024, 3, 1, 7, 30, 15, 123456, tzinfo=timezone(timedelta(hours=-3)))
+    df = frame_documentos([{"fecha": sin_zona}, {"fecha": con_zona}], ESQUEMA_GASTOS)
+    esperado = pd.Timestamp("2024-03-01 10:30:15.123456", tz="UTC")
+    assert df["fecha"].tolist() == [esperado, esperado]
+
+
+def test_items_aplanados_con_el_id_y_la_fecha_del_ingreso():
+    fecha = datetime(2024, 3, 1, 10)
+    ingresos = [
+        {"id": "i1", "fecha": fecha, "metodo_pago": "qr", "monto_total_centavos": 900,
+         "items": [{"producto_id": "p1", "nombre": "Corte", "precio_centavos": 600},
+                   {"producto_id": "p2", "nombre": "Barba", "precio_centavos": 300}]},
+        {"id": "i2", "fecha": fecha, "metodo_pago": "efectivo", "monto_total_centavos": 500, "items": None},
+    ]
+    df_ingresos, df_items = frames_ingresos(ingresos)
+    assert df_ingresos["id"].tolist() == ["i1", "i2"]
+    assert df_items["ingreso_id"].tolist() == ["i1", "i1"]
+    assert df_items["nombre"].tolist() == ["Corte", "Barba"]
+    assert df_items["precio_centavos"].sum() == 900
+    assert (df_items["fecha"] == pd.Timestamp(fecha, tz="UTC")).all()
+
+
+def test_esquema_proyectado_sobre_una_consulta_con_select(repo):
+    fecha = datetime(2024, 3, 1, 10)
+    repo.crear_ingreso({"fecha": fecha, "cliente": "Ana", "operador": "A", "metodo_pago": "qr", "consumicion": "café",
+                        "items": [], "monto_total_centavos": 700})
+    campos = ["fecha", "metodo_pago", "monto_total_centavos"]
+    esquema = proyectar_esquema(ESQUEMA_INGRESOS, campos + ["id"])
+    df = frame_documentos(repo.iterar_entre("ingresos", "fecha", fecha, fecha, campos), esquema)
+    assert list(df.columns) == ["id", "fecha", "metodo_pago", "monto_total_centavos"]
+    assert df["monto_total_centavos"].tolist() == [700]
+    assert df["id"].notna().all()
+
+
+def test_concatenar_conserva_las_categorias():
+    partes = [
+        frame_documentos([{"metodo_pago": "efectivo", "monto_centavos": 1}], ESQUEMA_GASTOS),
+        frame_documentos([{"metodo_pago": "qr", "monto_centavos": 2}], ESQUEMA_GASTOS),
+        frame_documentos([], ESQUEMA_GASTOS),
+    ]
+    df = concatenar(partes)
+    assert isinstance(df["metodo_pago"].dtype, pd.CategoricalDtype)
+    assert df["metodo_pago"].tolist() == ["efectivo", "qr"]
+    assert df["monto_centavos"].tolist() == [1, 2]
+
+
+def test_concatenar_sin_datos_conserva_el_esquema():
+    df = concatenar([frame_documentos([], ESQUEMA_GASTOS)])
+    assert df.empty
+    assert list(df.columns) == list(ESQUEMA_GASTOS)
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+HOY = datetime(2024, 3, 10, tzinfo=timezone.utc)
+
+
+def _membresia(dni, alta, dias, **campos):
+    return dict({"dni_cliente": dni, "tipo_membresia": "Mensual", "fecha_alta": alta, "fecha_vencimiento": alta + timedelta(days=dias),
+                 "precio_centavos": 500000, "metodo_pago": "efectivo", "notas": "", "activa": True}, **campos)
+
+
+def _dnis(membresias):
+    return [m["dni_cliente"] for m in membresias]
+
+
+def test_filtros_sobre_la_proyeccion(repo):
+    repo.crear_membresia(_membresia("1", HOY - timedelta(days=40), 30), "Ana")  # Vencida
+    repo.crear_membresia(_membresia("2", HOY, 30), "Beto")
+    repo.crear_membresia(_membresia("3", HOY, 5, activa=False), "Carla")
+    # La última membresía del cliente 1 reemplaza a la anterior en la proyección
+    repo.crear_membresia(_membresia("1", HOY - timedelta(days=1), 3), "Ana")
+
+    assert _dnis(repo.listar_ultimas_membresias()) == ["1", "3", "2"]
+    assert _dnis(repo.listar_ultimas_membresias(activa=True)) == ["1", "2"]
+    assert _dnis(repo.listar_ultimas_membresias(activa=False)) == ["3"]
+    assert _dnis(repo.listar_ultimas_membresias(vence_desde=HOY, vence_antes=HOY + timedelta(days=7))) == ["1", "3"]
+    assert _dnis(repo.listar_ultimas_membresias(activa=True, vence_desde=HOY + timedelta(days=7))) == ["2"]
+
+
+def test_membresias_sin_activa_cuentan_como_activas(repo):
+    # Membresía antigua escrita sin el campo `activa` ni la proyección
+    repo.db.collection("membresias").document("antigua").set({k: v for k, v in _membresia("9", HOY, 30).items() if k != "activa"})
+    assert repo.reconstruir_ultima_membresia() == 1
+    assert _dnis(repo.listar_ultimas_membresias(activa=True)) == ["9"]
+    assert repo.obtener_ultima_membresia("9")["activa"] is True
+
+
+def test_cambiar_estado_actualiza_la_proyeccion(repo):
+    membresia_id = repo.crear_membresia(_membresia("1", HOY, 30), "Ana")
+    repo.cambiar_estado_membresia(membresia_id, "1", False)
+    assert _dnis(repo.listar_ultimas_membresias(activa=False)) == ["1"]
+    assert repo.obtener_ultima_membresia("1")["id"] == membresia_id
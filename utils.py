@@ -1,78 +1,890 @@
+import asyncio
+import copy
+import logging
+import threading
+import time
+from datetime import date, datetime, timezone
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials
-from google.cloud import firestore as gcfs
 import pandas as pd
-from datetime import datetime
-from calendar import monthrange
+from almacen_referencia import AlmacenReferencia
+from cache_disco import PARTES, CacheParquet
+from indice_clientes import IndiceClientes
+from instrumentacion import medir_callback, medir_pagina
+from motor_async import MotorAsync
+from repositorio import CONCEPTOS_GASTO, METODOS_PAGO, limites_mes, obtener_repositorio
+from resumenes import CAMPO_FECHA, CAMPO_MONTO, aporte, completar, inicio_periodo, periodos, sumar, vacio
+from tablas import (
+    ESQUEMA_GASTOS,
+    ESQUEMA_INGRESOS,
+    ESQUEMA_ITEMS,
+    ESQUEMA_MEMBRESIAS,
+    Tabla,
+    TablaIngresos,
+    concatenar,
+    frame_documentos,
+    frames_ingresos,
+    proyectar_esquema,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Inicialización de la base de datos ---
+# El repositorio se crea una sola vez por proceso; el backend se elige con BENJAS_BACKEND.
+repo = obtener_repositorio()
+
 
-# --- Inicialización Firebase ---
-# Esta función asegura que la app de Firebase se inicialice solo una vez.
 def initialize_firebase():
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(dict(st.secrets["FIREBASE"]))
-        firebase_admin.initialize_app(cred)
-    return firebase_admin.firestore.client()
+    """Retorna el cliente de base de datos del repositorio compartido."""
+    return repo.db
+
+
+# --- Datos de referencia (productos, clientes activos y precios de membresías) ---
+# Se mantienen en memoria para todo el proceso: con Firestore mediante listeners y, si no
+# están disponibles, sondeando la versión del catálogo que incrementan las escrituras.
+
+almacen_referencia = AlmacenReferencia()
+almacen_referencia.registrar_consulta(
+    "productos", repo.consulta_productos(), version=lambda: repo.obtener_versiones_catalogo()["productos"]
+)
+almacen_referencia.registrar_consulta(
+    "clientes_activos", repo.consulta_clientes_activos(), version=lambda: repo.obtener_versiones_catalogo()["clientes"]
+)
+almacen_referencia.registrar_documento("precios_membresias", repo.documento_precios_membresias())
+
+
+def listar_productos():
+    """Todos los productos, en el orden de la colección."""
+    return [dict(data, id=producto_id) for producto_id, data in sorted(almacen_referencia.documentos("productos").items())]
+
+
+def get_productos():
+    """Obtiene los productos activos."""
+    return [p for p in listar_productos() if p.get("activo") is True]
+
+
+def _clientes_activos():
+    clientes = [dict(data, id=dni) for dni, data in almacen_referencia.documentos("clientes_activos").items()]
+    clientes.sort(key=lambda x: x.get("nombre", ""))
+    return clientes
+
+
+def get_clientes():
+    """Obtiene los clientes activos, ordenados por nombre."""
+    clientes_list = []
+    for data in _clientes_activos():
+        clientes_list.append({
+            'dni': data['id'],
+            'nombre': data.get('nombre', ''),
+            'display_name': f"{data.get('nombre', '')} (DNI: {data['id']})"
+        })
+    return clientes_list
+
+
+def obtener_precios_membresias():
+    """Precios configurados por tipo de membresía (en centavos), o None si no hay."""
+    return almacen_referencia.documento("precios_membresias")
+
+
+def guardar_precios_membresias(precios):
+    repo.guardar_precios_membresias(precios)
+    almacen_referencia.invalidar("precios_membresias")
+
+
+def invalidar_catalogos():
+    """Fuerza a releer completos los datos de referencia (cuando no hay listeners)."""
+    almacen_referencia.invalidar(recargar=True)
+
+
+def crear_producto(doc):
+    producto_id = repo.crear_producto(doc)
+    # Sin listeners, la próxima lectura verifica la versión sin esperar el intervalo de sondeo
+    almacen_referencia.invalidar("productos")
+    return producto_id
+
+
+def cambiar_estado_producto(producto_id, activo):
+    repo.cambiar_estado_producto(producto_id, activo)
+    almacen_referencia.invalidar("productos")
+
+
+def eliminar_producto(producto_id):
+    repo.eliminar_producto(producto_id)
+    almacen_referencia.invalidar("productos")
+
+
+def cambiar_estado_productos(producto_ids, activo):
+    """Activa o desactiva varios productos en una escritura por lotes."""
+    repo.cambiar_estado_productos(producto_ids, activo)
+    almacen_referencia.invalidar("productos")
+
+
+def eliminar_productos(producto_ids):
+    repo.eliminar_productos(producto_ids)
+    almacen_referencia.invalidar("productos")
+
+
+# Nombres para mostrar de los métodos de pago de membresías
+METODOS_PAGO_MEMBRESIA = {
+    "efectivo": "Efectivo",
+    "transferencia": "Transferencia",
+    "debito_automatico": "Débito Automático",
+}
+
+
+def mes_cerrado(clave):
+    """Un mes está cerrado (sus datos ya no cambian) cuando terminó antes de hoy."""
+    hoy = date.today()
+    return clave < (hoy.year, hoy.month)
+
+
+def meses_entre(desde, hasta):
+    """Lista de (año, mes) que abarca el rango de fechas."""
+    meses = []
+    year, month = desde.year, desde.month
+    while (year, month) <= (hasta.year, hasta.month):
+        meses.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return meses
+
+
+class CacheMensual:
+    """
+    Cache por (año, mes) compartida por todas las sesiones del proceso, con vencimiento.
+    A diferencia de st.cache_data permite invalidar un solo mes y actualizar el valor
+    cacheado (escritura directa) sin volver a consultar la base.
+    Los meses cerrados se consideran estables y no vencen; las altas y bajas con fecha
+    en esos meses los siguen actualizando.
+    Los valores cacheados no deben modificarse: actualizar() los reemplaza por uno nuevo.
+    """
+
+    def __init__(self, ttl, estable=mes_cerrado):
+        self.ttl = ttl
+        self.estable = estable
+        self._valores = {}
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, cargar):
+        return self.obtener_varios([clave], lambda faltantes: {clave: cargar()})[0]
+
+    def obtener_varios(self, claves, cargar_varios):
+        """
+        Valores de varios meses, en el orden de `claves`. Los que no están en cache (o vencieron)
+        se cargan juntos con cargar_varios(faltantes), que retorna {clave: valor}.
+        """
+        valores = {}
+        versiones = {}
+        with self._lock:
+            for clave in claves:
+                entrada = self._vigente(clave)
+                if entrada:
+                    valores[clave] = entrada[0]
+                else:
+                    versiones[clave] = self._versiones.get(clave, 0)
+        if versiones:
+            cargados = cargar_varios(list(versiones))
+            with self._lock:
+                for clave, valor in cargados.items():
+                    # Si el mes cambió mientras se cargaba, el valor podría no incluir ese cambio
+                    if self._versiones.get(clave, 0) == versiones[clave]:
+                        self._valores[clave] = (valor, time.monotonic())
+            valores.update(cargados)
+        return [valores[clave] for clave in claves]
+
+    def _vigente(self, clave):
+        # Se llama con self._lock tomado
+        entrada = self._valores.get(clave)
+        if entrada and (self.estable(clave) or time.monotonic() - entrada[1] < self.ttl):
+            return entrada
+        return None
+
+    def en_cache(self, clave):
+        """El valor cacheado del mes si está vigente, o None; nunca lo carga."""
+        with self._lock:
+            entrada = self._vigente(clave)
+            return entrada[0] if entrada else None
+
+    def huella(self, clave):
+        """Identifica el valor cacheado del mes: cambia con cada carga, invalidación o actualización."""
+        with self._lock:
+            entrada = self._valores.get(clave)
+            return self._versiones.get(clave, 0), entrada[1] if entrada else None
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._valores.pop(clave, None)
+            self._versiones[clave] = self._versiones.get(clave, 0) + 1
+
+    def actualizar(self, clave, funcion):
+        """Reemplaza el valor cacheado del mes por funcion(valor), si está en cache."""
+        with self._lock:
+            self._versiones[clave] = self._versiones.get(clave, 0) + 1
+            entrada = self._valores.get(clave)
+            if entrada:
+                self._valores[clave] = (funcion(entrada[0]), entrada[1])
+
+
+cache_dashboard = CacheMensual(ttl=600)  # Cache por 10 minutos
+cache_resumenes = CacheMensual(ttl=600)
+# Cantidad y monto de cada colección por mes, para los KPIs (ver get_totales_rango)
+cache_totales = CacheMensual(ttl=600)
+# Solo las membresías del detalle, para lo que no lee ingresos ni gastos (ver get_membresias_rango)
+cache_membresias = CacheMensual(ttl=600)
+# Meses cerrados del Dashboard guardados en disco entre reinicios (ver cache_disco.py)
+cache_disco = CacheParquet()
+
+
+def reabrir_mes(year, month):
+    """Descarta las caches del mes (en disco y en memoria) para volver a consultarlo, por ejemplo tras una corrección."""
+    cache_disco.reabrir(year, month)
+    cache_dashboard.invalidar((year, month))
+    cache_membresias.invalidar((year, month))
+    cache_resumenes.invalidar((year, month))
+    cache_totales.invalidar((year, month))
+
+# Consultas del Dashboard: se lanzan juntas (por colección y por mes) con un límite de
+# consultas simultáneas para todo el proceso (ver motor_async.py)
+motor = MotorAsync(repo)
+
+SECCIONES = ("ingresos", "gastos", "membresias")
+
+# Campos que usa cada consumidor del detalle del Dashboard (get_dashboard_data), por colección
+# ("items" son los campos de cada item de los ingresos). Las consultas piden solo la unión, así que
+# los documentos llegan y se cachean sin notas, marcas de tiempo ni otros campos que nadie lee.
+# Los KPIs y los gráficos no están: salen de get_totales_rango y de los resúmenes. Las colecciones que
+# un consumidor no declara no se consultan para él (top_clientes usa get_membresias_rango).
+CAMPOS_DETALLE = {
+    # Particiones por mes, filtros por fecha y nombres de los clientes de las membresías
+    "particiones": {
+        "ingresos": ["fecha"],
+        "gastos": ["fecha"],
+        "membresias": ["fecha_alta", "dni_cliente"],
+    },
+    "reporte_excel": {
+        "ingresos": ["fecha", "cliente", "operador", "metodo_pago", "monto_total_centavos", "consumicion"],
+        "items": ["nombre"],
+        "gastos": ["fecha", "concepto", "proveedor", "metodo_pago", "monto_centavos", "descripcion"],
+        "membresias": ["fecha_alta", "dni_cliente", "tipo_membresia", "precio_centavos", "metodo_pago", "fecha_vencimiento"],
+    },
+    "top_clientes": {
+        "membresias": ["dni_cliente", "tipo_membresia", "precio_centavos"],
+    },
+}
+
+
+def campos_detalle(coleccion):
+    """Unión de los campos que declaran los consumidores del detalle para la colección."""
+    return sorted({campo for campos in CAMPOS_DETALLE.values() for campo in campos.get(coleccion, [])})
+
+
+def colecciones_detalle(consumidor):
+    """Colecciones de las que lee el consumidor del detalle; las demás no se consultan para él."""
+    return [coleccion for coleccion in SECCIONES if coleccion in CAMPOS_DETALLE[consumidor]]
+
+
+# Campos que se piden a cada colección. Un array no se puede proyectar por subcampo, así que
+# los ingresos traen los items completos y se guardan solo sus campos declarados.
+CAMPOS_CONSULTA = {
+    "ingresos": campos_detalle("ingresos") + (["items"] if campos_detalle("items") else []),
+    "gastos": campos_detalle("gastos"),
+    "membresias": campos_detalle("membresias"),
+}
+# Columnas de las tablas del detalle; el id (y en los items, el id y la fecha del ingreso) siempre está
+ESQUEMA_INGRESOS_DETALLE = proyectar_esquema(ESQUEMA_INGRESOS, ["id", *campos_detalle("ingresos")])
+ESQUEMA_ITEMS_DETALLE = proyectar_esquema(ESQUEMA_ITEMS, ["ingreso_id", "fecha", *campos_detalle("items")])
+ESQUEMA_GASTOS_DETALLE = proyectar_esquema(ESQUEMA_GASTOS, ["id", *campos_detalle("gastos")])
+ESQUEMA_MEMBRESIAS_DETALLE = proyectar_esquema(ESQUEMA_MEMBRESIAS, ["id", *campos_detalle("membresias")])
+
+
+async def _medir(tiempos, nombre, corrutina):
+    """Espera la corrutina y guarda su duración en tiempos[nombre] (segundos)."""
+    inicio = time.perf_counter()
+    try:
+        return await corrutina
+    finally:
+        tiempos[nombre] = time.perf_counter() - inicio
+
+
+def _completar_ingresos(df_ing, df_items):
+    df_ing["monto_total"] = df_ing["monto_total_centavos"] / 100
+    return df_ing, df_items
+
+
+def _completar_gastos(df_gas):
+    df_gas["monto"] = df_gas["monto_centavos"] / 100
+    return df_gas
+
+
+def _frame_ingresos(ingresos):
+    """Retorna (ingresos, items) con columnas tipadas a partir de un iterable de ingresos."""
+    return _completar_ingresos(*frames_ingresos(ingresos, ESQUEMA_INGRESOS_DETALLE, ESQUEMA_ITEMS_DETALLE))
+
+
+def _frame_gastos(gastos):
+    return _completar_gastos(frame_documentos(gastos, ESQUEMA_GASTOS_DETALLE))
+
+
+def _completar_membresias(df_membresias, nombres):
+    """Agrega a las membresías el nombre del cliente (`nombres` es {dni: nombre}) y las columnas para mostrar."""
+    df_membresias["nombre_cliente"] = df_membresias["dni_cliente"].map(nombres).fillna("Cliente no encontrado")
+    df_membresias["precio"] = df_membresias["precio_centavos"] / 100
+
+    # Añadir columna de método de pago formateado para visualización
+    df_membresias["metodo_pago_display"] = (
+        df_membresias["metodo_pago"].astype(object).map(METODOS_PAGO_MEMBRESIA)
+        .fillna("Efectivo")  # Default para registros antiguos
+        .astype("category")
+    )
+    return df_membresias
+
+
+def _columnas_detalle():
+    """Columnas de cada DataFrame del detalle, en el orden de get_dashboard_data."""
+    df_ing, df_items = _frame_ingresos([])
+    df_membresias = _completar_membresias(frame_documentos([], ESQUEMA_MEMBRESIAS_DETALLE), {})
+    return [list(df.columns) for df in (df_ing, _frame_gastos([]), df_membresias, df_items)]
 
-db = initialize_firebase()
 
-@st.cache_data(ttl=600) # Cache por 10 minutos
 def get_dashboard_data(year, month):
     """
-    Obtiene los datos de ingresos, gastos y membresías para un mes y año específicos desde Firebase.
+    Obtiene los datos de ingresos, gastos y membresías para un mes y año específicos desde la base de datos.
     Es mucho más eficiente que traer todos los datos y filtrarlos en pandas.
+    Retorna (ingresos, gastos, membresías, items de los ingresos). Los documentos se vuelcan en columnas
+    tipadas a medida que llegan (ver tablas.py) y los items quedan aparte, una fila por item.
+    El resultado queda en cache_dashboard por mes; las altas y bajas lo actualizan sin volver a consultar.
+    Las consultas se lanzan juntas en el motor asíncrono, así que la demora es la de la más lenta.
+    La cantidad de documentos leídos por colección queda en el atributo `attrs["lecturas"]` de cada DataFrame
+    y la duración de cada consulta (segundos) en `attrs["tiempos"]`.
+    """
+    return cache_dashboard.obtener_varios([(year, month)], _cargar_dashboard_meses)[0]
+
+
+def _cargar_dashboard_meses(meses):
+    """
+    Retorna {(año, mes): datos}. Los meses cerrados se leen de la cache en disco si están; los
+    demás se consultan todos juntos y los cerrados se guardan en disco.
+    """
+    cargados = {}
+    a_consultar = []
+    for clave in meses:
+        if mes_cerrado(clave):
+            inicio = time.perf_counter()
+            frames = cache_disco.leer(*clave)
+            if frames is not None and [list(df.columns) for df in frames] != _columnas_detalle():
+                # Guardado con otros campos (por una versión anterior de CAMPOS_DETALLE): se vuelve a consultar
+                cache_disco.reabrir(*clave)
+                frames = None
+            if frames is not None:
+                tiempos = {"disco": time.perf_counter() - inicio}
+                for df in frames:
+                    df.attrs["lecturas"] = {}
+                    df.attrs["tiempos"] = tiempos
+                cargados[clave] = frames
+                continue
+        a_consultar.append(clave)
+    if not a_consultar:
+        return cargados
+
+    versiones = {clave: cache_dashboard.huella(clave)[0] for clave in a_consultar}
+    consultados = {
+        clave: tuple(frames[parte] for parte in PARTES)
+        for clave, frames in _consultar_dashboard_meses(a_consultar).items()
+    }
+    for clave, frames in consultados.items():
+        # Si hubo un alta o baja en el mes durante la consulta, se guardará en la próxima carga
+        if mes_cerrado(clave) and cache_dashboard.huella(clave)[0] == versiones[clave]:
+            cache_disco.guardar(*clave, frames)
+    cargados.update(consultados)
+    return cargados
+
+
+async def _consultar_mes(year, month, lecturas, tiempos, colecciones=SECCIONES):
+    """
+    Consultas de un mes, lanzadas juntas; las colecciones que no se piden no se consultan.
+    Retorna ({colección: tabla} de las colecciones pedidas, {dni: nombre}).
+    """
+    start_date, end_date = limites_mes(year, month)
+    tablas = {
+        "ingresos": TablaIngresos(ESQUEMA_INGRESOS_DETALLE, ESQUEMA_ITEMS_DETALLE),
+        "gastos": Tabla(ESQUEMA_GASTOS_DETALLE),
+        "membresias": Tabla(ESQUEMA_MEMBRESIAS_DETALLE),
+    }
+    dnis = []
+
+    async def recorrer(coleccion, campo_fecha, agregar):
+        lecturas[coleccion] = await _medir(
+            tiempos, coleccion, motor.recorrer_entre(
+                coleccion, campo_fecha, start_date, end_date, agregar, CAMPOS_CONSULTA[coleccion]
+            )
+        )
+
+    def agregar_membresia(doc):
+        tablas["membresias"].agregar(doc)
+        dnis.append(doc.get("dni_cliente"))
+
+    async def membresias_con_nombres():
+        # --- Traer membresías del mes (por fecha de alta) ---
+        await recorrer("membresias", "fecha_alta", agregar_membresia)
+        # Obtener los nombres de todos los clientes del mes, con los lotes de lectura en paralelo
+        nombres, lecturas["clientes"] = await _medir(tiempos, "clientes", motor.obtener_nombres_clientes(dnis))
+        return nombres
+
+    consultas = {
+        "ingresos": lambda: recorrer("ingresos", "fecha", tablas["ingresos"].agregar),
+        "gastos": lambda: recorrer("gastos", "fecha", tablas["gastos"].agregar),
+        "membresias": membresias_con_nombres,
+    }
+    colecciones = [coleccion for coleccion in SECCIONES if coleccion in colecciones]
+    resultados = dict(zip(colecciones, await asyncio.gather(*(consultas[c]() for c in colecciones))))
+    return {coleccion: tablas[coleccion] for coleccion in colecciones}, resultados.get("membresias") or {}
+
+
+def _consultar_dashboard_meses(meses, colecciones=SECCIONES):
+    """
+    Consulta varios meses a la vez: todas las consultas de todos los meses se lanzan juntas.
+    Retorna {(año, mes): {parte: DataFrame}} con las partes de las colecciones pedidas
+    (los ingresos traen también sus "items").
+    """
+    inicio = time.perf_counter()
+    medidas = {clave: ({}, {}) for clave in meses}  # (lecturas, tiempos) de cada mes
+
+    async def consultar_todos():
+        return await asyncio.gather(*(_consultar_mes(*clave, *medidas[clave], colecciones) for clave in meses))
+
+    resultados = motor.ejecutar(consultar_todos())
+    cargados = {}
+    for (year, month), (tablas, nombres) in zip(meses, resultados):
+        lecturas, tiempos = medidas[(year, month)]
+        frames = {}
+        if "ingresos" in tablas:
+            frames["ingresos"], frames["items"] = _completar_ingresos(*tablas["ingresos"].frames())
+        if "gastos" in tablas:
+            frames["gastos"] = _completar_gastos(tablas["gastos"].frame())
+        if "membresias" in tablas:
+            frames["membresias"] = _completar_membresias(tablas["membresias"].frame(), nombres)
+        tiempos["total"] = time.perf_counter() - inicio
+        logger.info("get_dashboard_data %04d-%02d: lecturas=%s tiempos=%s", year, month, lecturas, tiempos)
+
+        for df in frames.values():
+            df.attrs["lecturas"] = lecturas
+            df.attrs["tiempos"] = tiempos
+        cargados[(year, month)] = frames
+    return cargados
+
+
+def get_resumen_mes(year, month):
+    """
+    Obtiene el resumen precalculado del mes y los resúmenes de cada día (ver resumenes.py).
+    Si el mes todavía no fue resumido, lo calcula a partir de los documentos originales.
+    Retorna (resumen_mes, lista de resúmenes diarios ordenados por fecha).
+    """
+    return cache_resumenes.obtener((year, month), lambda: _cargar_resumen_mes(year, month))
+
+
+def _cargar_resumen_mes(year, month):
+    resumen_mes, resumenes_diarios = repo.obtener_resumenes_mes(year, month)
+    if resumen_mes is None:
+        diarios, mensuales = repo.calcular_resumenes_mes(year, month)
+        resumen_mes = mensuales.get(f"{year:04d}-{month:02d}")
+        resumenes_diarios = [diarios[dia] for dia in sorted(diarios)]
+    return completar(resumen_mes), [completar(d) for d in resumenes_diarios]
+
+
+def get_totales_rango(desde, hasta):
+    """
+    Cantidad y monto de ingresos, gastos y membresías entre dos fechas (inclusive), para los KPIs:
+    {seccion: {"centavos", "cantidad"}}. Se calculan con consultas de agregación (count + sum), que
+    no descargan documentos, salvo en los meses cuyo resumen ya está en cache_resumenes.
+    Los meses completos quedan en cache_totales; los meses cortados por el rango se consultan.
+    """
+    totales = {seccion: {"centavos": 0, "cantidad": 0} for seccion in SECCIONES}
+    completos = []
+    parciales = []
+    for year, month in meses_entre(desde, hasta):
+        primero, ultimo = (d.date() for d in limites_mes(year, month))
+        inicio, fin = max(primero, desde), min(ultimo, hasta)
+        resumen = cache_resumenes.en_cache((year, month))
+        if resumen is not None:
+            _sumar_totales(totales, _totales_resumen(resumen, inicio, fin))
+        elif (inicio, fin) == (primero, ultimo):
+            completos.append((year, month))
+        else:
+            parciales.append((inicio, fin))
+
+    def cargar_meses(meses):
+        return dict(zip(meses, _consultar_totales([limites_mes(*mes) for mes in meses])))
+
+    for totales_mes in cache_totales.obtener_varios(completos, cargar_meses):
+        _sumar_totales(totales, totales_mes)
+    for totales_rango in _consultar_totales([_limites_dias(inicio, fin) for inicio, fin in parciales]):
+        _sumar_totales(totales, totales_rango)
+    return totales
+
+
+def _limites_dias(inicio, fin):
+    """Primer instante del día inicio y último del día fin, como limites_mes."""
+    return datetime(inicio.year, inicio.month, inicio.day), datetime(fin.year, fin.month, fin.day, 23, 59, 59)
+
+
+def _consultar_totales(rangos):
+    """Totales de cada rango de instantes, con las agregaciones de todos los rangos y colecciones lanzadas juntas."""
+    if not rangos:
+        return []
+
+    async def consultar_todos():
+        return await asyncio.gather(*(
+            motor.totales_entre(seccion, desde, hasta) for desde, hasta in rangos for seccion in SECCIONES
+        ))
+
+    resultados = iter(motor.ejecutar(consultar_todos()))
+    return [{seccion: next(resultados) for seccion in SECCIONES} for _ in rangos]
+
+
+def _totales_resumen(resumen, inicio, fin):
+    """Totales de los días del resumen del mes (ver get_resumen_mes) que están en el rango."""
+    totales = {seccion: {"centavos": 0, "cantidad": 0} for seccion in SECCIONES}
+    _, resumenes_diarios = resumen
+    for dia in resumenes_diarios:
+        if inicio <= date.fromisoformat(dia["periodo"]) <= fin:
+            _sumar_totales(totales, dia)
+    return totales
+
+
+def _sumar_totales(totales, otros):
+    for seccion in SECCIONES:
+        totales[seccion]["centavos"] += otros[seccion]["centavos"]
+        totales[seccion]["cantidad"] += otros[seccion]["cantidad"]
+
+
+def get_dashboard_data_rango(desde, hasta):
+    """
+    Datos de ingresos, gastos, membresías e items entre dos fechas (inclusive), armados con las
+    particiones mensuales de get_dashboard_data: solo se consultan los meses que no están en cache,
+    todos a la vez.
+    """
+    particiones = cache_dashboard.obtener_varios(list(meses_entre(desde, hasta)), _cargar_dashboard_meses)
+    frames = []
+    for posicion, campo_fecha in ((0, "fecha"), (1, "fecha"), (2, "fecha_alta"), (3, "fecha")):
+        df = concatenar(p[posicion] for p in particiones)
+        if not df.empty:
+            fechas = df[campo_fecha].dt.date
+            df = df[(fechas >= desde) & (fechas <= hasta)].reset_index(drop=True)
+        frames.append(df)
+    return tuple(frames)
+
+
+def get_membresias_rango(desde, hasta):
+    """
+    Membresías del detalle entre dos fechas (inclusive), con el nombre del cliente, para los consumidores
+    que solo leen membresías (ver colecciones_detalle). Los meses que ya están en cache_dashboard o en
+    disco se toman de ahí; los demás se consultan todos a la vez, sin traer ingresos ni gastos.
+    """
+    df = concatenar(cache_membresias.obtener_varios(list(meses_entre(desde, hasta)), _cargar_membresias_meses))
+    if not df.empty:
+        fechas = df["fecha_alta"].dt.date
+        df = df[(fechas >= desde) & (fechas <= hasta)].reset_index(drop=True)
+    return df
+
+
+def _cargar_membresias_meses(meses):
+    """Retorna {(año, mes): membresías}, como _cargar_dashboard_meses pero solo con la parte de las membresías."""
+    posicion = PARTES.index("membresias")
+    columnas = _columnas_detalle()[posicion]
+    cargados = {}
+    a_consultar = []
+    for clave in meses:
+        frames = cache_dashboard.en_cache(clave)
+        if frames is not None:
+            cargados[clave] = frames[posicion]
+            continue
+        if mes_cerrado(clave):
+            inicio = time.perf_counter()
+            frames = cache_disco.leer(*clave, partes=("membresias",))
+            if frames is not None and list(frames[0].columns) == columnas:
+                frames[0].attrs["lecturas"] = {}
+                frames[0].attrs["tiempos"] = {"disco": time.perf_counter() - inicio}
+                cargados[clave] = frames[0]
+                continue
+        a_consultar.append(clave)
+    if a_consultar:
+        consultados = _consultar_dashboard_meses(a_consultar, colecciones=("membresias",))
+        cargados.update((clave, frames["membresias"]) for clave, frames in consultados.items())
+    return cargados
+
+
+def huella_membresias(desde, hasta):
+    """Huella de los datos de get_membresias_rango, para cachear lo que se deriva de ellos."""
+    return desde, hasta, tuple(cache_membresias.huella(mes) for mes in meses_entre(desde, hasta))
+
+
+def huella_dashboard(desde, hasta):
+    """Huella de los datos de get_dashboard_data_rango, para cachear lo que se deriva de ellos."""
+    return desde, hasta, tuple(cache_dashboard.huella(mes) for mes in meses_entre(desde, hasta))
+
+
+def huella_resumenes(desde, hasta):
+    """Huella de los datos de get_resumen_rango, para cachear lo que se deriva de ellos."""
+    return desde, hasta, tuple(cache_resumenes.huella(mes) for mes in meses_entre(desde, hasta))
+
+
+def get_resumen_rango(desde, hasta):
+    """
+    Resumen de un rango de fechas (inclusive) sumando los resúmenes diarios de cada mes cacheado.
+    Retorna (resumen_total, lista de resúmenes diarios del rango).
+    """
+    resumenes_diarios = []
+    for year, month in meses_entre(desde, hasta):
+        _, diarios = get_resumen_mes(year, month)
+        resumenes_diarios += [d for d in diarios if desde <= date.fromisoformat(d["periodo"]) <= hasta]
+    total = vacio()
+    for dia in resumenes_diarios:
+        sumar(total, {seccion: dia[seccion] for seccion in SECCIONES})
+    return total, resumenes_diarios
+
+
+# --- Escritura directa en las caches del Dashboard ---
+
+def _como_leido(doc, doc_id):
+    """Deja un documento recién escrito como lo devolvería la base (con id y fechas en UTC)."""
+    leido = {"id": doc_id}
+    for campo, valor in doc.items():
+        if isinstance(valor, datetime):
+            valor = valor if valor.tzinfo else valor.replace(tzinfo=timezone.utc)
+        elif not isinstance(valor, (str, int, float, bool, list, dict, type(None))):
+            valor = datetime.now(timezone.utc)  # SERVER_TIMESTAMP
+        leido[campo] = valor
+    return leido
+
+
+def _actualizar_caches(coleccion, doc, signo, nombre_cliente=None):
+    """
+    Aplica un alta (signo=1) o baja (signo=-1) a las caches del mes del documento,
+    en lugar de descartarlas.
+    """
+    fecha = doc[CAMPO_FECHA[coleccion]]
+    clave = (fecha.year, fecha.month)
+
+    if coleccion == "ingresos":
+        # Ingresos e items (posiciones 0 y 3), con la columna que los relaciona en cada uno
+        partes = {0: "id", 3: "ingreso_id"}
+        nuevos = _frame_ingresos([doc]) if signo > 0 else None
+    elif coleccion == "gastos":
+        partes = {1: "id"}
+        nuevos = (_frame_gastos([doc]),) if signo > 0 else None
+    else:
+        partes = {2: "id"}
+        nuevos = None
+        if signo > 0:
+            df_doc = frame_documentos([doc], ESQUEMA_MEMBRESIAS_DETALLE)
+            nuevos = (_completar_membresias(df_doc, {doc.get("dni_cliente"): nombre_cliente}),)
+
+    def actualizar_frame(df, indice, campo_id):
+        if signo > 0:
+            df_nuevo = concatenar([df, nuevos[indice]])
+        else:
+            df_nuevo = df[df[campo_id] != doc["id"]].reset_index(drop=True) if not df.empty else df
+        df_nuevo.attrs = dict(df.attrs)
+        return df_nuevo
+
+    def actualizar_frames(frames):
+        frames = list(frames)
+        for indice, (posicion, campo_id) in enumerate(partes.items()):
+            frames[posicion] = actualizar_frame(frames[posicion], indice, campo_id)
+        return tuple(frames)
+
+    def actualizar_resumen(resumen):
+        resumen_mes, resumenes_diarios = copy.deepcopy(resumen)
+        aporte_doc = aporte(coleccion, doc, signo)
+        sumar(resumen_mes, aporte_doc)
+        dia, _ = periodos(fecha)
+        resumen_dia = next((d for d in resumenes_diarios if d.get("periodo") == dia), None)
+        if resumen_dia is None:
+            resumen_dia = completar({"periodo": dia, "fecha": inicio_periodo(dia)})
+            resumenes_diarios.append(resumen_dia)
+            resumenes_diarios.sort(key=lambda d: d["periodo"])
+        sumar(resumen_dia, aporte_doc)
+        return resumen_mes, resumenes_diarios
+
+    cache_dashboard.actualizar(clave, actualizar_frames)
+    if coleccion == "membresias":
+        cache_membresias.actualizar(clave, lambda df: actualizar_frame(df, 0, "id"))
+    # La copia en disco del mes ya no está al día: se vuelve a consultar en la próxima carga
+    if mes_cerrado(clave):
+        cache_disco.reabrir(*clave)
+    cache_resumenes.actualizar(clave, actualizar_resumen)
+
+    def actualizar_totales(totales):
+        totales = copy.deepcopy(totales)
+        totales[coleccion]["centavos"] += signo * (doc.get(CAMPO_MONTO[coleccion]) or 0)
+        totales[coleccion]["cantidad"] += signo
+        return totales
+
+    cache_totales.actualizar(clave, actualizar_totales)
+
+
+def registrar_ingreso(doc):
+    ingreso_id = repo.crear_ingreso(doc)
+    _actualizar_caches("ingresos", _como_leido(doc, ingreso_id), 1)
+    return ingreso_id
+
+
+def eliminar_ingreso(ingreso_id):
+    eliminado = repo.eliminar_ingreso(ingreso_id)
+    if eliminado:
+        _actualizar_caches("ingresos", _como_leido(eliminado, ingreso_id), -1)
+    return eliminado
+
+
+def registrar_gasto(doc):
+    gasto_id = repo.crear_gasto(doc)
+    _actualizar_caches("gastos", _como_leido(doc, gasto_id), 1)
+    return gasto_id
+
+
+def eliminar_gasto(gasto_id):
+    eliminado = repo.eliminar_gasto(gasto_id)
+    if eliminado:
+        _actualizar_caches("gastos", _como_leido(eliminado, gasto_id), -1)
+    return eliminado
+
+
+# --- Avisos de las acciones de los listados ---
+
+def avisar(mensaje):
+    """
+    Deja un aviso para mostrar con mostrar_avisos. Los callbacks de los listados (fragmentos)
+    no deben mostrar elementos directamente.
+    """
+    st.session_state.setdefault("avisos", []).append(mensaje)
+
+
+def mostrar_avisos():
+    """Muestra como st.toast los avisos pendientes de la sesión."""
+    for mensaje in st.session_state.pop("avisos", []):
+        st.toast(mensaje)
+
+
+# --- Búsqueda de clientes (índice compartido por el proceso) ---
+
+# Se reconstruye desde el almacén de referencia, así que recargarlo no lee la base
+indice_clientes = IndiceClientes(_clientes_activos, ttl=60)
+
+
+def buscar_clientes(texto, limite=20):
+    """Clientes activos que coinciden con el texto (nombre, DNI o teléfono), como dicts con dni, nombre y telefono."""
+    return indice_clientes.buscar(texto, limite)
+
+
+def aviso_clientes_truncados(texto, mostrados):
+    """Aviso para un selector que muestra solo los primeros `mostrados` clientes de la búsqueda."""
+    if texto.strip():
+        return f"Se muestran las primeras {mostrados} coincidencias: agregue más texto y presione Enter para acotar."
+    return (
+        f"Se muestran los primeros {mostrados} de {indice_clientes.cantidad()} clientes por nombre: "
+        "escriba en la búsqueda y presione Enter para encontrar el resto."
+    )
+
+
+def crear_cliente(doc):
+    """Crea el cliente y lo agrega al índice de búsqueda."""
+    repo.crear_cliente(doc)
+    indice_clientes.actualizar(doc)
+    almacen_referencia.invalidar("clientes_activos")
+
+
+def cambiar_estado_cliente(cliente, activo):
+    """Activa o desactiva el cliente y lo agrega o quita del índice de búsqueda."""
+    repo.cambiar_estado_cliente(cliente["dni"], activo)
+    indice_clientes.actualizar(dict(cliente, activo=activo))
+    almacen_referencia.invalidar("clientes_activos")
+
+
+def eliminar_cliente(dni):
+    repo.eliminar_cliente(dni)
+    indice_clientes.quitar(dni)
+    almacen_referencia.invalidar("clientes_activos")
+
+
+def cambiar_estado_clientes(clientes, activo):
+    """Activa o desactiva varios clientes en una escritura por lotes y actualiza el índice de búsqueda."""
+    repo.cambiar_estado_clientes([c["dni"] for c in clientes], activo)
+    for cliente in clientes:
+        indice_clientes.actualizar(dict(cliente, activo=activo))
+    almacen_referencia.invalidar("clientes_activos")
+
+
+def eliminar_clientes(dnis):
+    """
+    Elimina en una escritura por lotes los clientes que no tienen membresías activas.
+    Retorna (DNIs eliminados, DNIs que no se eliminaron por tener membresías activas).
+    """
+    con_membresias_activas = repo.clientes_con_membresias_activas(dnis)
+    eliminados = [dni for dni in dnis if dni not in con_membresias_activas]
+    if eliminados:
+        repo.eliminar_clientes(eliminados)
+        for dni in eliminados:
+            indice_clientes.quitar(dni)
+        almacen_referencia.invalidar("clientes_activos")
+    return eliminados, [dni for dni in dnis if dni in con_membresias_activas]
+
+
+# --- Estado de membresías por cliente (cache de sesión) ---
+
+# Segundos que vale el estado cacheado: los cambios de otras sesiones se ven pasado este tiempo
+TTL_ULTIMA_MEMBRESIA = 60
+
+
+def obtener_ultima_membresia_cacheada(dni_cliente):
+    """
+    Versión cacheada en la sesión de repo.obtener_ultima_membresia: como máximo una lectura
+    por cliente cada TTL_ULTIMA_MEMBRESIA segundos, o antes si la sesión cambia sus membresías.
+    """
+    cache = st.session_state.setdefault("cache_ultima_membresia", {})
+    entrada = cache.get(dni_cliente)
+    if entrada is None or time.monotonic() - entrada[1] >= TTL_ULTIMA_MEMBRESIA:
+        entrada = cache[dni_cliente] = (repo.obtener_ultima_membresia(dni_cliente), time.monotonic())
+    return entrada[0]
+
+
+def invalidar_estado_cliente(dni_cliente):
+    """Descarta el estado cacheado de un cliente cuando cambian sus membresías."""
+    st.session_state.get("cache_ultima_membresia", {}).pop(dni_cliente, None)
+
+
+def crear_membresia(doc, nombre_cliente):
+    membresia_id = repo.crear_membresia(doc, nombre_cliente)
+    invalidar_estado_cliente(doc["dni_cliente"])
+    _actualizar_caches("membresias", _como_leido(doc, membresia_id), 1, nombre_cliente)
+    return membresia_id
+
+
+def cambiar_estado_membresia(membresia_id, dni_cliente, activa):
+    repo.cambiar_estado_membresia(membresia_id, dni_cliente, activa)
+    invalidar_estado_cliente(dni_cliente)
+
+
+def eliminar_membresia(membresia_id, dni_cliente):
+    eliminado = repo.eliminar_membresia(membresia_id, dni_cliente)
+    invalidar_estado_cliente(dni_cliente)
+    if eliminado:
+        _actualizar_caches("membresias", _como_leido(eliminado, membresia_id), -1)
+
+
+def cambiar_estado_membresias(membresias, activa):
+    """Activa o desactiva varias membresías [(membresia_id, dni_cliente)] en una escritura por lotes."""
+    repo.cambiar_estado_membresias(membresias, activa)
+    for _, dni_cliente in membresias:
+        invalidar_estado_cliente(dni_cliente)
+
+
+def eliminar_membresias(membresias):
+    """
+    Elimina varias membresías [(membresia_id, dni_cliente)] en una escritura por lotes.
+    Retorna {dni: nueva última membresía del cliente o None} para actualizar el listado sin releerlo.
     """
-    # Calcular el primer y último día del mes
-    _, num_days = monthrange(year, month)
-    start_date = datetime(year, month, 1)
-    end_date = datetime(year, month, num_days, 23, 59, 59)
-
-    # --- Traer ingresos del mes ---
-    ingresos_query = db.collection("ingresos").where(filter=gcfs.FieldFilter("fecha", ">=", start_date)).where(filter=gcfs.FieldFilter("fecha", "<=", end_date)).stream()
-    ingresos_data = [i.to_dict() for i in ingresos_query]
-    df_ing = pd.DataFrame(ingresos_data)
-    if not df_ing.empty:
-        df_ing["fecha"] = pd.to_datetime(df_ing["fecha"])
-        df_ing["monto_total"] = df_ing["monto_total_centavos"] / 100
-
-    # --- Traer gastos del mes ---
-    gastos_query = db.collection("gastos").where(filter=gcfs.FieldFilter("fecha", ">=", start_date)).where(filter=gcfs.FieldFilter("fecha", "<=", end_date)).stream()
-    gastos_data = [g.to_dict() for g in gastos_query]
-    df_gas = pd.DataFrame(gastos_data)
-    if not df_gas.empty:
-        df_gas["fecha"] = pd.to_datetime(df_gas["fecha"])
-        df_gas["monto"] = df_gas["monto_centavos"] / 100
-
-    # --- Traer membresías del mes (por fecha de alta) ---
-    membresias_query = db.collection("membresias").where(filter=gcfs.FieldFilter("fecha_alta", ">=", start_date)).where(filter=gcfs.FieldFilter("fecha_alta", "<=", end_date)).stream()
-    membresias_data = []
-    for m in membresias_query:
-        data = m.to_dict()
-        # Obtener información del cliente
-        if "dni_cliente" in data:
-            cliente_doc = db.collection("clientes").document(data["dni_cliente"]).get()
-            if cliente_doc.exists:
-                cliente_info = cliente_doc.to_dict()
-                data["nombre_cliente"] = cliente_info.get("nombre", "Cliente no encontrado")
-            else:
-                data["nombre_cliente"] = "Cliente no encontrado"
-        membresias_data.append(data)
-    
-    df_membresias = pd.DataFrame(membresias_data)
-    if not df_membresias.empty:
-        df_membresias["fecha_alta"] = pd.to_datetime(df_membresias["fecha_alta"])
-        df_membresias["fecha_vencimiento"] = pd.to_datetime(df_membresias["fecha_vencimiento"])
-        df_membresias["precio"] = df_membresias["precio_centavos"] / 100
-        
-        # Añadir columna de fuente para distinguir en los gráficos
-        df_membresias["fuente"] = "Membresías"
-        
-        # Añadir columna de método de pago formateado para visualización
-        if "metodo_pago" in df_membresias.columns:
-            df_membresias["metodo_pago_display"] = df_membresias["metodo_pago"].map({
-                "efectivo": "Efectivo",
-                "transferencia": "Transferencia", 
-                "debito_automatico": "Débito Automático"
-            }).fillna("Efectivo")  # Default para registros antiguos
-
-    return df_ing, df_gas, df_membresias
\ No newline at end of file
+    eliminadas, proyecciones = repo.eliminar_membresias(membresias)
+    for _, dni_cliente in membresias:
+        invalidar_estado_cliente(dni_cliente)
+    for membresia in eliminadas:
+        _actualizar_caches("membresias", _como_leido(membresia, membresia["id"]), -1)
+    return proyecciones